@@ -0,0 +1,82 @@
+"""
+Compare the memory and CPU cost of `Organisation` and `CompactOrganisation`
+
+Run from the root of the repository:
+
+    python benchmarks/compact_items.py [number_of_items]
+"""
+import datetime
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, ".")
+
+from findthatcharity_import.items import Organisation, CompactOrganisation
+
+
+def make_record(i):
+    return {
+        "id": "GB-COH-{:08d}".format(i),
+        "name": "Example Company {}".format(i),
+        "charityNumber": None,
+        "companyNumber": "{:08d}".format(i),
+        "streetAddress": "1 Example Street",
+        "addressLocality": "Exampletown",
+        "addressRegion": None,
+        "addressCountry": "United Kingdom",
+        "postalCode": "EX1 1AA",
+        "telephone": None,
+        "alternateName": [],
+        "email": None,
+        "description": None,
+        "organisationType": ["Registered Company", "Company Limited by Guarantee"],
+        "organisationTypePrimary": "Company Limited by Guarantee",
+        "url": None,
+        "location": [],
+        "latestIncome": None,
+        "dateModified": datetime.datetime.now(),
+        "dateRegistered": None,
+        "dateRemoved": None,
+        "active": True,
+        "parent": None,
+        "orgIDs": ["GB-COH-{:08d}".format(i)],
+        "source": "companies",
+    }
+
+
+def measure(item_cls, records):
+    start = time.perf_counter()
+    items = [item_cls(**r) for r in records]
+    create_time = time.perf_counter() - start
+    del items
+
+    tracemalloc.start()
+    items = [item_cls(**r) for r in records]
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    for i in items:
+        i.to_tables()
+    tables_time = time.perf_counter() - start
+
+    return memory, create_time, tables_time
+
+
+def main(n):
+    records = [make_record(i) for i in range(n)]
+    scale = 1000000 / n
+    results = {}
+    for item_cls in (Organisation, CompactOrganisation):
+        results[item_cls.__name__] = measure(item_cls, records)
+
+    print("Per million items (measured on {:,} items)".format(n))
+    print("{:<20} {:>12} {:>12} {:>12}".format("", "memory (MB)", "create (s)", "to_tables (s)"))
+    for name, (memory, create_time, tables_time) in results.items():
+        print("{:<20} {:>12.1f} {:>12.2f} {:>12.2f}".format(
+            name, memory * scale / 1024 / 1024, create_time * scale, tables_time * scale))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
@@ -0,0 +1,78 @@
+"""
+Compare the JSON serialisers available to the SQL pipeline
+
+Inserts organisation rows with a large `location` array into an in-memory
+sqlite database, serialising the JSON columns with each serialiser.
+
+Run from the root of the repository:
+
+    python benchmarks/json_serialisers.py [number_of_rows] [locations_per_row]
+"""
+import datetime
+import sys
+import time
+
+from sqlalchemy import create_engine, MetaData, Table, Column, String, DateTime
+from sqlalchemy.types import JSON
+
+sys.path.insert(0, ".")
+
+from findthatcharity_import import serialisers
+
+SERIALISERS = {
+    "repr (previous)": str,
+    "stdlib json": serialisers.stdlib_dumps,
+}
+if serialisers.orjson is not None:
+    SERIALISERS["orjson"] = serialisers.orjson_dumps
+
+
+def make_row(i, locations):
+    return {
+        "id": "GB-CHC-{}".format(i),
+        "name": "Example Charity {}".format(i),
+        "dateModified": datetime.datetime.now(),
+        "location": [{
+            "id": "E0{}".format(l),
+            "name": "Area {}".format(l),
+            "geoCode": "E0{}".format(l),
+            "geoCodeType": "LSOA",
+            "latitude": 51.5 + l / 1000,
+            "longitude": -0.1 - l / 1000,
+        } for l in range(locations)],
+        "orgIDs": ["GB-CHC-{}".format(i), "GB-COH-{:08d}".format(i)],
+        "organisationType": ["Registered Charity", "Registered Company"],
+    }
+
+
+def measure(serialiser, rows):
+    engine = create_engine("sqlite://", json_serializer=serialiser)
+    metadata = MetaData()
+    table = Table("organisation", metadata,
+        Column("id", String, primary_key=True),
+        Column("name", String),
+        Column("dateModified", DateTime),
+        Column("location", JSON),
+        Column("orgIDs", JSON),
+        Column("organisationType", JSON),
+    )
+    metadata.create_all(engine)
+    with engine.connect() as conn:
+        start = time.perf_counter()
+        conn.execute(table.insert(), rows)
+        return time.perf_counter() - start
+
+
+def main(n, locations):
+    rows = [make_row(i, locations) for i in range(n)]
+    print("Inserting {:,} rows with {} locations each".format(n, locations))
+    for name, serialiser in SERIALISERS.items():
+        seconds = measure(serialiser, rows)
+        print("{:<16} {:>10,.0f} rows/sec".format(name, n / seconds))
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 50000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 20,
+    )
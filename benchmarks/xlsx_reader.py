@@ -0,0 +1,70 @@
+"""
+Compare reading an XLSX file with openpyxl and the streaming XLSXReader
+
+With no arguments a workbook is generated with a mix of strings, numbers
+and dates. To use a real file (eg the RSL or Scottish schools downloads)
+give the path and the name of the sheet to read.
+
+Run from the root of the repository:
+
+    python benchmarks/xlsx_reader.py [path_to_xlsx sheet_name]
+    python benchmarks/xlsx_reader.py --rows 100000
+"""
+import datetime
+import io
+import sys
+import time
+
+from openpyxl import Workbook, load_workbook
+
+sys.path.insert(0, ".")
+
+from findthatcharity_import.readers.xlsx import XLSXReader
+
+
+def make_workbook(rows):
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Open at Sept 2019")
+    ws.append(["id", "name", "address", "town", "postcode", "registered", "income", "type"])
+    for i in range(rows):
+        ws.append([
+            i, "Organisation {}".format(i), "{} High Street".format(i % 500),
+            "Town {}".format(i % 50), "AB{} 1CD".format(i % 99),
+            datetime.datetime(2000, 1, 1) + datetime.timedelta(days=i % 5000),
+            i * 1.5, ["Charity", "Company", "School"][i % 3],
+        ])
+    f = io.BytesIO()
+    wb.save(f)
+    return f.getvalue(), "Open at Sept 2019"
+
+
+def read_openpyxl(data, sheet):
+    wb = load_workbook(io.BytesIO(data), read_only=True)
+    return sum(1 for row in wb[sheet].rows for c in row[0:1] if c.value is not None)
+
+
+def read_xlsxreader(data, sheet):
+    with XLSXReader(io.BytesIO(data)) as wb:
+        return sum(1 for row in wb.iter_rows(sheet) if row and row[0] is not None)
+
+
+def main(args):
+    if len(args) == 2 and args[0] == "--rows":
+        data, sheet = make_workbook(int(args[1]))
+    elif len(args) == 2:
+        with open(args[0], "rb") as f:
+            data = f.read()
+        sheet = args[1]
+    else:
+        data, sheet = make_workbook(50000)
+
+    for name, reader in [("openpyxl", read_openpyxl), ("XLSXReader", read_xlsxreader)]:
+        start = time.perf_counter()
+        rows = reader(data, sheet)
+        seconds = time.perf_counter() - start
+        print("{:<12} {:>8,} rows {:>8.2f} seconds {:>10,.0f} rows/sec".format(
+            name, rows, seconds, rows / seconds))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
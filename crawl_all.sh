@@ -1,3 +1,3 @@
 for i in $(scrapy list); 
-    do scrapy crawl "$i" -s DB_URI="$DB_URI"; 
+    do scrapy crawl "$i" -s DB_URI="$DB_URI" -s CONDITIONAL_GET_ENABLED=True; 
 done; 
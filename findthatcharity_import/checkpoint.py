@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""
+Checkpoints for resuming a crawl that stopped part way through
+
+While a spider runs with `CHECKPOINT_ENABLED` the SQL pipeline saves a small
+JSON file after each chunk of records is committed, with the crawl id, the
+number of chunks committed, the number of rows committed from each source
+file and the version (eg the SHA-256 hash) of the file they were read from. `scrapy crawl <spider> --resume` reads this file so the spider can carry
+on from where it stopped. The file is removed once a crawl finishes.
+"""
+import datetime
+import json
+import os
+
+from scrapy.utils.project import data_path
+
+
+def get_checkpoint_path(settings, spider_name):
+    directory = settings.get('CHECKPOINT_DIR') or data_path('checkpoints')
+    return os.path.join(directory, "{}.json".format(spider_name))
+
+
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_checkpoint(path, crawl_id, chunks, positions, sources=None):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    checkpoint = {
+        "crawl_id": crawl_id,
+        "chunks": chunks,
+        "positions": positions,
+        "sources": sources or {},
+        "saved": datetime.datetime.now().isoformat(),
+    }
+    with open(path + ".tmp", "w") as f:
+        json.dump(checkpoint, f, indent=4)
+    os.replace(path + ".tmp", path)
+
+
+def remove_checkpoint(path):
+    if os.path.exists(path):
+        os.remove(path)
@@ -0,0 +1,197 @@
+from __future__ import print_function
+import json
+import logging
+import time
+from collections import defaultdict
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from itemadapter import is_item
+from scrapy import Request
+from scrapy.commands import ScrapyCommand
+from scrapy.exceptions import IgnoreRequest, UsageError
+
+from ..middlewares import FileDownloadMiddleware
+
+
+def get_peak_rss():
+    """
+    Peak resident memory of this process in MB
+    """
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class StoredFilesOnlyMiddleware(object):
+    """
+    Downloader middleware that skips large files which haven't already been
+    stored by `FileDownloadMiddleware`, rather than downloading them
+    """
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.files = FileDownloadMiddleware.from_crawler(crawler)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def process_request(self, request):
+        if request.meta.get("download_to_file") and not self.files.stored_path(request, self.crawler.spider):
+            logging.warning("[benchparse] no stored file for %s", request.url)
+            self.stats.inc_value("benchparse/missing")
+            raise IgnoreRequest("[benchparse] no stored file for {}".format(request.url))
+
+
+class CallbackTimingMiddleware(object):
+    """
+    Spider middleware that records the time spent in each callback, and the
+    items and requests it produced, in the `benchparse/` stats
+    """
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+        self.stats = crawler.stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def record(self, response):
+        callback = response.request.callback or self.crawler.spider.parse
+        prefix = "benchparse/callback/{}/".format(getattr(callback, "__name__", repr(callback)))
+        self.stats.inc_value(prefix + "calls")
+        return prefix
+
+    def add_output(self, prefix, output):
+        if isinstance(output, Request):
+            self.stats.inc_value(prefix + "requests")
+        elif is_item(output):
+            self.stats.inc_value(prefix + "items")
+
+    def process_spider_output(self, response, result):
+        prefix = self.record(response)
+        results = iter(result)
+        while True:
+            start = time.perf_counter()
+            try:
+                output = next(results)
+            except StopIteration:
+                return
+            finally:
+                self.stats.inc_value(prefix + "seconds", time.perf_counter() - start)
+            self.add_output(prefix, output)
+            yield output
+
+    async def process_spider_output_async(self, response, result):
+        # includes any time spent waiting for `BaseScraper.offload()`
+        prefix = self.record(response)
+        while True:
+            start = time.perf_counter()
+            try:
+                output = await result.__anext__()
+            except StopAsyncIteration:
+                return
+            finally:
+                self.stats.inc_value(prefix + "seconds", time.perf_counter() - start)
+            self.add_output(prefix, output)
+            yield output
+
+
+class Command(ScrapyCommand):
+
+    requires_project = True
+
+    def syntax(self):
+        return "<spider>"
+
+    def short_desc(self):
+        return "Time a spider's parsing using responses stored in the HTTP cache"
+
+    def add_options(self, parser):
+        ScrapyCommand.add_options(self, parser)
+        parser.add_argument("-f", "--fixtures", metavar="DIR",
+                          help="directory of stored responses to use instead of HTTPCACHE_DIR")
+        parser.add_argument("-o", "--output", metavar="FILE",
+                          help="save the results as JSON to FILE")
+
+    def run(self, args, opts):
+        if len(args) != 1:
+            raise UsageError()
+
+        # the spider is crawled as normal, but responses only come from the
+        # HTTP cache (and are never treated as expired) and items aren't saved
+        settings = {
+            "HTTPCACHE_ENABLED": True,
+            "HTTPCACHE_EXPIRATION_SECS": 0,
+            "HTTPCACHE_IGNORE_MISSING": True,
+            "ITEM_PIPELINES": {},
+            "CONDITIONAL_GET_ENABLED": False,
+            "CHECKPOINT_ENABLED": False,
+            "METRICS_DIR": None,
+            "METRICS_PORT": None,
+            "DOWNLOADER_MIDDLEWARES": dict(
+                self.settings.getdict("DOWNLOADER_MIDDLEWARES"),
+                **{"findthatcharity_import.commands.benchparse.StoredFilesOnlyMiddleware": 840}),
+            "SPIDER_MIDDLEWARES": dict(
+                self.settings.getdict("SPIDER_MIDDLEWARES"),
+                **{"findthatcharity_import.commands.benchparse.CallbackTimingMiddleware": 980}),
+        }
+        if opts.fixtures:
+            settings["HTTPCACHE_DIR"] = opts.fixtures
+        self.settings.setdict(settings, priority="cmdline")
+
+        crawler = self.crawler_process.create_crawler(args[0])
+        self.crawler_process.crawl(crawler)
+        start = time.perf_counter()
+        self.crawler_process.start()
+        seconds = time.perf_counter() - start
+
+        self.report(self.results(crawler.spider.name, crawler.stats.get_stats(), seconds), opts.output)
+
+    def results(self, spider_name, stats, seconds):
+        callbacks = defaultdict(lambda: {"calls": 0, "seconds": 0.0, "items": 0, "requests": 0})
+        for key, value in stats.items():
+            if key.startswith("benchparse/callback/"):
+                name, field = key[len("benchparse/callback/"):].rsplit("/", 1)
+                callbacks[name][field] = value
+        return {
+            "spider": spider_name,
+            "responses": sum(c["calls"] for c in callbacks.values()),
+            "missing": stats.get("httpcache/ignore", 0) + stats.get("benchparse/missing", 0),
+            "items": sum(c["items"] for c in callbacks.values()),
+            # counted by `BaseScraper.progress()` as the source files are read
+            "rows": stats.get("rows_read", 0),
+            "seconds": seconds,
+            "peak_rss_mb": get_peak_rss(),
+            "callbacks": dict(callbacks),
+        }
+
+    def report(self, results, output=None):
+        print("{:<30} {:>6} {:>10} {:>10} {:>9}".format(
+            "Callback", "calls", "seconds", "items", "requests"))
+        for name, stage in sorted(results["callbacks"].items(), key=lambda x: -x[1]["seconds"]):
+            print("{:<30} {:>6} {:>10.2f} {:>10} {:>9}".format(
+                name, stage["calls"], stage["seconds"], stage["items"], stage["requests"]))
+        print()
+
+        seconds = results["seconds"] or 1
+        print("Responses:  {:,} ({:,} not found in the cache)".format(results["responses"], results["missing"]))
+        print("Time:       {:,.2f} seconds".format(results["seconds"]))
+        if results["rows"]:
+            print("Rows:       {:,} ({:,.0f} rows/sec)".format(results["rows"], results["rows"] / seconds))
+        else:
+            print("Rows:       not counted by this spider (see items)")
+        print("Items:      {:,} ({:,.0f} items/sec)".format(results["items"], results["items"] / seconds))
+        if results["peak_rss_mb"] is not None:
+            print("Peak RSS:   {:,.1f} MB".format(results["peak_rss_mb"]))
+
+        if output:
+            with open(output, "w") as f:
+                json.dump(results, f, indent=4)
@@ -0,0 +1,18 @@
+from scrapy.commands.crawl import Command as CrawlCommand
+
+
+class Command(CrawlCommand):
+    """
+    scrapy's `crawl` command, with an option to resume a crawl from a checkpoint
+    """
+
+    def add_options(self, parser):
+        CrawlCommand.add_options(self, parser)
+        parser.add_argument("--resume", action="store_true",
+                          help="carry on from the checkpoint saved by an unfinished crawl")
+
+    def process_options(self, args, opts):
+        CrawlCommand.process_options(self, args, opts)
+        if opts.resume:
+            self.settings.set('CHECKPOINT_RESUME', True, priority='cmdline')
+            self.settings.set('CHECKPOINT_ENABLED', True, priority='cmdline')
@@ -1,23 +1,238 @@
 from __future__ import print_function
+import datetime
+import json
 import logging
+import os
+import pprint
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+from collections import Counter
 
-from twisted.internet import reactor
+from sqlalchemy import create_engine
+from twisted.internet import defer, protocol
 from scrapy.crawler import CrawlerRunner
-from scrapy.commands.crawl import Command as CrawlCommand
+
+from ..db import metadata, tables
+from .crawl import Command as CrawlCommand
+
+# rough peak memory of a spider, if it doesn't set `memory_mb`
+DEFAULT_MEMORY_MB = 250
+
+
+class CrawlProcessProtocol(protocol.ProcessProtocol):
+    """
+    Fires `deferred` with the exit code and signal (if it was killed) of a
+    `scrapy crawl` child process
+    """
+
+    def __init__(self):
+        self.deferred = defer.Deferred()
+
+    def processEnded(self, reason):
+        self.deferred.callback((reason.value.exitCode, getattr(reason.value, "signal", None)))
+
 
 class Command(CrawlCommand):
 
     def short_desc(self):
         return "Run all spiders"
 
+    def add_options(self, parser):
+        CrawlCommand.add_options(self, parser)
+        parser.add_argument("--concurrency", type=int, metavar="N",
+                          help="number of spiders to run at once (default: CRAWLALL_CONCURRENCY)")
+        parser.add_argument("--memory", type=int, metavar="MB",
+                          help="memory budget for the spiders running at once (default: CRAWLALL_MEMORY_MB)")
+        parser.add_argument("--processes", type=int, metavar="N",
+                          help="run every spider in its own process, N at a time")
+
     def run(self, args, opts):
+        self.opts = opts
+        self.processes = opts.processes
+        self.concurrency = opts.processes or opts.concurrency or self.settings.getint('CRAWLALL_CONCURRENCY', 4)
+        self.memory_budget = opts.memory or self.settings.getint('CRAWLALL_MEMORY_MB', 8192)
+        self.spider_loader = self.crawler_process.spider_loader
+        self.runner = CrawlerRunner(self.settings)
+
+        # heavy spiders take the longest, so are started first
+        self.pending = sorted(self.spider_loader.list(), key=lambda s: (not self.is_heavy(s), s))
+        self.running = {}
+        self.results = []
+
+        # imported here so the reactor scrapy has chosen is already installed
+        from twisted.internet import reactor
+
+        self.start_time = time.perf_counter()
+        self.finished = defer.Deferred()
+        self.finished.addBoth(lambda _: reactor.stop())
+        self.stats_dir = tempfile.mkdtemp(prefix="crawlall-")
+        try:
+            reactor.callWhenRunning(self.schedule)
+            reactor.run()
+        finally:
+            shutil.rmtree(self.stats_dir, ignore_errors=True)
+        self.report()
+
+    def is_heavy(self, spname):
+        return getattr(self.spider_loader.load(spname), "heavy", False)
+
+    def memory_mb(self, spname):
+        return getattr(self.spider_loader.load(spname), "memory_mb", DEFAULT_MEMORY_MB)
+
+    def schedule(self):
+        """
+        Start as many of the waiting spiders as fit within the concurrency
+        and memory budget
+        """
+        for spname in list(self.pending):
+            if len(self.running) >= self.concurrency:
+                break
+            memory = self.memory_mb(spname)
+            # a spider bigger than the budget is run on its own
+            if self.running and sum(self.running.values()) + memory > self.memory_budget:
+                continue
+            self.pending.remove(spname)
+            self.running[spname] = memory
+            self.start(spname)
+
+        if not self.running and not self.pending and not self.finished.called:
+            self.finished.callback(None)
+
+    def start(self, spname):
+        start_time = time.perf_counter()
+        if self.processes or self.is_heavy(spname):
+            # heavy spiders get their own process, so they don't hold up the
+            # reactor, a crash doesn't affect the other spiders, and their
+            # memory is released when they finish
+            logging.info("[crawlall] starting spider %s in a new process", spname)
+            mode = "process"
+            d = self.spawn(spname)
+        else:
+            logging.info("[crawlall] starting spider %s", spname)
+            mode = "reactor"
+            crawler = self.runner.create_crawler(spname)
+            d = self.runner.crawl(crawler, **self.opts.spargs)
+            d.addCallback(lambda _: {
+                "status": crawler.stats.get_value("finish_reason"),
+                "items": crawler.stats.get_value("item_scraped_count", 0),
+                "stats": crawler.stats.get_stats(),
+            })
+
+        def failed(failure):
+            logging.error("[crawlall] spider %s failed: %s", spname, failure.getTraceback())
+            return {"status": "failed ({})".format(failure.getErrorMessage()), "items": None, "stats": {}}
+
+        d.addErrback(failed)
+        d.addCallback(self.spider_finished, spname, mode, start_time)
+
+    def spawn(self, spname):
+        """
+        Run a spider with `scrapy crawl` in a child process
+
+        Returns a deferred which fires with the result of the crawl, using the
+        stats saved by the child process.
+        """
+        stats_file = os.path.join(self.stats_dir, "{}.json".format(spname))
+        spargs = dict(self.opts.spargs)
+        # the crawl_id is needed to record the scrape if the process crashes
+        spargs.setdefault("crawl_id", uuid.uuid4().hex)
+
+        args = [sys.executable, "-m", "scrapy.cmdline", "crawl", spname, "-s", "STATS_FILE=" + stats_file]
+        for setting in self.opts.set:
+            args.extend(["-s", setting])
+        for name, value in spargs.items():
+            args.extend(["-a", "{}={}".format(name, value)])
+        if self.opts.loglevel:
+            args.extend(["-L", self.opts.loglevel])
+        if self.opts.nolog:
+            args.append("--nolog")
+        if self.opts.resume:
+            args.append("--resume")
+
+        from twisted.internet import reactor
+        process = CrawlProcessProtocol()
+        reactor.spawnProcess(process, sys.executable, args, env=os.environ, childFDs={0: "w", 1: 1, 2: 2})
+        process.deferred.addCallback(
+            self.process_result, spname, stats_file, spargs["crawl_id"], datetime.datetime.utcnow())
+        return process.deferred
+
+    def process_result(self, outcome, spname, stats_file, crawl_id, start_time):
+        exitcode, signal = outcome
+        if os.path.exists(stats_file):
+            with open(stats_file) as f:
+                stats = json.load(f)
+            return {
+                "status": stats.get("finish_reason"),
+                "items": stats.get("item_scraped_count", 0),
+                "stats": stats,
+            }
+
+        # the process ended without the spider closing
+        if signal:
+            status = "crashed (signal {})".format(signal)
+        else:
+            status = "crashed (exit code {})".format(exitcode)
+        self.record_crash(spname, crawl_id, status, start_time, {"exit_code": exitcode, "signal": signal})
+        return {"status": status, "items": None, "stats": {}}
+
+    def record_crash(self, spname, crawl_id, status, start_time, stats):
+        """
+        Save a row in the `scrape` table for a spider whose process crashed
+        """
+        db_uri = self.settings.get('DB_URI')
+        if not db_uri:
+            return
+        try:
+            engine = create_engine(db_uri)
+            metadata.create_all(engine, tables=[tables["scrape"]])
+            scrape = tables["scrape"]
+            with engine.begin() as conn:
+                conn.execute(scrape.delete().where(scrape.c.id == crawl_id))
+                conn.execute(scrape.insert().values(
+                    id=crawl_id,
+                    spider=spname,
+                    stats=json.dumps(stats),
+                    finish_reason=status,
+                    items=0,
+                    errors=1,
+                    start_time=start_time,
+                    finish_time=datetime.datetime.utcnow(),
+                    log="",
+                ))
+        except Exception:
+            logging.exception("[crawlall] could not record crash of spider %s", spname)
+
+    def spider_finished(self, result, spname, mode, start_time):
+        result.update({
+            "spider": spname,
+            "mode": mode,
+            "seconds": time.perf_counter() - start_time,
+        })
+        self.results.append(result)
+        del self.running[spname]
+        logging.info("[crawlall] spider %s %s in %.1f seconds", spname, result["status"], result["seconds"])
+        self.schedule()
 
-        runner = CrawlerRunner(self.settings)
+    def report(self):
+        print("{:<20} {:<8} {:<24} {:>10} {:>10}".format(
+            "Spider", "Mode", "Status", "Items", "Seconds"))
+        for result in sorted(self.results, key=lambda r: -r["seconds"]):
+            print("{:<20} {:<8} {:<24} {:>10} {:>10.1f}".format(
+                result["spider"], result["mode"], str(result["status"]),
+                "" if result["items"] is None else result["items"], result["seconds"]))
+        print()
+        print("Total time: {:,.1f} seconds".format(time.perf_counter() - self.start_time))
 
-        for spname in sorted(self.crawler_process.spider_loader.list()):
-            logging.info("Starting spider: %s", spname)
-            runner.crawl(spname, **opts.spargs)
+        # add up the numeric stats from every spider
+        combined = Counter()
+        for result in self.results:
+            for key, value in result["stats"].items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    combined[key] += value
+        logging.info("[crawlall] combined stats:\n%s", pprint.pformat(dict(combined)))
 
-        d = runner.join()
-        d.addBoth(lambda _: reactor.stop())
-        reactor.run()
+        if any(r["status"] not in ("finished", "not_modified") for r in self.results):
+            self.exitcode = 1
@@ -18,7 +18,7 @@ class Command(ScrapyCommand):
 
     def add_options(self, parser):
         ScrapyCommand.add_options(self, parser)
-        parser.add_option("-r", "--reset", action="store_true",
+        parser.add_argument("-r", "--reset", action="store_true",
                           help="Reset the index before creating (WARNING: WILL DELETE DATA)")
 
 
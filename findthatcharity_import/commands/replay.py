@@ -0,0 +1,111 @@
+from __future__ import print_function
+import glob
+import itertools
+import json
+import logging
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from scrapy.commands import ScrapyCommand
+from scrapy.exceptions import UsageError
+
+from ..pipelines.spool_pipeline import ITEM_TYPES, get_spool_dir, read_segment
+
+SPOOL_PIPELINE = 'findthatcharity_import.pipelines.spool_pipeline.SpoolPipeline'
+
+
+def read_segments(segments, workers):
+    """
+    Read spool segments in parallel, returning the records in order
+
+    No more than `workers * 2` segments are held in memory at once.
+    """
+    segments = iter(segments)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque(
+            executor.submit(read_segment, s)
+            for s in itertools.islice(segments, workers * 2)
+        )
+        while pending:
+            records = pending.popleft().result()
+            for s in itertools.islice(segments, 1):
+                pending.append(executor.submit(read_segment, s))
+            yield from records
+
+
+def replay_spider(spidercls, records):
+    """
+    Subclass of `spidercls` that yields the spooled `records` as items rather
+    than making any requests, so they go through a normal crawl's item
+    pipelines, signals and stats
+    """
+
+    class ReplaySpider(spidercls):
+
+        async def start(self):
+            for item_type, fields in records:
+                yield ITEM_TYPES[item_type](**fields)
+
+    ReplaySpider.__name__ = ReplaySpider.__qualname__ = spidercls.__name__
+    return ReplaySpider
+
+
+class Command(ScrapyCommand):
+
+    requires_project = True
+
+    def syntax(self):
+        return "<spider> [crawl_id]"
+
+    def short_desc(self):
+        return "Send items saved by the spool pipeline through the item pipelines"
+
+    def add_options(self, parser):
+        ScrapyCommand.add_options(self, parser)
+        parser.add_argument("-w", "--workers", type=int, default=4,
+                          help="number of spool segments to read in parallel (default: 4)")
+
+    def run(self, args, opts):
+        if len(args) < 1:
+            raise UsageError()
+        spname = args[0]
+        crawl_id = args[1] if len(args) > 1 else None
+
+        if not self.settings.get("SPOOL_DIR"):
+            raise UsageError("SPOOL_DIR setting must be set to replay items")
+
+        crawl_dir = get_spool_dir(self.settings.get("SPOOL_DIR"), spname, crawl_id)
+        if not crawl_dir or not os.path.isdir(crawl_dir):
+            raise UsageError("No spooled items found for spider {}".format(spname))
+
+        manifest_file = os.path.join(crawl_dir, "manifest.json")
+        if os.path.exists(manifest_file):
+            with open(manifest_file) as f:
+                manifest = json.load(f)
+            if manifest.get("finish_reason") != "finished":
+                logging.warning("[replay] crawl finished with reason '%s', items may be incomplete",
+                                manifest.get("finish_reason"))
+        else:
+            logging.warning("[replay] no manifest found, crawl may not have finished")
+
+        segments = sorted(glob.glob(os.path.join(crawl_dir, "[0-9]*.gz")))
+        logging.info("[replay] replaying %s segments from %s", len(segments), crawl_dir)
+
+        # items were spooled part way through the pipelines, so only the
+        # pipelines that come after the spool pipeline are used
+        pipelines = self.settings.getwithbase("ITEM_PIPELINES")
+        spool_order = pipelines.get(SPOOL_PIPELINE)
+        if spool_order is not None:
+            pipelines = {p: o for p, o in pipelines.items() if o is not None and o > spool_order}
+        self.settings.set("ITEM_PIPELINES_BASE", {}, priority="cmdline")
+        self.settings.set("ITEM_PIPELINES", pipelines, priority="cmdline")
+        self.settings.set("SPOOL_DIR", None, priority="cmdline")
+        # no source files are read, so there's nothing to checkpoint
+        self.settings.set("CHECKPOINT_ENABLED", False, priority="cmdline")
+
+        spidercls = self.crawler_process.spider_loader.load(spname)
+        self.crawler_process.crawl(replay_spider(spidercls, read_segments(segments, opts.workers)))
+        self.crawler_process.start()
+        if self.crawler_process.bootstrap_failed:
+            self.exitcode = 1
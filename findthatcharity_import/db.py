@@ -123,4 +123,5 @@ tables["scrape"] = Table('scrape', metadata,
     Column("start_time", DateTime),
     Column("finish_time", DateTime),
     Column("log", Text),
+    Column("peak_memory", Float),
 )
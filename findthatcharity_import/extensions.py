@@ -0,0 +1,325 @@
+# -*- coding: utf-8 -*-
+
+# Define here the extensions used by the spiders
+#
+# See documentation in:
+# https://doc.scrapy.org/en/latest/topics/extensions.html
+
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from twisted.internet import task
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+
+from .serialisers import dumps
+from .timing import record_time
+
+# sent by `BaseScraper.memory_checkpoint()` to record memory use at a point in a crawl
+memory_checkpoint = object()
+
+# number of spiders using tracemalloc, so it's only stopped when the last one
+# closes (and only if it was started here)
+_tracemalloc_users = 0
+_tracemalloc_started = False
+
+
+class ReactorStallMonitor(object):
+    """
+    Measure how long the reactor is blocked for
+
+    A timer is scheduled every `REACTOR_STALL_INTERVAL` seconds, and any delay
+    in it running beyond `REACTOR_STALL_THRESHOLD` means something (usually a
+    spider callback) has held up the reactor, and so every other spider
+    running in the same process.
+    """
+
+    def __init__(self, interval, threshold, stats):
+        self.interval = interval
+        self.threshold = threshold
+        self.stats = stats
+        self.task = None
+        self.last = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('REACTOR_STALL_ENABLED', True):
+            raise NotConfigured
+        ext = cls(
+            interval=crawler.settings.getfloat('REACTOR_STALL_INTERVAL', 0.1),
+            threshold=crawler.settings.getfloat('REACTOR_STALL_THRESHOLD', 0.5),
+            stats=crawler.stats,
+        )
+        crawler.signals.connect(ext.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(ext.spider_closed, signal=signals.spider_closed)
+        return ext
+
+    def spider_opened(self, spider):
+        self.last = time.perf_counter()
+        self.task = task.LoopingCall(self.check)
+        self.task.start(self.interval, now=False)
+
+    def check(self):
+        now = time.perf_counter()
+        stall = now - self.last - self.interval
+        self.last = now
+        if stall < self.threshold:
+            return
+        self.stats.inc_value('reactor_stall/count')
+        self.stats.inc_value('reactor_stall/seconds', stall)
+        self.stats.max_value('reactor_stall/max_seconds', stall)
+        logging.debug("[reactor_stall] reactor blocked for %.2f seconds", stall)
+
+    def spider_closed(self, spider):
+        if self.task is not None and self.task.running:
+            self.task.stop()
+        seconds = self.stats.get_value('reactor_stall/seconds')
+        if seconds:
+            logging.info(
+                "[reactor_stall] reactor blocked %s times for a total of %.2f seconds (longest %.2f seconds)",
+                self.stats.get_value('reactor_stall/count'),
+                seconds,
+                self.stats.get_value('reactor_stall/max_seconds'),
+            )
+
+
+class StageTimings(object):
+    """
+    Add the time spent downloading to the `timing/` stats, and log how long
+    was spent in each stage when the spider closes
+
+    The other stages are recorded by the `timed` methods of the spiders and
+    pipelines (see `findthatcharity_import.timing`) and `StageTimingMiddleware`.
+    These are coarse stages, so they are always recorded.
+    """
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        ext = cls(crawler.stats)
+        crawler.signals.connect(ext.response_received, signal=signals.response_received)
+        crawler.signals.connect(ext.spider_closed, signal=signals.spider_closed)
+        return ext
+
+    def response_received(self, response, request, spider):
+        # set by scrapy's downloader, so not present for cached responses
+        # or files fetched by `FileDownloadMiddleware` (which are timed separately)
+        latency = request.meta.get('download_latency')
+        if latency is not None:
+            record_time(self.stats, 'download', latency)
+
+    def spider_closed(self, spider):
+        stages = {}
+        for key, value in self.stats.get_stats().items():
+            if key.startswith('timing/') and key.endswith('/seconds'):
+                stages[key[len('timing/'):-len('/seconds')]] = value
+        if not stages:
+            return
+        logging.info("[timing] time spent in each stage:\n%s", "\n".join(
+            "{:<24} {:>10.1f} seconds {:>12,} calls".format(
+                stage, seconds, self.stats.get_value('timing/{}/calls'.format(stage), 0))
+            for stage, seconds in sorted(stages.items(), key=lambda s: -s[1])
+        ))
+
+
+def get_rss_mb():
+    """
+    Current resident memory of this process in MB
+
+    Falls back to the peak resident memory where the current value isn't
+    available (ie not on linux)
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    if resource is not None:
+        # ru_maxrss is in kilobytes on linux and bytes on macOS
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return None
+
+
+class MemoryProfiler(object):
+    """
+    Record the memory used by a crawl
+
+    The resident memory of the process is sampled in a thread every
+    `MEMORY_PROFILE_INTERVAL` seconds, and at each checkpoint in
+    `MEMORY_PROFILE_CHECKPOINTS`:
+
+    - `download`: when a response is received
+    - `parse`: when a spider calls `self.memory_checkpoint("parse")`
+    - `close`: when the spider closes
+
+    If `MEMORY_PROFILE_TRACEMALLOC` is set then a `tracemalloc` snapshot is
+    taken at each checkpoint (when more memory is in use than at the last
+    snapshot for that checkpoint), and the `MEMORY_PROFILE_TOP` lines that
+    allocated the most memory are saved in the stats.
+    """
+
+    def __init__(self, stats, interval, checkpoints, use_tracemalloc=False, top=10):
+        self.stats = stats
+        self.interval = interval
+        self.checkpoints = set(checkpoints)
+        self.use_tracemalloc = use_tracemalloc
+        self.top = top
+        self.snapshot_sizes = {}
+        self.stop = threading.Event()
+        self.thread = None
+        # whether this spider is counted in `_tracemalloc_users`
+        self.tracing = False
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('MEMORY_PROFILE_ENABLED'):
+            raise NotConfigured
+        if get_rss_mb() is None:
+            raise NotConfigured
+        ext = cls(
+            stats=crawler.stats,
+            interval=crawler.settings.getfloat('MEMORY_PROFILE_INTERVAL', 1.0),
+            checkpoints=crawler.settings.getlist('MEMORY_PROFILE_CHECKPOINTS', ['download', 'parse', 'close']),
+            use_tracemalloc=crawler.settings.getbool('MEMORY_PROFILE_TRACEMALLOC', False),
+            top=crawler.settings.getint('MEMORY_PROFILE_TOP', 10),
+        )
+        crawler.signals.connect(ext.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(ext.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(ext.response_received, signal=signals.response_received)
+        crawler.signals.connect(ext.memory_checkpoint, signal=memory_checkpoint)
+        return ext
+
+    def spider_opened(self, spider):
+        global _tracemalloc_users, _tracemalloc_started
+        self.stats.set_value('memory/startup_rss_mb', get_rss_mb())
+        if self.use_tracemalloc and not self.tracing:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                _tracemalloc_started = True
+            _tracemalloc_users += 1
+            self.tracing = True
+        # a thread is used so that memory is still sampled while the reactor is blocked
+        self.thread = threading.Thread(target=self.sample_loop, name="memory-profiler", daemon=True)
+        self.thread.start()
+
+    def sample_loop(self):
+        # the stats are only updated from the reactor thread, so samples
+        # taken while it's blocked are recorded once it's free again
+        from twisted.internet import reactor
+        while not self.stop.wait(self.interval):
+            reactor.callFromThread(self.thread_sample, get_rss_mb())
+
+    def thread_sample(self, rss):
+        # samples from the thread that arrive after the spider has closed
+        # are ignored
+        if not self.stop.is_set():
+            self.record_sample(rss)
+
+    def sample(self):
+        rss = get_rss_mb()
+        self.record_sample(rss)
+        return rss
+
+    def record_sample(self, rss):
+        self.stats.set_value('memory/rss_mb', rss)
+        self.stats.max_value('memory/peak_rss_mb', rss)
+
+    def response_received(self, response, request, spider):
+        self.memory_checkpoint(spider, 'download')
+
+    def memory_checkpoint(self, spider, name):
+        if name not in self.checkpoints:
+            return
+        rss = self.sample()
+        self.stats.max_value('memory/checkpoint/{}/rss_mb'.format(name), rss)
+
+        if not self.use_tracemalloc or not tracemalloc.is_tracing():
+            return
+        traced, _ = tracemalloc.get_traced_memory()
+        # snapshots are slow to take, so only take one if more memory is in
+        # use than at the last snapshot for this checkpoint
+        if traced <= self.snapshot_sizes.get(name, 0) * 1.1:
+            return
+        self.snapshot_sizes[name] = traced
+        top = self.top_allocations()
+        self.stats.set_value('memory/tracemalloc/{}'.format(name), top)
+        if traced >= max(self.snapshot_sizes.values()):
+            self.stats.set_value('memory/top_allocations', top)
+        logging.debug("[memory] %s checkpoint: %.1f MB resident, %.1f MB traced", name, rss, traced / 1024 / 1024)
+
+    def top_allocations(self):
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        ))
+        return [
+            {
+                "site": "{}:{}".format(stat.traceback[0].filename, stat.traceback[0].lineno),
+                "size_mb": round(stat.size / 1024 / 1024, 2),
+                "count": stat.count,
+            }
+            for stat in snapshot.statistics('lineno')[:self.top]
+        ]
+
+    def spider_closed(self, spider):
+        global _tracemalloc_users, _tracemalloc_started
+        self.stop.set()
+        self.memory_checkpoint(spider, 'close')
+        self.sample()
+        if self.tracing:
+            self.tracing = False
+            _tracemalloc_users -= 1
+            if _tracemalloc_users == 0 and _tracemalloc_started:
+                tracemalloc.stop()
+                _tracemalloc_started = False
+
+        logging.info(
+            "[memory] peak resident memory %.1f MB (%.1f MB at startup)",
+            self.stats.get_value('memory/peak_rss_mb'),
+            self.stats.get_value('memory/startup_rss_mb'),
+        )
+        top = self.stats.get_value('memory/top_allocations')
+        if top:
+            logging.info("[memory] top allocations at peak:\n%s", "\n".join(
+                "{size_mb:>10.1f} MB {count:>10,} blocks  {site}".format(**t) for t in top
+            ))
+
+
+class StatsFileWriter(object):
+    """
+    Save the crawl stats to the JSON file given in `STATS_FILE` when the
+    spider closes
+
+    Used by `crawlall` to collect the stats from spiders run in child processes.
+    """
+
+    def __init__(self, path, stats):
+        self.path = path
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        path = crawler.settings.get('STATS_FILE')
+        if not path:
+            raise NotConfigured
+        ext = cls(path, crawler.stats)
+        crawler.signals.connect(ext.spider_closed, signal=signals.spider_closed)
+        return ext
+
+    def spider_closed(self, spider, reason):
+        stats = json.loads(dumps(self.stats.get_stats()))
+        stats["crawl_id"] = getattr(spider, "crawl_id", None)
+        with open(self.path, "w") as f:
+            json.dump(stats, f, indent=4)
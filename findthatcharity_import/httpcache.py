@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+import gzip
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from time import time
+
+from scrapy.http import Headers
+from scrapy.responsetypes import responsetypes
+from scrapy.utils.project import data_path
+from w3lib.http import headers_dict_to_raw, headers_raw_to_dict
+
+from .middlewares import fingerprint_request
+
+# content types that are worth compressing
+TEXT_TYPES = (b"text/", b"json", b"xml", b"csv", b"javascript")
+
+
+class ContentAddressedCacheStorage(object):
+    """
+    HTTP cache storage which saves each response body once, however many
+    requests it is the response to
+
+    Bodies are saved in `<HTTPCACHE_DIR>/_blobs`, named by the SHA-256 hash of
+    their content, and text bodies are compressed with gzip. Each request has
+    a small JSON file with the response status and headers and the hash of the
+    body. When the blobs take up more than `HTTPCACHE_MAX_MB` the least recently
+    used are removed. The JSON file for an expired entry is removed when it is
+    next looked up.
+
+    Use it by setting `HTTPCACHE_STORAGE` to
+    `findthatcharity_import.httpcache.ContentAddressedCacheStorage`. It can't
+    read a cache saved by scrapy's standard `FilesystemCacheStorage`.
+    """
+
+    def __init__(self, settings):
+        self.cachedir = data_path(settings['HTTPCACHE_DIR'])
+        self.blobdir = os.path.join(self.cachedir, "_blobs")
+        self.expiration_secs = settings.getint('HTTPCACHE_EXPIRATION_SECS')
+        self.compress = settings.getbool('HTTPCACHE_COMPRESS', True)
+        self.max_bytes = settings.getfloat('HTTPCACHE_MAX_MB', 2048) * 1024 * 1024
+        self.size = None
+
+    def open_spider(self, spider):
+        logging.debug("[httpcache] using content addressed cache storage in %s", self.cachedir)
+        self.size = sum(size for _, size, _ in self._blobs())
+
+    def close_spider(self, spider):
+        self._evict(spider)
+
+    def retrieve_response(self, spider, request):
+        """Return response if present in cache, or None otherwise."""
+        entry = self._read_entry(spider, request)
+        if entry is None:
+            self._inc_stat(spider, 'misses')
+            return None
+
+        blob = self._blob_path(entry["sha256"])
+        try:
+            with (gzip.open if entry["compressed"] else open)(blob, "rb") as f:
+                body = f.read()
+        except FileNotFoundError:
+            # the body has been evicted
+            self._inc_stat(spider, 'misses')
+            return None
+        # keep track of when each blob was last used
+        os.utime(blob)
+
+        self._inc_stat(spider, 'hits')
+        self._inc_stat(spider, 'bytes_read', len(body))
+        headers = Headers(headers_raw_to_dict(entry["headers"].encode("latin1")))
+        url = entry["response_url"]
+        respcls = responsetypes.from_args(headers=headers, url=url)
+        return respcls(url=url, headers=headers, status=entry["status"], body=body)
+
+    def store_response(self, spider, request, response):
+        """Store the given response in the cache."""
+        sha256 = hashlib.sha256(response.body).hexdigest()
+        compressed = self.compress and self._is_text(response)
+
+        blob = self._blob_path(sha256)
+        if os.path.exists(blob):
+            self._inc_stat(spider, 'duplicates')
+            os.utime(blob)
+        else:
+            data = gzip.compress(response.body, compresslevel=6) if compressed else response.body
+            self._write(blob, data)
+            self.size = (self.size or 0) + len(data)
+            self._inc_stat(spider, 'bytes_written', len(data))
+
+        entry = {
+            'url': request.url,
+            'method': request.method,
+            'status': response.status,
+            'response_url': response.url,
+            'timestamp': time(),
+            'headers': headers_dict_to_raw(response.headers).decode("latin1"),
+            'sha256': sha256,
+            'compressed': compressed,
+        }
+        self._write(self._entry_path(spider, request), json.dumps(entry).encode("utf8"))
+
+        if self.size > self.max_bytes:
+            self._evict(spider)
+
+    def _is_text(self, response):
+        content_type = response.headers.get("Content-Type", b"") or b""
+        return any(t in content_type.lower() for t in TEXT_TYPES)
+
+    def _entry_path(self, spider, request):
+        key = fingerprint_request(spider.crawler, request)
+        return os.path.join(self.cachedir, spider.name, key[0:2], key + ".json")
+
+    def _blob_path(self, sha256):
+        return os.path.join(self.blobdir, sha256[0:2], sha256)
+
+    def _read_entry(self, spider, request):
+        path = self._entry_path(spider, request)
+        try:
+            with open(path, "rb") as f:
+                entry = json.loads(f.read().decode("utf8"))
+        except FileNotFoundError:
+            return None
+        if 0 < self.expiration_secs < time() - entry["timestamp"]:
+            # expired - the body is left for `_evict`, as other entries can share it
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self._inc_stat(spider, 'expired')
+            return None
+        return entry
+
+    def _write(self, path, data):
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def _blobs(self):
+        """
+        The path, size and last use of each blob
+        """
+        if not os.path.isdir(self.blobdir):
+            return
+        for prefix in os.scandir(self.blobdir):
+            if not prefix.is_dir():
+                continue
+            for blob in os.scandir(prefix.path):
+                try:
+                    stat = blob.stat()
+                except FileNotFoundError:
+                    continue
+                yield blob.path, stat.st_size, stat.st_mtime
+
+    def _evict(self, spider):
+        """
+        Remove the least recently used blobs until they fit within the size budget
+        """
+        if self.size is None or self.size <= self.max_bytes:
+            return
+        blobs = sorted(self._blobs(), key=lambda b: b[2])
+        self.size = sum(size for _, size, _ in blobs)
+        # leave some headroom so this doesn't happen on every store
+        target = self.max_bytes * 0.9
+        for path, size, _ in blobs:
+            if self.size <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.size -= size
+            self._inc_stat(spider, 'evicted')
+            self._inc_stat(spider, 'evicted_bytes', size)
+        logging.info("[httpcache] cache is now %.1f MB", self.size / 1024 / 1024)
+
+    def _inc_stat(self, spider, key, count=1):
+        crawler = getattr(spider, "crawler", None)
+        if crawler is not None:
+            crawler.stats.inc_value('httpcache_storage/{}'.format(key), count)
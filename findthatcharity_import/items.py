@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 import math
 
+import attr
 import dateutil.parser
 import scrapy
 
@@ -128,6 +129,62 @@ class Organisation(scrapy.Item):
         }
 
 
+@attr.s(these={f: attr.ib(default=None) for f in Organisation.fields}, slots=True, repr=False)
+class CompactOrganisation(object):
+    """
+    Slotted version of the `Organisation` item for use by large spiders
+
+    Holds the same fields as `Organisation`, but as an attrs class with slots
+    rather than a per-instance dict and without field validation, so it is
+    much cheaper to create in bulk. Scrapy handles it through `itemadapter`
+    like any other item. The pipelines use `to_tables`, `to_elasticsearch`
+    and `to_mongodb` directly - anything else that needs a full scrapy item
+    can call `to_item()`.
+    """
+    fields = Organisation.fields
+
+    def __getitem__(self, key):
+        if key not in self.fields:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in self.fields:
+            raise KeyError("{} does not support field: {}".format(self.__class__.__name__, key))
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in self.fields
+
+    def __iter__(self):
+        return iter(self.fields)
+
+    def __len__(self):
+        return len(self.fields)
+
+    def get(self, key, default=None):
+        # unset fields are None, which are treated as missing like they
+        # are by the dict-backed `Organisation.get`
+        value = getattr(self, key, None) if key in self.fields else None
+        return default if value is None else value
+
+    def keys(self):
+        return self.fields.keys()
+
+    def items(self):
+        return [(f, getattr(self, f)) for f in self.fields]
+
+    def to_item(self):
+        return Organisation(**dict(self.items()))
+
+    def to_elasticsearch(self):
+        return self.to_item().to_elasticsearch()
+
+    __repr__ = Organisation.__repr__
+    to_mongodb = Organisation.to_mongodb
+    to_tables = Organisation.to_tables
+    get_complete_names = Organisation.get_complete_names
+
 
 class Source(scrapy.Item):
     """
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+Export live metrics about running crawls in the Prometheus text format
+
+The metrics can be written to a file in `METRICS_DIR` (for node_exporter's
+textfile collector) and/or served at `http://METRICS_HOST:METRICS_PORT/metrics`.
+"""
+import datetime
+import logging
+import os
+import re
+import time
+
+from twisted.internet import task
+from twisted.internet.error import CannotListenError
+from twisted.web import resource, server
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+
+PREFIX = "findthatcharity_"
+
+# the exporters for each spider running in this process, which are all
+# shown by the HTTP endpoint
+_exporters = {}
+_server_started = False
+
+
+def metric_name(name):
+    return PREFIX + re.sub(r"[^a-z0-9_]+", "_", name.lower()).strip("_")
+
+
+def format_metrics(metrics):
+    """
+    Turn a list of `(name, labels, value)` tuples into the Prometheus text format
+    """
+    lines = []
+    for name, labels, value in sorted(metrics, key=lambda m: (m[0], sorted(m[1].items()))):
+        labels = ",".join(
+            '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"'))
+            for k, v in sorted(labels.items())
+        )
+        lines.append("{}{{{}}} {}".format(name, labels, value))
+    return "\n".join(lines) + "\n"
+
+
+class MetricsResource(resource.Resource):
+    isLeaf = True
+
+    def render_GET(self, request):
+        request.setHeader(b"Content-Type", b"text/plain; version=0.0.4; charset=utf-8")
+        return "".join(e.text for e in list(_exporters.values())).encode("utf8")
+
+
+class MetricsExporter(object):
+    """
+    Export the throughput of a crawl every `METRICS_INTERVAL` seconds
+
+    As well as all the numeric crawl stats (eg `item_scraped_count` becomes
+    `findthatcharity_item_scraped_count`) this includes the items and rows read
+    per second, the number of records waiting in the spider's queues and each
+    pipeline's buffer, the average time taken to flush each pipeline and the
+    HTTP cache hit rate. Each metric has a `spider` label.
+    """
+
+    def __init__(self, crawler, interval, metrics_dir=None, host="127.0.0.1", port=None):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.interval = interval
+        self.metrics_dir = metrics_dir
+        self.host = host
+        self.port = port
+        self.task = None
+        self.spider = None
+        self.text = ""
+        self.last = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        metrics_dir = crawler.settings.get('METRICS_DIR')
+        port = crawler.settings.getint('METRICS_PORT')
+        if not metrics_dir and not port:
+            raise NotConfigured
+        ext = cls(
+            crawler=crawler,
+            interval=crawler.settings.getfloat('METRICS_INTERVAL', 15),
+            metrics_dir=metrics_dir,
+            host=crawler.settings.get('METRICS_HOST', '127.0.0.1'),
+            port=port,
+        )
+        crawler.signals.connect(ext.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(ext.spider_closed, signal=signals.spider_closed)
+        return ext
+
+    def spider_opened(self, spider):
+        self.spider = spider
+        self.last = (time.time(), 0, 0)
+        if self.metrics_dir:
+            os.makedirs(self.metrics_dir, exist_ok=True)
+        if self.port:
+            self.listen()
+            _exporters[id(self)] = self
+        self.task = task.LoopingCall(self.update)
+        self.task.start(self.interval, now=True)
+
+    def listen(self):
+        from twisted.internet import reactor
+        global _server_started
+        if _server_started:
+            return
+        try:
+            reactor.listenTCP(self.port, server.Site(MetricsResource()), interface=self.host)
+        except CannotListenError as e:
+            # eg another crawl on the same machine is already using the port
+            logging.warning("[metrics] could not serve metrics: %s", e)
+            return
+        _server_started = True
+        logging.info("[metrics] serving metrics at http://%s:%s/metrics", self.host, self.port)
+
+    def spider_closed(self, spider):
+        if self.task is not None and self.task.running:
+            self.task.stop()
+        self.update(running=False)
+        _exporters.pop(id(self), None)
+
+    def update(self, running=True):
+        self.text = format_metrics(self.collect(running))
+        if self.metrics_dir:
+            path = os.path.join(self.metrics_dir, "{}{}.prom".format(PREFIX, self.spider.name))
+            # node_exporter mustn't see a partly written file
+            with open(path + ".tmp", "w") as f:
+                f.write(self.text)
+            os.replace(path + ".tmp", path)
+
+    def collect(self, running=True):
+        labels = {"spider": self.spider.name}
+        # copied, as the stats can be updated by worker threads
+        stats = dict(self.stats.get_stats())
+        metrics = []
+
+        def add(name, value, **extra):
+            metrics.append((metric_name(name), dict(labels, **extra), value))
+
+        for key, value in stats.items():
+            if isinstance(value, bool):
+                continue
+            if isinstance(value, (int, float)):
+                add(key, value)
+            elif isinstance(value, datetime.datetime):
+                add(key + "_timestamp_seconds", value.replace(tzinfo=datetime.timezone.utc).timestamp())
+
+        # throughput since the last update
+        now = time.time()
+        items = stats.get('item_scraped_count', 0)
+        rows = stats.get('rows_read', 0)
+        last_time, last_items, last_rows = self.last
+        if now > last_time:
+            add('items_per_second', (items - last_items) / (now - last_time))
+            add('rows_per_second', (rows - last_rows) / (now - last_time))
+        self.last = (now, items, rows)
+
+        # records waiting to be processed
+        if hasattr(self.spider, "queue_depth"):
+            add('spider_queue_depth', self.spider.queue_depth())
+        engine = self.crawler.engine
+        if engine is not None:
+            # the engine's slot is private from Scrapy 2.6
+            slot = getattr(engine, "_slot", None) or getattr(engine, "slot", None)
+            if slot is not None:
+                add('scheduler_pending_requests', len(slot.scheduler))
+            if engine.scraper.slot is not None:
+                add('pipeline_pending_items', engine.scraper.slot.itemproc_size)
+            for pipeline in engine.scraper.itemproc.middlewares:
+                if hasattr(pipeline, "queue_depth"):
+                    add('pipeline_queue_depth', pipeline.queue_depth(), pipeline=type(pipeline).__name__)
+
+        # average time taken to save each batch of records (see `timing`)
+        for key, seconds in stats.items():
+            match = re.match(r"timing/(.+_flush)/seconds$", key)
+            if match and stats.get("timing/{}/calls".format(match.group(1))):
+                add('flush_latency_seconds', seconds / stats["timing/{}/calls".format(match.group(1))],
+                    stage=match.group(1))
+
+        lookups = stats.get('httpcache_storage/hits', 0) + stats.get('httpcache_storage/misses', 0)
+        if lookups:
+            add('httpcache_hit_ratio', stats.get('httpcache_storage/hits', 0) / lookups)
+
+        add('running', int(running))
+        add('last_update_timestamp_seconds', now)
+        return metrics
@@ -5,7 +5,61 @@
 # See documentation in:
 # https://doc.scrapy.org/en/latest/topics/spider-middleware.html
 
+import hashlib
+import http.client
+import json
+import os
+import shutil
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from urllib.parse import urlparse
+
+from twisted.internet import threads
 from scrapy import signals
+from scrapy.exceptions import DontCloseSpider, IgnoreRequest, NotConfigured
+from scrapy.http import Response
+from scrapy.utils.project import data_path
+try:
+    from scrapy.utils.request import request_fingerprint
+except ImportError:
+    # removed in Scrapy 2.x, which has a fingerprinter on the crawler instead
+    request_fingerprint = None
+
+from .timing import add_timings, collect_timings, get_stats, timed
+
+
+def response_sha256(response):
+    """
+    The SHA-256 hash of a response's body, or of the file it was saved to by
+    `FileDownloadMiddleware`
+
+    A stored file that is reused has no `download_sha256`, so it is hashed
+    from disk.
+    """
+    if response.meta.get('download_sha256'):
+        return response.meta['download_sha256']
+    path = response.meta.get('download_path')
+    if not path:
+        return hashlib.sha256(response.body).hexdigest()
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def fingerprint_request(crawler, request):
+    """
+    Get the fingerprint of a request as a hex string
+
+    Uses the crawler's request fingerprinter if it has one (Scrapy 2.7+)
+    """
+    fingerprinter = getattr(crawler, "request_fingerprinter", None)
+    if fingerprinter is not None:
+        return fingerprinter.fingerprint(request).hex()
+    return request_fingerprint(request)
 
 
 class FindthatcharityImportSpiderMiddleware(object):
@@ -56,6 +110,53 @@ class FindthatcharityImportSpiderMiddleware(object):
         spider.logger.info('Spider opened: %s' % spider.name)
 
 
+class StageTimingMiddleware(object):
+    """
+    Record the time spent in spider callbacks as the `parse` stage (see
+    `findthatcharity_import.timing`)
+
+    Only time spent in the main thread is included - any work done in a
+    thread by `BaseScraper.offload()` is recorded in `offload/worker_seconds`
+    (though for callbacks using `offload()` the time spent waiting for the
+    worker is included here). Only used when `TIMING_ENABLED` is set.
+    """
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('TIMING_ENABLED'):
+            raise NotConfigured
+        return cls(crawler.stats)
+
+    def process_spider_output(self, response, result, spider):
+        self.stats.inc_value('timing/parse/calls')
+        results = iter(result)
+        while True:
+            start = time.perf_counter()
+            try:
+                output = next(results)
+            except StopIteration:
+                return
+            finally:
+                self.stats.inc_value('timing/parse/seconds', time.perf_counter() - start)
+            yield output
+
+    async def process_spider_output_async(self, response, result, spider):
+        # scrapy 2.13+ passes the output of every callback as an async iterator
+        self.stats.inc_value('timing/parse/calls')
+        while True:
+            start = time.perf_counter()
+            try:
+                output = await result.__anext__()
+            except StopAsyncIteration:
+                return
+            finally:
+                self.stats.inc_value('timing/parse/seconds', time.perf_counter() - start)
+            yield output
+
+
 class FindthatcharityImportDownloaderMiddleware(object):
     # Not all methods need to be defined. If a method is not defined,
     # scrapy acts as if the downloader middleware does not modify the
@@ -101,3 +202,390 @@ class FindthatcharityImportDownloaderMiddleware(object):
 
     def spider_opened(self, spider):
         spider.logger.info('Spider opened: %s' % spider.name)
+
+
+class FileDownloadMiddleware(object):
+    """
+    Download large files straight to disk rather than into memory
+
+    Requests with `download_to_file` set in their meta are fetched in a
+    thread and streamed to a file. The response passed to the spider has an
+    empty body, and the path to the file is available in
+    `response.meta["download_path"]` (use `BaseScraper.open_download()` to
+    read it).
+
+    If the connection drops part way through, the download carries on from
+    where it stopped using a `Range` request. It gives up after
+    `FILE_DOWNLOAD_RETRIES` attempts in a row that receive nothing. Progress
+    is logged every `FILE_DOWNLOAD_PROGRESS_SECS` seconds.
+
+    If the HTTP cache is enabled then the files are kept in the cache
+    directory and reused until they expire, otherwise they are saved to a
+    temporary directory which is removed when the spider closes.
+
+    Like Scrapy's own downloader, the `DOWNLOAD_TIMEOUT`, `DOWNLOAD_MAXSIZE`,
+    `DOWNLOAD_WARNSIZE` and `USER_AGENT` settings (or the `download_timeout`,
+    `download_maxsize` and `download_warnsize` meta keys) are used. The
+    timeout applies to connecting and to each read from the connection.
+    """
+
+    chunk_size = 1024 * 1024
+
+    def __init__(self, download_dir, expiration_secs, stats, retries=5, progress_secs=30,
+                 timeout=180, maxsize=0, warnsize=0, user_agent=None):
+        self.download_dir = download_dir
+        self.expiration_secs = expiration_secs
+        self.stats = stats
+        self.retries = retries
+        self.progress_secs = progress_secs
+        self.timeout = timeout
+        self.maxsize = maxsize
+        self.warnsize = warnsize
+        self.user_agent = user_agent
+        self.temp_dir = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        download_dir = settings.get('FILE_DOWNLOAD_DIR')
+        expiration_secs = None
+        if not download_dir and settings.getbool('HTTPCACHE_ENABLED'):
+            download_dir = data_path(settings.get('HTTPCACHE_DIR'))
+            expiration_secs = settings.getint('HTTPCACHE_EXPIRATION_SECS')
+        s = cls(
+            download_dir=download_dir,
+            expiration_secs=expiration_secs,
+            stats=crawler.stats,
+            retries=settings.getint('FILE_DOWNLOAD_RETRIES', 5),
+            progress_secs=settings.getfloat('FILE_DOWNLOAD_PROGRESS_SECS', 30),
+            timeout=settings.getfloat('DOWNLOAD_TIMEOUT'),
+            maxsize=settings.getint('DOWNLOAD_MAXSIZE'),
+            warnsize=settings.getint('DOWNLOAD_WARNSIZE'),
+            user_agent=settings.get('USER_AGENT'),
+        )
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
+
+    def spider_closed(self, spider):
+        if self.temp_dir:
+            shutil.rmtree(self.temp_dir, ignore_errors=True)
+            self.temp_dir = None
+
+    def get_path(self, request, spider):
+        if self.download_dir:
+            directory = os.path.join(self.download_dir, spider.name, "files")
+        else:
+            if self.temp_dir is None:
+                self.temp_dir = tempfile.mkdtemp(prefix="{}-".format(spider.name))
+            directory = self.temp_dir
+        os.makedirs(directory, exist_ok=True)
+        extension = os.path.splitext(urlparse(request.url).path)[1]
+        return os.path.join(directory, fingerprint_request(spider.crawler, request) + extension)
+
+    def stored_path(self, request, spider):
+        """
+        Path to a previously downloaded file for this request, if it has not expired
+        """
+        if not self.download_dir:
+            return None
+        path = self.get_path(request, spider)
+        if not os.path.exists(path):
+            return None
+        if self.expiration_secs and time.time() - os.path.getmtime(path) > self.expiration_secs:
+            return None
+        return path
+
+    def process_request(self, request, spider):
+        if not request.meta.get('download_to_file'):
+            return None
+
+        # the response body is empty so shouldn't be saved in the HTTP cache
+        request.meta['dont_cache'] = True
+
+        path = self.stored_path(request, spider)
+        if path:
+            spider.logger.info("[file_download] using stored file %s", path)
+            self.stats.inc_value('file_download/reused')
+            return self.file_response(request, request.url, {}, path)
+
+        path = self.get_path(request, spider)
+        return threads.deferToThread(self.download_in_thread, request, path, spider)
+
+    def download_in_thread(self, request, path, spider):
+        # the stats are only updated from the reactor thread, so the ones
+        # recorded during the download are added to them once it finishes
+        from twisted.internet import reactor
+        with collect_timings() as timings:
+            try:
+                return self.download(request, path, spider)
+            finally:
+                reactor.callFromThread(add_timings, self.stats, timings.values)
+
+    @timed('download')
+    def download(self, request, path, spider):
+        """
+        Stream a file to disk, resuming the download if the connection drops
+        """
+        part = path + ".part"
+        stats = get_stats(self)
+        state = {"digest": None, "validator": None, "url": request.url, "headers": {}, "received": 0}
+        if os.path.exists(part):
+            os.remove(part)
+        spider.logger.info("[file_download] downloading %s", request.url)
+        attempt = 0
+        try:
+            while True:
+                received = state["received"]
+                try:
+                    response = self.download_part(request, part, state, spider)
+                    break
+                except urllib.error.HTTPError as e:
+                    if e.code < 500:
+                        raise
+                    error = e
+                except (OSError, http.client.HTTPException) as e:
+                    error = e
+                # only attempts in a row that didn't receive anything count
+                # towards the limit
+                if state["received"] > received:
+                    attempt = 0
+                if attempt >= self.retries:
+                    raise error
+                attempt += 1
+                stats.inc_value('file_download/retries')
+                spider.logger.warning(
+                    "[file_download] %s failed after %s bytes (%s), retrying",
+                    request.url, os.path.getsize(part) if os.path.exists(part) else 0, error,
+                )
+                time.sleep(min(2 ** attempt, 60))
+        except Exception:
+            if os.path.exists(part):
+                os.remove(part)
+            raise
+
+        if response is not None:
+            # the file hasn't changed since a conditional request was made
+            return response
+
+        os.replace(part, path)
+        request.meta['download_sha256'] = state["digest"].hexdigest()
+        stats.inc_value('file_download/files')
+        spider.logger.info("[file_download] downloaded %s (%s bytes)", request.url, os.path.getsize(path))
+        return self.file_response(request, state["url"], state["headers"], path)
+
+    def download_part(self, request, part, state, spider):
+        """
+        Download the rest of a file, adding it to the end of `part`
+
+        Returns `None` once the whole file is saved, or a response if the
+        server says the file hasn't been modified. `state` keeps track of the
+        file between attempts.
+        """
+        stats = get_stats(self)
+        headers = dict(request.headers.to_unicode_dict())
+        # urllib doesn't decompress responses, so the Accept-Encoding added by
+        # scrapy's HttpCompressionMiddleware can't be passed on
+        headers["Accept-Encoding"] = "identity"
+        if self.user_agent and "User-Agent" not in headers:
+            headers["User-Agent"] = self.user_agent
+        timeout = request.meta.get('download_timeout', self.timeout) or None
+        maxsize = request.meta.get('download_maxsize', self.maxsize)
+        warnsize = request.meta.get('download_warnsize', self.warnsize)
+        offset = os.path.getsize(part) if os.path.exists(part) else 0
+        if offset:
+            headers["Range"] = "bytes={}-".format(offset)
+            if state["validator"]:
+                # the whole file is sent again if it has changed
+                headers["If-Range"] = state["validator"]
+        req = urllib.request.Request(request.url, headers=headers, method=request.method)
+        try:
+            response = urllib.request.urlopen(req, timeout=timeout)
+        except urllib.error.HTTPError as e:
+            if e.code != 304 or offset:
+                raise
+            return Response(url=request.url, status=304, headers=dict(e.headers), request=request)
+
+        with response:
+            if offset and response.status == 206:
+                stats.inc_value('file_download/resumed')
+                spider.logger.info("[file_download] resuming %s from %s bytes", request.url, offset)
+            else:
+                offset = 0
+                state["digest"] = hashlib.sha256()
+                state["validator"] = response.headers.get("ETag") or response.headers.get("Last-Modified")
+                state["url"] = response.geturl()
+                state["headers"] = dict(response.getheaders())
+
+            length = response.headers.get("Content-Length")
+            expected = offset + int(length) if length else None
+            if maxsize and expected and expected > maxsize:
+                raise IgnoreRequest("[file_download] {} is {} bytes, larger than the download max size ({})".format(
+                    request.url, expected, maxsize))
+            if warnsize and expected and expected > warnsize and not offset:
+                spider.logger.warning("[file_download] %s is %s bytes, larger than the download warn size (%s)",
+                                      request.url, expected, warnsize)
+            size = offset
+            last_progress = time.perf_counter()
+            with open(part, "ab" if offset else "wb") as f:
+                for chunk in iter(lambda: response.read(self.chunk_size), b""):
+                    f.write(chunk)
+                    state["digest"].update(chunk)
+                    size += len(chunk)
+                    state["received"] += len(chunk)
+                    stats.inc_value('file_download/bytes', len(chunk))
+                    if maxsize and size > maxsize:
+                        raise IgnoreRequest("[file_download] {} is larger than the download max size ({})".format(
+                            request.url, maxsize))
+                    if time.perf_counter() - last_progress > self.progress_secs:
+                        last_progress = time.perf_counter()
+                        spider.logger.info(
+                            "[file_download] %s: %.1f MB of %s", request.url, size / 1024 / 1024,
+                            "{:.1f} MB".format(expected / 1024 / 1024) if expected else "unknown",
+                        )
+
+            if expected is not None and size < expected:
+                raise http.client.IncompleteRead(b"", expected - size)
+
+    def file_response(self, request, url, headers, path):
+        request.meta['download_path'] = path
+        return Response(
+            url=url,
+            headers=headers,
+            flags=['download_to_file'],
+            request=request,
+        )
+
+
+class ConditionalGetMiddleware(object):
+    """
+    Skip a crawl if the data a spider downloads hasn't changed since the last one
+
+    The `ETag`, `Last-Modified` header and SHA-256 hash of each data file (the
+    `downloadURL` of each of the spider's distributions, or any request with
+    `conditional_get` set in its meta) are saved after each finished crawl.
+    On the next crawl these are used to make conditional requests, and files
+    which come back as `304 Not Modified` or with the same hash are skipped.
+
+    If every file is unchanged the spider is closed with the finish reason
+    `not_modified`. As soon as one file has changed any files that were
+    skipped are requested again in full, as the spider needs all of them.
+    """
+
+    def __init__(self, state_dir, stats, crawler):
+        self.state_dir = state_dir
+        self.stats = stats
+        self.crawler = crawler
+        self.state = {}
+        self.pending = {}
+        self.skipped = []
+        self.changed = False
+        self.closing = False
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('CONDITIONAL_GET_ENABLED'):
+            raise NotConfigured
+        s = cls(
+            state_dir=settings.get('CONDITIONAL_GET_DIR') or data_path('conditional_get'),
+            stats=crawler.stats,
+            crawler=crawler,
+        )
+        crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(s.spider_idle, signal=signals.spider_idle)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
+
+    def state_path(self, spider):
+        return os.path.join(self.state_dir, "{}.json".format(spider.name))
+
+    def spider_opened(self, spider):
+        path = self.state_path(spider)
+        if os.path.exists(path):
+            with open(path) as f:
+                self.state = json.load(f)
+
+    def spider_idle(self, spider):
+        if self.skipped and not self.changed and not self.closing:
+            spider.logger.info("[conditional_get] no changes to %s files, skipping crawl", len(self.skipped))
+            # the engine can't be closed from inside the idle signal
+            from twisted.internet import reactor
+            self.closing = True
+            reactor.callLater(0, self.crawler.engine.close_spider, spider, 'not_modified')
+            raise DontCloseSpider
+
+    def spider_closed(self, spider, reason):
+        # the new state is only saved if the data was fully processed
+        if reason != 'finished' or not self.pending:
+            return
+        self.state.update(self.pending)
+        path = self.state_path(spider)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "w") as f:
+            json.dump(self.state, f, indent=4)
+        os.replace(path + ".tmp", path)
+
+    def is_conditional(self, request, spider):
+        if 'conditional_get' in request.meta:
+            return request.meta['conditional_get']
+        distribution = getattr(spider, "source", {}).get("distribution", [])
+        return request.url in [d.get("downloadURL") for d in distribution]
+
+    def process_request(self, request, spider):
+        if self.changed or not self.is_conditional(request, spider):
+            return None
+        state = self.state.get(request.url, {})
+        if state.get('etag'):
+            request.headers.setdefault('If-None-Match', state['etag'])
+        if state.get('last_modified'):
+            request.headers.setdefault('If-Modified-Since', state['last_modified'])
+        return None
+
+    def process_response(self, request, response, spider):
+        if response.status not in (200, 304) or not self.is_conditional(request, spider):
+            return response
+
+        previous = self.state.get(request.url, {})
+        if response.status == 304:
+            if self.changed:
+                # another file changed while this request was being made
+                return self.full_request(request)
+            unchanged = True
+            self.pending[request.url] = previous
+        else:
+            digest = self.get_hash(response)
+            unchanged = previous.get('sha256') == digest
+            self.pending[request.url] = {
+                'etag': response.headers.get('ETag', b'').decode() or None,
+                'last_modified': response.headers.get('Last-Modified', b'').decode() or None,
+                'sha256': digest,
+            }
+
+        if not unchanged:
+            self.stats.inc_value('conditional_get/modified')
+            if not self.changed:
+                self.changed = True
+                for skipped in self.skipped:
+                    self.crawler.engine.crawl(self.full_request(skipped))
+            return response
+
+        self.stats.inc_value('conditional_get/not_modified')
+        if self.changed:
+            return response
+        self.skipped.append(request)
+        raise IgnoreRequest("[conditional_get] {} has not changed".format(request.url))
+
+    def full_request(self, request):
+        """
+        A copy of a request without the conditional headers
+        """
+        meta = dict(request.meta, conditional_get=False)
+        meta.pop('download_path', None)
+        meta.pop('download_sha256', None)
+        request = request.replace(dont_filter=True, meta=meta)
+        request.headers.pop('If-None-Match', None)
+        request.headers.pop('If-Modified-Since', None)
+        return request
+
+    def get_hash(self, response):
+        return response_sha256(response)
@@ -1,12 +1,17 @@
 # -*- coding: utf-8 -*-
 import logging
 
+from itemadapter import ItemAdapter
+
 try:
     from elasticsearch import Elasticsearch
     from elasticsearch.helpers import bulk
 except ImportError:
     pass
 
+from ..profiler import profiled
+from ..timing import timed
+
 class ElasticSearchPipeline():
 
     def __init__(self, es_url, es_bulk_limit, stats):
@@ -42,6 +47,10 @@ class ElasticSearchPipeline():
             return
         self.save_records()
 
+    def queue_depth(self):
+        return len(self.records)
+
+    @timed("elasticsearch_flush")
     def save_records(self):
         self.stats.inc_value('elasticsearch/attempted_items', len(self.records))
 
@@ -58,6 +67,7 @@ class ElasticSearchPipeline():
 
         self.records = []
 
+    @profiled
     def process_item(self, item, spider):
 
         if self.client is None:
@@ -69,7 +79,7 @@ class ElasticSearchPipeline():
             es_item["_type"] = "item"
             es_item["_op_type"] = es_item.get("_op_type", "index")
         else:
-            es_item = dict(item)
+            es_item = ItemAdapter(item).asdict()
             es_item["_index"] = "item"
             es_item["_type"] = "item"
             es_item["_op_type"] = "index"
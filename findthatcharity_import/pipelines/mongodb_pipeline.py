@@ -1,9 +1,13 @@
 # -*- coding: utf-8 -*-
 import logging
 
+from itemadapter import ItemAdapter
 from pymongo import MongoClient
 from pymongo.errors import BulkWriteError
 
+from ..profiler import profiled
+from ..timing import timed
+
 class MongoDBPipeline():
 
     def __init__(self, mongo_uri, mongo_db, mongo_collection, mongo_bulk_limit, stats):
@@ -41,6 +45,10 @@ class MongoDBPipeline():
         self.save_records()
         self.client.close()
 
+    def queue_depth(self):
+        return sum(len(records) for records in self.records.values())
+
+    @timed("mongodb_flush")
     def save_records(self):
 
         for collection, records in self.records.items():
@@ -66,6 +74,7 @@ class MongoDBPipeline():
 
         self.records = {}
 
+    @profiled
     def process_item(self, item, spider):
 
         if self.client is None:
@@ -75,7 +84,7 @@ class MongoDBPipeline():
         if hasattr(item, "to_mongodb") and callable(item.to_mongodb):
             collection, mongo_item = item.to_mongodb()
         else:
-            es_item = dict(item)
+            es_item = ItemAdapter(item).asdict()
             es_item["_id"] = item["id"]
             del es_item["id"]
             collection = None
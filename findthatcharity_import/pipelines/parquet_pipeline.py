@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+import datetime
+import logging
+import os
+import uuid
+
+import dateutil.parser
+from scrapy import signals
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+from ..items import Organisation, CompactOrganisation, Link, Source
+from ..profiler import profiled
+from ..timing import timed
+
+DATASETS = {
+    Organisation: "organisation",
+    CompactOrganisation: "organisation",
+    Link: "link",
+    Source: "source",
+}
+
+# the same strings as `BaseScraper.clean_fields()` accepts for boolean fields
+TRUE_VALUES = ("t", "true", "y", "yes", "1")
+FALSE_VALUES = ("f", "false", "n", "no", "0")
+
+
+def get_schemas():
+    location = pa.struct([
+        ("id", pa.string()),
+        ("name", pa.string()),
+        ("geoCode", pa.string()),
+        ("geoCodeType", pa.string()),
+        ("countryCode", pa.string()),
+        ("latitude", pa.float64()),
+        ("longitude", pa.float64()),
+        ("description", pa.string()),
+    ])
+    return {
+        "organisation": pa.schema([
+            ("id", pa.string()),
+            ("name", pa.string()),
+            ("charityNumber", pa.string()),
+            ("companyNumber", pa.string()),
+            ("streetAddress", pa.string()),
+            ("addressLocality", pa.string()),
+            ("addressRegion", pa.string()),
+            ("addressCountry", pa.string()),
+            ("postalCode", pa.string()),
+            ("telephone", pa.string()),
+            ("alternateName", pa.list_(pa.string())),
+            ("email", pa.string()),
+            ("description", pa.string()),
+            ("organisationType", pa.list_(pa.string())),
+            ("organisationTypePrimary", pa.string()),
+            ("url", pa.string()),
+            ("location", pa.list_(location)),
+            ("latestIncome", pa.int64()),
+            ("latestIncomeDate", pa.date32()),
+            ("dateModified", pa.timestamp("us")),
+            ("dateRegistered", pa.date32()),
+            ("dateRemoved", pa.date32()),
+            ("active", pa.bool_()),
+            ("parent", pa.string()),
+            ("orgIDs", pa.list_(pa.string())),
+            ("source", pa.string()),
+        ]),
+        "link": pa.schema([
+            ("organisation_id_a", pa.string()),
+            ("organisation_id_b", pa.string()),
+            ("description", pa.string()),
+            ("source", pa.string()),
+        ]),
+        "source": pa.schema([
+            ("identifier", pa.string()),
+            ("title", pa.string()),
+            ("description", pa.string()),
+            ("license", pa.string()),
+            ("license_name", pa.string()),
+            ("issued", pa.string()),
+            ("modified", pa.string()),
+            ("publisher", pa.struct([
+                ("name", pa.string()),
+                ("website", pa.string()),
+            ])),
+            ("distribution", pa.list_(pa.struct([
+                ("downloadURL", pa.string()),
+                ("accessURL", pa.string()),
+                ("title", pa.string()),
+            ]))),
+        ]),
+    }
+
+
+def convert_value(value, value_type):
+    """
+    Convert a value from an item into the python type expected by pyarrow
+    """
+    if value is None or value == "":
+        return None
+
+    if pa.types.is_string(value_type):
+        return value if isinstance(value, str) else str(value)
+
+    if pa.types.is_list(value_type):
+        if not isinstance(value, (list, tuple)):
+            value = [value]
+        return [convert_value(v, value_type.value_type) for v in value]
+
+    if pa.types.is_struct(value_type):
+        return {
+            f.name: convert_value(value.get(f.name), f.type)
+            for f in value_type
+        }
+
+    if pa.types.is_date(value_type):
+        if isinstance(value, str):
+            value = dateutil.parser.parse(value)
+        if isinstance(value, datetime.datetime):
+            value = value.date()
+        return value
+
+    if pa.types.is_timestamp(value_type):
+        if isinstance(value, str):
+            value = dateutil.parser.parse(value)
+        if not isinstance(value, datetime.datetime):
+            value = datetime.datetime.combine(value, datetime.time())
+        return value
+
+    if pa.types.is_integer(value_type):
+        return int(value)
+
+    if pa.types.is_floating(value_type):
+        return float(value)
+
+    if pa.types.is_boolean(value_type):
+        if isinstance(value, str):
+            # bool() would treat any non-empty string (eg "False") as True
+            if value.strip().lower() in TRUE_VALUES:
+                return True
+            if value.strip().lower() in FALSE_VALUES:
+                return False
+            raise ValueError("Can't convert {!r} to a boolean".format(value))
+        return bool(value)
+
+    return value
+
+
+class ParquetPipeline():
+
+    def __init__(self, parquet_dir, batch_size, compression, stats):
+        self.parquet_dir = parquet_dir
+        self.batch_size = batch_size
+        self.compression = compression
+        self.stats = stats
+        self.schemas = {}
+        self.writers = {}
+        self.buffers = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        pipeline = cls(
+            parquet_dir=crawler.settings.get('PARQUET_DIR'),
+            batch_size=crawler.settings.getint('PARQUET_BATCH_SIZE', 10000),
+            compression=crawler.settings.get('PARQUET_COMPRESSION', 'snappy'),
+            stats=crawler.stats,
+        )
+        crawler.signals.connect(pipeline.spider_closed, signal=signals.spider_closed)
+        return pipeline
+
+    def open_spider(self, spider):
+
+        if not self.parquet_dir:
+            return
+
+        if pa is None:
+            raise ImportError("pyarrow is needed to use the parquet pipeline")
+
+        self.spider_name = spider.name
+        self.temp_name = ".{}.tmp".format(uuid.uuid4().hex)
+        self.schemas = get_schemas()
+        self.writers = {}
+        self.buffers = {
+            dataset: {f.name: [] for f in schema}
+            for dataset, schema in self.schemas.items()
+        }
+
+    def spider_closed(self, spider, reason):
+        if not self.buffers:
+            return
+
+        for dataset in self.buffers:
+            self.save_records(dataset)
+
+        for dataset, writer in self.writers.items():
+            writer.close()
+            filename = self.get_filename(dataset)
+            if reason == "finished":
+                # replace any previous file for this spider in one step
+                os.replace(self.get_filename(dataset, temp=True), filename)
+                logging.info("[parquet] saved %s", filename)
+            else:
+                os.remove(self.get_filename(dataset, temp=True))
+                logging.info("[parquet] spider did not finish, %s not updated", filename)
+        self.writers = {}
+
+    def get_filename(self, dataset, temp=False):
+        # files starting with "." are ignored by parquet readers, so the
+        # file being written isn't picked up until it is complete
+        return os.path.join(
+            self.parquet_dir,
+            dataset,
+            "spider={}".format(self.spider_name),
+            self.temp_name if temp else "data.parquet",
+        )
+
+    def queue_depth(self):
+        return sum(
+            len(self.buffers[dataset][schema[0].name])
+            for dataset, schema in self.schemas.items()
+        ) if self.buffers else 0
+
+    @timed("parquet_flush")
+    def save_records(self, dataset):
+        buffer = self.buffers[dataset]
+        schema = self.schemas[dataset]
+        rows = len(buffer[schema[0].name])
+        if not rows:
+            return
+
+        if dataset not in self.writers:
+            filename = self.get_filename(dataset, temp=True)
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+            self.writers[dataset] = pq.ParquetWriter(
+                filename,
+                schema,
+                compression=self.compression,
+            )
+
+        table = pa.Table.from_arrays(
+            [pa.array(buffer[f.name], type=f.type) for f in schema],
+            schema=schema,
+        )
+        self.writers[dataset].write_table(table)
+        self.stats.inc_value('parquet/{}_rows'.format(dataset), rows)
+
+        for column in buffer.values():
+            column.clear()
+
+    @profiled
+    def process_item(self, item, spider):
+
+        if not self.buffers:
+            return item
+
+        dataset = DATASETS.get(type(item))
+        if not dataset:
+            return item
+
+        buffer = self.buffers[dataset]
+        for f in self.schemas[dataset]:
+            buffer[f.name].append(convert_value(item.get(f.name), f.type))
+
+        if len(buffer[f.name]) >= self.batch_size:
+            self.save_records(dataset)
+
+        return item
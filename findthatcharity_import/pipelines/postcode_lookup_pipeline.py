@@ -6,7 +6,8 @@ import io
 
 import scrapy
 
-from ..items import Organisation, AREA_TYPES
+from ..items import Organisation, CompactOrganisation, AREA_TYPES
+from ..profiler import profiled
 
 FIELDS_TO_COLLECT = [
     'cty', 'laua', 'ward', 'ctry', 'rgn', 'gor', 'pcon', 'ttwa', 'lsoa11', 'msoa11'
@@ -35,10 +36,11 @@ class PostcodeLookupPipeline(object):
     def close_spider(self, spider):
         pass
 
+    @profiled
     def process_item(self, item, spider):
 
         # only lookup organisations
-        if not isinstance(item, Organisation):
+        if not isinstance(item, (Organisation, CompactOrganisation)):
             return item
 
         postcode = spider.parse_postcode(item.get(self.pc_field))
@@ -53,7 +55,7 @@ class PostcodeLookupPipeline(object):
             return item
 
         request = scrapy.Request(self.pc_url.format(postcode))
-        dfd = spider.crawler.engine.download(request, spider)
+        dfd = spider.crawler.engine.download(request)
         dfd.addBoth(self.return_item, item)
         return dfd
 
@@ -63,7 +65,7 @@ class PostcodeLookupPipeline(object):
             self.stats.inc_value('postcode/postcode_not_found', 1)
             return item
 
-        postcode_data = json.loads(response.body_as_unicode())
+        postcode_data = json.loads(response.text)
 
         item['location'] = []
 
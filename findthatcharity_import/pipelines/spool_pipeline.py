@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+import datetime
+import gzip
+import json
+import logging
+import os
+
+from itemadapter import ItemAdapter
+from scrapy import signals
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+from .. import items
+from ..profiler import profiled
+from ..timing import timed
+
+# item classes that can be saved to the spool and recreated by `scrapy replay`
+ITEM_TYPES = {
+    i.__name__: i
+    for i in (items.Organisation, items.CompactOrganisation, items.Link, items.Source, items.Identifier)
+}
+
+SEGMENT_EXTENSIONS = {
+    "ndjson": ".ndjson.gz",
+    "msgpack": ".msgpack.gz",
+}
+
+
+def encode_value(value):
+    """
+    Convert dates into a form that can be turned back into a date by `decode_value`
+    """
+    if isinstance(value, datetime.datetime):
+        return {"$datetime": value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {"$date": value.isoformat()}
+    if isinstance(value, (set, tuple)):
+        return list(value)
+    raise TypeError("Can't spool value of type {}".format(type(value).__name__))
+
+
+def decode_value(value):
+    if len(value) == 1:
+        if "$datetime" in value:
+            return datetime.datetime.fromisoformat(value["$datetime"])
+        if "$date" in value:
+            return datetime.date.fromisoformat(value["$date"])
+    return value
+
+
+def get_spool_dir(spool_dir, spider_name, crawl_id=None):
+    """
+    Get the directory used for a crawl. If no `crawl_id` is given then
+    the most recent crawl for the spider is used.
+    """
+    spider_dir = os.path.join(spool_dir, spider_name)
+    if crawl_id is None:
+        crawls = [
+            os.path.join(spider_dir, d) for d in os.listdir(spider_dir)
+            if os.path.isdir(os.path.join(spider_dir, d))
+        ]
+        if not crawls:
+            return None
+        return max(crawls, key=os.path.getmtime)
+    return os.path.join(spider_dir, crawl_id)
+
+
+def read_segment(filename):
+    """
+    Read all the records from a spool segment
+
+    Returns a list of (item type, fields) tuples
+    """
+    with gzip.open(filename, "rb") as f:
+        if filename.endswith(SEGMENT_EXTENSIONS["msgpack"]):
+            return [
+                tuple(r) for r in
+                msgpack.Unpacker(f, object_hook=decode_value, raw=False)
+            ]
+        return [
+            tuple(json.loads(line, object_hook=decode_value))
+            for line in f
+        ]
+
+
+class SpoolPipeline():
+
+    def __init__(self, spool_dir, spool_format, segment_size, compresslevel, stats):
+        self.spool_dir = spool_dir
+        self.spool_format = spool_format
+        self.segment_size = segment_size
+        self.compresslevel = compresslevel
+        self.stats = stats
+        self.crawl_dir = None
+        self.segment = None
+        self.segment_count = 0
+        self.segment_items = 0
+        self.item_count = 0
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        pipeline = cls(
+            spool_dir=crawler.settings.get('SPOOL_DIR'),
+            spool_format=crawler.settings.get('SPOOL_FORMAT', 'ndjson'),
+            segment_size=crawler.settings.getint('SPOOL_SEGMENT_SIZE', 50000),
+            compresslevel=crawler.settings.getint('SPOOL_COMPRESSLEVEL', 3),
+            stats=crawler.stats,
+        )
+        crawler.signals.connect(pipeline.spider_closed, signal=signals.spider_closed)
+        return pipeline
+
+    def open_spider(self, spider):
+
+        if not self.spool_dir:
+            return
+
+        if self.spool_format not in SEGMENT_EXTENSIONS:
+            raise ValueError("Unknown spool format: {}".format(self.spool_format))
+        if self.spool_format == "msgpack" and msgpack is None:
+            raise ImportError("msgpack is needed to use the msgpack spool format")
+
+        self.crawl_id = spider.crawl_id
+        self.crawl_dir = os.path.join(self.spool_dir, spider.name, self.crawl_id)
+        os.makedirs(self.crawl_dir, exist_ok=True)
+        self.segment_count = 0
+        self.item_count = 0
+        logging.info("[spool] saving items to %s", self.crawl_dir)
+
+    def spider_closed(self, spider, reason):
+        if self.crawl_dir is None:
+            return
+        self.close_segment()
+
+        with open(os.path.join(self.crawl_dir, "manifest.json"), "w") as manifest:
+            json.dump({
+                "spider": spider.name,
+                "crawl_id": self.crawl_id,
+                "finish_reason": reason,
+                "format": self.spool_format,
+                "segments": self.segment_count,
+                "items": self.item_count,
+            }, manifest, indent=4)
+        self.crawl_dir = None
+
+    def segment_filename(self, temp=False):
+        return os.path.join(
+            self.crawl_dir,
+            "{}{:05d}{}".format(
+                "." if temp else "",
+                self.segment_count,
+                SEGMENT_EXTENSIONS[self.spool_format],
+            ),
+        )
+
+    def open_segment(self):
+        self.segment = gzip.open(self.segment_filename(temp=True), "wb", compresslevel=self.compresslevel)
+        self.segment_items = 0
+
+    @timed("spool_flush")
+    def close_segment(self):
+        if self.segment is None:
+            return
+        self.segment.close()
+        # segments are only visible to `scrapy replay` once they are complete
+        os.replace(self.segment_filename(temp=True), self.segment_filename())
+        self.stats.inc_value('spool/segments')
+        self.segment = None
+        self.segment_count += 1
+
+    @profiled
+    def process_item(self, item, spider):
+
+        if self.crawl_dir is None:
+            return item
+
+        item_type = type(item).__name__
+        if item_type not in ITEM_TYPES:
+            return item
+
+        if self.segment is None:
+            self.open_segment()
+
+        record = [item_type, ItemAdapter(item).asdict()]
+        if self.spool_format == "msgpack":
+            self.segment.write(msgpack.packb(record, default=encode_value, use_bin_type=True))
+        else:
+            self.segment.write(json.dumps(record, default=encode_value).encode("utf8"))
+            self.segment.write(b"\n")
+
+        self.segment_items += 1
+        self.item_count += 1
+        self.stats.inc_value('spool/items')
+
+        if self.segment_items >= self.segment_size:
+            self.close_segment()
+
+        return item
@@ -1,5 +1,4 @@
 # -*- coding: utf-8 -*-
-import json
 import logging
 import uuid
 import datetime
@@ -10,20 +9,30 @@ from sqlalchemy.exc import InternalError, IntegrityError
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.sql.expression import insert, delete
 from sqlalchemy.dialects import postgresql, mysql
+from sqlalchemy.types import JSON
 import scrapy
 from scrapy import signals
-from scrapy.utils.serialize import ScrapyJSONEncoder
+from scrapy.utils.misc import load_object
 
 from ..db import metadata, tables
+from ..checkpoint import get_checkpoint_path, save_checkpoint, remove_checkpoint
+from ..profiler import profiled
+from ..timing import timed
 
 class SQLSavePipeline(object):
 
-    def __init__(self, db_uri, chunk_size, stats):
+    def __init__(self, db_uri, chunk_size, stats, json_serialiser, settings=None):
         self.db_uri = db_uri
         self.chunk_size = chunk_size
         self.stats = stats
+        self.json_serialiser = json_serialiser
+        self.settings = settings
         self.spider_name = None
         self.crawl_id = uuid.uuid4().hex
+        self.checkpoint_path = None
+        self.positions = {}
+        self.sources = {}
+        self.chunks = 0
 
         self.log_stream = StringIO()
         self.log_handler = logging.StreamHandler(self.log_stream)
@@ -42,10 +51,14 @@ class SQLSavePipeline(object):
             db_uri=crawler.settings.get('DB_URI'),
             chunk_size=int(crawler.settings.get('DB_CHUNK', 5000)),
             stats=crawler.stats,
+            json_serialiser=load_object(crawler.settings.get(
+                'JSON_SERIALISER', 'findthatcharity_import.serialisers.dumps')),
+            settings=crawler.settings,
         )
         crawler.signals.connect(pipeline.spider_closed, signal=signals.spider_closed)
         return pipeline
 
+    @profiled
     def process_item(self, item, spider):
         if hasattr(self, "conn"):
             this_tables = item.to_tables()
@@ -55,12 +68,27 @@ class SQLSavePipeline(object):
                 self.records[t].extend(this_tables[t])
                 self.record_count += 1
 
+            # keep track of the rows that will be committed in this chunk
+            position = spider.item_position(item) if hasattr(spider, "item_position") else None
+            if position:
+                key, row = position
+                self.positions[key] = row + 1
+                version = getattr(spider, "source_versions", {}).get(key)
+                if version:
+                    self.sources[key] = version
+
             if self.record_count > self.chunk_size:
                 self.commit_records(spider)
-                pass
+                if self.checkpoint_path:
+                    self.conn.commit()
+                    self.save_checkpoint()
 
         return item
 
+    def queue_depth(self):
+        return getattr(self, "record_count", 0)
+
+    @timed("sql_flush")
     def commit_records(self, spider):
         spider.logger.info("Commiting {} records".format(getattr(self, "record_count", 0)))
         self.save_stats()
@@ -69,6 +97,7 @@ class SQLSavePipeline(object):
             table = self.tables[t]
             cols = [c.name for c in table.columns]
             pks = [c.name for c in table.primary_key]
+            json_cols = [c.name for c in table.columns if isinstance(c.type, JSON)]
             vals = []
 
             if self.engine.name == 'postgresql':
@@ -94,8 +123,10 @@ class SQLSavePipeline(object):
                 if self.engine.name == 'postgresql':
                     vals.append({c: r.get(c) for c in cols})
                 else:
-                    vals.append({c: str(r.get(c)) if type(r.get(c)) in (
-                        list, dict) else r.get(c) for c in cols})
+                    # JSON columns are serialised by the engine, any other
+                    # lists or dicts need to be turned into a JSON string
+                    vals.append({c: self.json_serialiser(r.get(c)) if type(r.get(c)) in (
+                        list, dict) and c not in json_cols else r.get(c) for c in cols})
             if vals:
                 self.conn.execute(upsert_statement, vals)
 
@@ -105,8 +136,9 @@ class SQLSavePipeline(object):
 
     def open_spider(self, spider):
         self.spider_name = spider.name
+        self.crawl_id = getattr(spider, "crawl_id", self.crawl_id)
         if self.db_uri:
-            self.engine = create_engine(self.db_uri)
+            self.engine = create_engine(self.db_uri, json_serializer=self.json_serialiser)
             Session = sessionmaker(bind=self.engine)
             self.conn = Session()
 
@@ -114,16 +146,17 @@ class SQLSavePipeline(object):
             self.records = {t: [] for t in self.tables}
             metadata.create_all(self.engine)
 
-            # delete any existing records from the tables
-            for t, table in self.tables.items():
-                cols = [c.name for c in table.columns]
-                if "scrape_id" in cols and "spider" in cols:
-                    self.conn.execute(
-                        delete(table).where(and_(
-                            table.c.scrape_id != self.crawl_id,
-                            table.c.spider == self.spider_name
-                        ))
-                    )
+            if self.settings is not None and self.settings.getbool('CHECKPOINT_ENABLED'):
+                # chunks are committed as they go, and the existing records
+                # are only deleted once the crawl has finished
+                self.checkpoint_path = get_checkpoint_path(self.settings, self.spider_name)
+                checkpoint = getattr(spider, "checkpoint", None)
+                if checkpoint:
+                    self.chunks = checkpoint["chunks"]
+                    self.positions = dict(checkpoint["positions"])
+                    self.sources = dict(checkpoint.get("sources", {}))
+            else:
+                self.delete_previous()
 
             # do any tasks before the spider is run
             # if hasattr(spider, "name"):
@@ -143,30 +176,63 @@ class SQLSavePipeline(object):
 
             self.commit_records(spider)
 
+    def delete_previous(self):
+        # delete any existing records from the tables
+        for t, table in self.tables.items():
+            cols = [c.name for c in table.columns]
+            if "scrape_id" in cols and "spider" in cols:
+                self.conn.execute(
+                    delete(table).where(and_(
+                        table.c.scrape_id != self.crawl_id,
+                        table.c.spider == self.spider_name
+                    ))
+                )
+
+    def save_checkpoint(self):
+        self.chunks += 1
+        save_checkpoint(self.checkpoint_path, self.crawl_id, self.chunks, self.positions, self.sources)
+
     def spider_closed(self, spider, reason):
         if hasattr(self, "conn"):
+            if reason == "not_modified":
+                # the data hasn't changed, so keep the records from the
+                # previous crawl and just record this scrape
+                self.conn.rollback()
+                self.records = {t: [] for t in self.tables}
+                self.record_count = 0
+            elif self.checkpoint_path and reason == "finished":
+                self.delete_previous()
             self.commit_records(spider)
             self.conn.commit()
             self.conn.close()
 
+            if self.checkpoint_path:
+                if reason == "finished":
+                    remove_checkpoint(self.checkpoint_path)
+                elif reason != "not_modified":
+                    self.save_checkpoint()
+
     def save_stats(self):
         stats = self.stats.get_stats()
 
         status = stats.get('finish_reason')
         if not stats.get('finish_time'):
             status = 'in_progress'
+        elif status == 'not_modified':
+            pass
         elif stats.get('log_count/ERROR', 0) > 0 or stats.get('item_scraped_count', 0) == 0:
             status = "errors"
 
         to_save = {
             "id": self.crawl_id,
             "spider": self.spider_name,
-            "stats": json.dumps(stats, cls=ScrapyJSONEncoder),
+            "stats": self.json_serialiser(stats),
             "finish_reason": status,
             "errors": stats.get('log_count/ERROR', 0),
             "items": stats.get('item_scraped_count', 0),
             "start_time": stats.get('start_time', datetime.datetime.utcnow()),
             "finish_time": stats.get('finish_time'),
             "log": self.log_stream.getvalue(),
+            "peak_memory": stats.get('memory/peak_rss_mb'),
         }
         self.records['scrape'].append(to_save)
@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+import cProfile
+import functools
+import logging
+import os
+import pstats
+import signal
+import sys
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.project import data_path
+
+
+class StackSampler(object):
+    """
+    Sample the stacks of the threads running spider code
+
+    Every `interval` seconds the current stack of each thread that is inside
+    `profile()` is recorded. The results are saved in the "collapsed stack"
+    format used by flame graph tools (eg `flamegraph.pl` or speedscope),
+    with one line per stack and the number of times it was seen.
+    """
+
+    extension = ".collapsed"
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.active = {}
+        self.samples = Counter()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.running = False
+
+    def start(self):
+        self.running = True
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.sample_loop, name="stack-sampler", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.running = False
+
+    def close(self):
+        self.running = False
+        self.stop_event.set()
+
+    @contextmanager
+    def profile(self):
+        thread_id = threading.get_ident()
+        self.active[thread_id] = self.active.get(thread_id, 0) + 1
+        try:
+            yield
+        finally:
+            self.active[thread_id] -= 1
+            if not self.active[thread_id]:
+                del self.active[thread_id]
+
+    def sample_loop(self):
+        while not self.stop_event.wait(self.interval):
+            if self.running:
+                self.sample()
+
+    def sample(self):
+        frames = sys._current_frames()
+        for thread_id in list(self.active):
+            frame = frames.get(thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append("{} ({}:{})".format(
+                    code.co_name, os.path.basename(code.co_filename), code.co_firstlineno))
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def save(self, path):
+        with open(path, "w") as f:
+            for stack, count in self.samples.most_common():
+                f.write("{} {}\n".format(stack, count))
+        return sum(self.samples.values())
+
+
+class CallProfiler(object):
+    """
+    Profile the spider code with `cProfile`
+
+    `cProfile` only profiles the thread it is enabled in, so each thread that
+    runs spider code gets its own profile, and they are combined when saved.
+    Results are saved in the `pstats` format (open them with `python -m pstats`
+    or snakeviz).
+    """
+
+    extension = ".pstats"
+
+    def __init__(self):
+        self.local = threading.local()
+        self.profiles = []
+        self.running = False
+
+    def start(self):
+        self.running = True
+
+    def stop(self):
+        self.running = False
+
+    def close(self):
+        self.running = False
+
+    @contextmanager
+    def profile(self):
+        depth = getattr(self.local, "depth", 0)
+        self.local.depth = depth + 1
+        enabled = False
+        if depth == 0 and self.running:
+            if not hasattr(self.local, "profile"):
+                self.local.profile = cProfile.Profile()
+                self.profiles.append(self.local.profile)
+            self.local.profile.enable()
+            enabled = True
+        try:
+            yield
+        finally:
+            self.local.depth = depth
+            if enabled:
+                self.local.profile.disable()
+
+    def save(self, path):
+        profiles = [p for p in self.profiles if p.getstats()]
+        if not profiles:
+            return 0
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        stats.dump_stats(path)
+        return stats.total_calls
+
+
+PROFILERS = {
+    "sample": StackSampler,
+    "cprofile": CallProfiler,
+}
+
+
+def profiled(func):
+    """
+    Decorator for a pipeline's `process_item`, which is profiled when the
+    spider is being profiled by `ProfilerMiddleware`
+    """
+    @functools.wraps(func)
+    def wrapper(self, item, spider):
+        profiler = getattr(spider, "profiler", None)
+        if profiler is None:
+            return func(self, item, spider)
+        with profiler.profile():
+            return func(self, item, spider)
+    return wrapper
+
+
+class ProfilerMiddleware(object):
+    """
+    Profile one spider's callbacks and the item pipelines' `process_item`
+
+    Set `PROFILE_SPIDER` to the name of the spider to profile. Each step through
+    a callback's output, any generator run by `BaseScraper.offload()` and each
+    call to a pipeline's `process_item` decorated with `profiled` is profiled,
+    and the results are saved in `PROFILE_DIR/<spider>/<crawl_id>` when the
+    spider closes. For async callbacks (such as those using `offload()`) the
+    steps include the time spent waiting for their output.
+
+    If `PROFILE_SIGNAL` is set (eg to `SIGUSR1`) the profiler starts paused, and
+    sending the signal to the process starts or stops it. The results so far
+    are saved each time it is stopped.
+    """
+
+    def __init__(self, crawler, spider_names, mode, interval, profile_dir, signal_name=None):
+        self.crawler = crawler
+        self.spider_names = spider_names
+        self.mode = mode
+        self.interval = interval
+        self.profile_dir = profile_dir
+        self.signal_name = signal_name
+        self.profiler = None
+        self.path = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        spider_names = crawler.settings.getlist('PROFILE_SPIDER')
+        if not spider_names:
+            raise NotConfigured
+        mode = crawler.settings.get('PROFILE_MODE', 'sample')
+        if mode not in PROFILERS:
+            raise ValueError("Unknown profile mode: {}".format(mode))
+        mw = cls(
+            crawler=crawler,
+            spider_names=spider_names,
+            mode=mode,
+            interval=crawler.settings.getfloat('PROFILE_INTERVAL', 0.005),
+            profile_dir=crawler.settings.get('PROFILE_DIR') or data_path('profiles'),
+            signal_name=crawler.settings.get('PROFILE_SIGNAL'),
+        )
+        crawler.signals.connect(mw.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(mw.spider_closed, signal=signals.spider_closed)
+        return mw
+
+    def spider_opened(self, spider):
+        if spider.name not in self.spider_names:
+            return
+
+        if self.mode == "sample":
+            self.profiler = StackSampler(self.interval)
+        else:
+            self.profiler = CallProfiler()
+        spider.profiler = self.profiler
+
+        directory = os.path.join(self.profile_dir, spider.name)
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(
+            directory, "{}{}".format(getattr(spider, "crawl_id", spider.name), self.profiler.extension))
+
+        if self.signal_name:
+            signal.signal(getattr(signal, self.signal_name), self.toggle)
+            logging.info("[profiler] send %s to process %s to start profiling %s",
+                         self.signal_name, os.getpid(), spider.name)
+        else:
+            self.profiler.start()
+            logging.info("[profiler] profiling %s", spider.name)
+
+    def toggle(self, signum, frame):
+        # signal handlers can interrupt the reactor at any point, so the
+        # profiler is started or stopped (and saved) from the reactor loop
+        from twisted.internet import reactor
+        reactor.callFromThread(self.toggle_profiler)
+
+    def toggle_profiler(self):
+        if self.profiler is None:
+            return
+        if self.profiler.running:
+            self.profiler.stop()
+            logging.info("[profiler] profiling stopped")
+            self.save()
+        else:
+            self.profiler.start()
+            logging.info("[profiler] profiling started")
+
+    def save(self):
+        count = self.profiler.save(self.path)
+        logging.info("[profiler] saved profile (%s %s) to %s", count,
+                     "samples" if self.mode == "sample" else "calls", self.path)
+
+    def spider_closed(self, spider):
+        if self.profiler is None:
+            return
+        self.profiler.close()
+        self.save()
+        self.profiler = None
+
+    def process_spider_output(self, response, result, spider):
+        profiler = self.profiler
+        if profiler is None:
+            yield from result
+            return
+        results = iter(result)
+        while True:
+            with profiler.profile():
+                try:
+                    output = next(results)
+                except StopIteration:
+                    return
+            yield output
+
+    async def process_spider_output_async(self, response, result, spider):
+        # scrapy 2.13+ passes the output of every callback as an async iterator
+        profiler = self.profiler
+        if profiler is None:
+            async for output in result:
+                yield output
+            return
+        while True:
+            with profiler.profile():
+                try:
+                    output = await result.__anext__()
+                except StopAsyncIteration:
+                    return
+            yield output
@@ -0,0 +1,3 @@
+"""
+Readers for data files that are too large to load into memory at once
+"""
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+import json
+import re
+
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+# the most characters a number can be cut short by and still decode - eg
+# "1.5e+" decodes as 1.5, leaving "e+"
+NUMBER_TAIL = 2
+
+_decoder = json.JSONDecoder()
+
+
+class JSONStream():
+    """
+    Decode JSON values one at a time from a text file object
+    """
+
+    def __init__(self, fileobj, chunk_size=64 * 1024):
+        self.fileobj = fileobj
+        self.chunk_size = chunk_size
+        self.data = ""
+        self.pos = 0
+
+    def fill(self):
+        chunk = self.fileobj.read(self.chunk_size)
+        if not chunk:
+            return False
+        self.data = self.data[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def skip_whitespace(self):
+        while True:
+            self.pos = WHITESPACE.match(self.data, self.pos).end()
+            if self.pos < len(self.data):
+                return
+            if not self.fill():
+                raise ValueError("Unexpected end of JSON data")
+
+    def next_char(self):
+        self.skip_whitespace()
+        char = self.data[self.pos]
+        self.pos += 1
+        return char
+
+    def peek(self):
+        self.skip_whitespace()
+        return self.data[self.pos]
+
+    def expect(self, char):
+        found = self.next_char()
+        if found != char:
+            raise ValueError("Expected '{}' but found '{}'".format(char, found))
+
+    def decode(self):
+        """
+        Decode the next value, reading more data if it isn't complete
+        """
+        self.skip_whitespace()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.data, self.pos)
+            except json.JSONDecodeError:
+                if not self.fill():
+                    raise
+                continue
+            # a number near the end of the data may have been cut short, either
+            # in its digits or after a "." or "e" which isn't followed by any
+            if (not isinstance(value, (str, list, dict))
+                    and len(self.data) - end <= NUMBER_TAIL and self.fill()):
+                continue
+            self.pos = end
+            return value
+
+
+def iter_json_array(fileobj, key=None, chunk_size=64 * 1024):
+    """
+    Iterate through the elements of a JSON array, decoding one at a time
+
+    If `key` is given then the array is found in that key of the top level
+    object, otherwise the file should contain a single array. Any keys in the
+    object before `key` are decoded and discarded, and anything after the
+    array is not read.
+    """
+    stream = JSONStream(fileobj, chunk_size)
+
+    if key is not None:
+        stream.expect("{")
+        while True:
+            name = stream.decode()
+            stream.expect(":")
+            if name == key:
+                break
+            stream.decode()
+            if stream.next_char() == "}":
+                raise KeyError(key)
+
+    stream.expect("[")
+    if stream.peek() == "]":
+        return
+    while True:
+        yield stream.decode()
+        char = stream.next_char()
+        if char == "]":
+            return
+        if char != ",":
+            raise ValueError("Expected ',' or ']' but found '{}'".format(char))
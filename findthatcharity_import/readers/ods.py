@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+import datetime
+import re
+import zipfile
+from xml.etree import ElementTree
+
+TABLE_NS = "{urn:oasis:names:tc:opendocument:xmlns:table:1.0}"
+OFFICE_NS = "{urn:oasis:names:tc:opendocument:xmlns:office:1.0}"
+TEXT_NS = "{urn:oasis:names:tc:opendocument:xmlns:text:1.0}"
+
+TABLE = TABLE_NS + "table"
+ROW = TABLE_NS + "table-row"
+CELLS = (TABLE_NS + "table-cell", TABLE_NS + "covered-table-cell")
+
+DURATION = re.compile(r"PT(\d+)H(\d+)M(\d+)")
+
+
+def _text(el):
+    """
+    Text of a cell, with each paragraph on a new line
+    """
+    paragraphs = []
+    for p in el:
+        if p.tag == TEXT_NS + "p":
+            paragraphs.append("".join(_inline_text(p)))
+    return "\n".join(paragraphs)
+
+
+def _inline_text(el):
+    if el.text:
+        yield el.text
+    for child in el:
+        if child.tag == TEXT_NS + "s":
+            yield " " * int(child.get(TEXT_NS + "c", 1))
+        elif child.tag == TEXT_NS + "tab":
+            yield "\t"
+        elif child.tag == TEXT_NS + "line-break":
+            yield "\n"
+        else:
+            yield from _inline_text(child)
+        if child.tail:
+            yield child.tail
+
+
+def _number(value):
+    value = float(value)
+    if value == int(value):
+        return int(value)
+    return value
+
+
+def cell_value(cell):
+    """
+    Get the value of a cell, converted in the same way as pyexcel-ods3
+    """
+    value_type = cell.get(OFFICE_NS + "value-type")
+    if value_type in ("float", "percentage"):
+        return _number(cell.get(OFFICE_NS + "value"))
+    if value_type == "currency":
+        return "{} {}".format(_number(cell.get(OFFICE_NS + "value")), cell.get(OFFICE_NS + "currency"))
+    if value_type == "date":
+        value = cell.get(OFFICE_NS + "date-value")
+        if len(value) == 10:
+            return datetime.datetime.strptime(value, "%Y-%m-%d").date()
+        if len(value) == 19:
+            return datetime.datetime.strptime(value, "%Y-%m-%dT%H:%M:%S")
+        return datetime.datetime.strptime(value[0:26], "%Y-%m-%dT%H:%M:%S.%f")
+    if value_type == "time":
+        match = DURATION.match(cell.get(OFFICE_NS + "time-value", ""))
+        if not match:
+            return None
+        hours, minutes, seconds = [int(g) for g in match.groups()]
+        if hours < 24:
+            return datetime.time(hours, minutes, seconds)
+        return datetime.timedelta(hours=hours, minutes=minutes, seconds=seconds)
+    if value_type == "boolean":
+        return cell.get(OFFICE_NS + "boolean-value") == "true"
+    if cell.get(OFFICE_NS + "string-value") is not None:
+        return cell.get(OFFICE_NS + "string-value")
+    return _text(cell)
+
+
+def row_values(row):
+    """
+    Values of the cells in a row, with empty cells as "" and any empty
+    cells at the end of the row removed
+    """
+    values = []
+    empty = 0
+    for cell in row:
+        if cell.tag not in CELLS:
+            continue
+        repeat = int(cell.get(TABLE_NS + "number-columns-repeated", 1))
+        value = cell_value(cell)
+        if value == "":
+            # empty cells are only added if there's a value after them
+            empty += repeat
+            continue
+        values.extend([""] * empty)
+        values.extend([value] * repeat)
+        empty = 0
+    return values
+
+
+def iter_ods_rows(fileobj, sheets):
+    """
+    Iterate through the rows of some of the sheets in an ODS file
+
+    `fileobj` can be a path or a binary file object. `content.xml` is
+    parsed as it is read, and only rows in the named `sheets` are turned
+    into lists of values. Yields `(sheet_name, row)` tuples, in the order
+    the sheets appear in the file.
+
+    Rows are returned in the same way as pyexcel-ods3, apart from
+    empty rows at the end of a sheet, which are left out.
+    """
+    sheets = set(sheets)
+    with zipfile.ZipFile(fileobj) as z, z.open("content.xml") as content:
+        sheet = None
+        table = None
+        empty_rows = 0
+        for event, el in ElementTree.iterparse(content, events=("start", "end")):
+            if event == "start":
+                if el.tag == TABLE:
+                    sheet = el.get(TABLE_NS + "name")
+                    table = el
+                    empty_rows = 0
+                continue
+
+            if el.tag == TABLE:
+                sheet = None
+                table = None
+                el.clear()
+                continue
+
+            if el.tag != ROW:
+                continue
+
+            if sheet in sheets:
+                repeat = int(el.get(TABLE_NS + "number-rows-repeated", 1))
+                values = row_values(el)
+                if not values:
+                    # empty rows are only returned if there's a row after them
+                    empty_rows += repeat
+                else:
+                    for _ in range(empty_rows):
+                        yield (sheet, [])
+                    for _ in range(repeat):
+                        yield (sheet, list(values))
+                    empty_rows = 0
+
+            # discard the rows that have been read
+            if table is not None:
+                table.clear()
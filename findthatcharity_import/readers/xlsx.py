@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+import datetime
+import posixpath
+import re
+import zipfile
+from xml.etree import ElementTree
+
+REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+DCTERMS_NS = "{http://purl.org/dc/terms/}"
+
+# built in number formats that display a date or time
+DATE_FORMAT_IDS = set(range(14, 23)) | set(range(45, 48))
+
+# parts of a number format that don't affect whether it's a date
+FORMAT_STRIP = re.compile(r'\[[^\]]*\]|"[^"]*"|\\.')
+DATE_FORMAT = re.compile(r'[dmyhs]', re.IGNORECASE)
+
+EPOCH_1900 = datetime.datetime(1899, 12, 30)
+EPOCH_1904 = datetime.datetime(1904, 1, 1)
+
+
+def is_date_format(format_code):
+    format_code = FORMAT_STRIP.sub("", format_code.split(";")[0])
+    return bool(DATE_FORMAT.search(format_code))
+
+
+_column_indexes = {}
+
+
+def column_index(ref):
+    """
+    Get the zero-based column index from a cell reference like "AB12"
+    """
+    letters = ref.rstrip("0123456789")
+    index = _column_indexes.get(letters)
+    if index is None:
+        index = 0
+        for char in letters:
+            index = index * 26 + (ord(char) - 64)
+        index = _column_indexes[letters] = index - 1
+    return index
+
+
+def local_name(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+class XLSXReader():
+    """
+    Read the values from the sheets of an XLSX file without loading it all
+
+    The sheet XML is parsed as it is read, and each row is returned as a
+    tuple of plain values, with `None` for empty cells. Shared strings are
+    looked up, numbers are returned as `int` or `float`, and numbers with a
+    date format are returned as `datetime`. Formulas give the value Excel last
+    calculated for them.
+
+    `fileobj` can be a path or a binary file object (which must be seekable).
+    """
+
+    def __init__(self, fileobj):
+        self.zip = zipfile.ZipFile(fileobj)
+        self.sheets = self._get_sheets()
+        self.shared_strings = self._get_shared_strings()
+        self.date_styles = self._get_date_styles()
+        self.modified = self._get_modified()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.zip.close()
+
+    @property
+    def sheetnames(self):
+        return list(self.sheets.keys())
+
+    def find_sheets(self, pattern):
+        """
+        Names of the sheets which match a regular expression, in workbook order
+        """
+        pattern = re.compile(pattern)
+        return [s for s in self.sheets if pattern.search(s)]
+
+    def _parse(self, name):
+        with self.zip.open(name) as f:
+            return ElementTree.parse(f).getroot()
+
+    def _get_sheets(self):
+        workbook = self._parse("xl/workbook.xml")
+        rels = {
+            rel.get("Id"): rel.get("Target")
+            for rel in self._parse("xl/_rels/workbook.xml.rels")
+        }
+        self.epoch = EPOCH_1900
+        sheets = {}
+        for el in workbook.iter():
+            tag = local_name(el.tag)
+            if tag == "workbookPr" and el.get("date1904") in ("1", "true"):
+                self.epoch = EPOCH_1904
+            elif tag == "sheet":
+                target = rels[el.get(REL_NS + "id")]
+                if target.startswith("/"):
+                    target = target[1:]
+                else:
+                    target = posixpath.join("xl", target)
+                sheets[el.get("name")] = target
+        return sheets
+
+    def _get_shared_strings(self):
+        if "xl/sharedStrings.xml" not in self.zip.namelist():
+            return []
+        strings = []
+        with self.zip.open("xl/sharedStrings.xml") as f:
+            for _, el in ElementTree.iterparse(f):
+                if local_name(el.tag) == "si":
+                    strings.append(self._text(el))
+                    el.clear()
+        return strings
+
+    def _get_date_styles(self):
+        """
+        Find the indexes of the cell styles which use a date format
+        """
+        if "xl/styles.xml" not in self.zip.namelist():
+            return set()
+        styles = self._parse("xl/styles.xml")
+        date_formats = set(DATE_FORMAT_IDS)
+        date_styles = set()
+        for el in styles:
+            if local_name(el.tag) == "numFmts":
+                for fmt in el:
+                    if is_date_format(fmt.get("formatCode", "")):
+                        date_formats.add(int(fmt.get("numFmtId")))
+            elif local_name(el.tag) == "cellXfs":
+                for i, xf in enumerate(el):
+                    if int(xf.get("numFmtId", 0)) in date_formats:
+                        date_styles.add(str(i))
+        return date_styles
+
+    def _get_modified(self):
+        if "docProps/core.xml" not in self.zip.namelist():
+            return None
+        modified = self._parse("docProps/core.xml").find(DCTERMS_NS + "modified")
+        if modified is None or not modified.text:
+            return None
+        return datetime.datetime.strptime(modified.text[0:19], "%Y-%m-%dT%H:%M:%S")
+
+    def _text(self, el):
+        """
+        Text of a string element, joining any rich text runs but
+        skipping phonetic hints
+        """
+        text = []
+        for child in el:
+            tag = local_name(child.tag)
+            if tag == "t":
+                text.append(child.text or "")
+            elif tag == "r":
+                text.extend(t.text or "" for t in child if local_name(t.tag) == "t")
+        return "".join(text)
+
+    def _from_excel(self, value):
+        if 0 < value < 1:
+            return (datetime.datetime.min + datetime.timedelta(days=value)).time()
+        # excel thinks 1900 was a leap year
+        if self.epoch == EPOCH_1900 and value < 60:
+            value += 1
+        return self.epoch + datetime.timedelta(days=value)
+
+    def _value(self, cell, ns):
+        cell_type = cell.get("t", "n")
+        if cell_type == "inlineStr":
+            inline = cell.find(ns + "is")
+            return None if inline is None else self._text(inline)
+        value = cell.findtext(ns + "v")
+
+        if not value:
+            return None
+        if cell_type == "s":
+            return self.shared_strings[int(value)]
+        if cell_type == "n":
+            if "." in value or "E" in value or "e" in value:
+                value = float(value)
+            else:
+                value = int(value)
+            if cell.get("s") in self.date_styles:
+                return self._from_excel(value)
+            return value
+        if cell_type == "b":
+            return value == "1"
+        if cell_type == "d":
+            return datetime.datetime.strptime(value[0:19], "%Y-%m-%dT%H:%M:%S")
+        # formula strings and errors
+        return value
+
+    def iter_rows(self, sheet):
+        """
+        Iterate through the rows of a sheet as tuples of values
+
+        Missing rows are returned as empty rows, and rows are padded to
+        the width given in the sheet's dimensions (if it has them).
+        """
+        ns = ""
+        width = 0
+        next_row = 1
+        sheet_data = None
+        with self.zip.open(self.sheets[sheet]) as f:
+            for event, el in ElementTree.iterparse(f, events=("start", "end")):
+                if event == "start":
+                    if sheet_data is not None:
+                        continue
+                    tag = local_name(el.tag)
+                    if tag == "worksheet":
+                        ns = el.tag[:-len(tag)]
+                    elif tag == "dimension":
+                        ref = el.get("ref", "A1").split(":")[-1]
+                        width = column_index(ref) + 1
+                    elif tag == "sheetData":
+                        sheet_data = el
+                    continue
+
+                if el.tag != ns + "row":
+                    continue
+
+                row_number = int(el.get("r", next_row))
+                while next_row < row_number:
+                    yield (None,) * width
+                    next_row += 1
+
+                values = [None] * width
+                column = 0
+                for cell in el:
+                    if cell.tag != ns + "c":
+                        continue
+                    ref = cell.get("r")
+                    if ref:
+                        column = column_index(ref)
+                    while len(values) <= column:
+                        values.append(None)
+                    values[column] = self._value(cell, ns)
+                    column += 1
+
+                yield tuple(values)
+                next_row = row_number + 1
+                # discard the rows that have been read
+                sheet_data.clear()
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""
+JSON serialisers used when saving items to a database
+
+Each serialiser takes a single value and returns a JSON string. Dates and
+other non-JSON types are converted in the same way as scrapy's
+`ScrapyJSONEncoder`, so the output is the same whichever one is used. The
+serialiser used by the SQL pipeline is set with the `JSON_SERIALISER` setting.
+"""
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from scrapy.utils.serialize import ScrapyJSONEncoder
+
+_encoder = ScrapyJSONEncoder()
+
+
+def stdlib_dumps(value):
+    return json.dumps(value, cls=ScrapyJSONEncoder)
+
+
+def orjson_dumps(value):
+    # datetimes are passed through to the scrapy encoder so they are
+    # formatted the same way as with `stdlib_dumps`
+    return orjson.dumps(
+        value,
+        default=_encoder.default,
+        option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS,
+    ).decode("utf8")
+
+
+# use the fastest serialiser available
+dumps = orjson_dumps if orjson is not None else stdlib_dumps
@@ -18,6 +18,50 @@ NEWSPIDER_MODULE = 'findthatcharity_import.spiders'
 DEBUG_ENABLED = False
 DEBUG_ROWS = 500
 
+# Use the slotted CompactOrganisation item in the larger spiders
+COMPACT_ITEMS = False
+
+# Number of processes used to parse the Companies House zip files
+# (None uses one per CPU, 1 parses them in the main process)
+COMPANIES_PROCESSES = None
+
+# Number of NHS ODS files that can be parsed at the same time (each in a thread)
+NHSODS_PARALLELISM = 4
+
+# Number of spiders `crawlall` runs at once, and the total memory they can use
+# (based on each spider's `memory_mb` estimate)
+CRAWLALL_CONCURRENCY = 4
+CRAWLALL_MEMORY_MB = 8192
+
+# Save checkpoints so that an unfinished crawl can be resumed with `--resume`
+CHECKPOINT_ENABLED = False
+
+# Skip spiders whose data hasn't changed since the last finished crawl
+CONDITIONAL_GET_ENABLED = False
+
+# Record the time spent parsing and cleaning each row in the `timing/` stats
+# (which slows the crawl down a little)
+TIMING_ENABLED = False
+
+# Sample the memory used by each crawl, and optionally record the lines that
+# allocated the most memory with tracemalloc (which slows the crawl down)
+MEMORY_PROFILE_ENABLED = False
+MEMORY_PROFILE_TRACEMALLOC = False
+
+# Name of a spider to profile (eg `-s PROFILE_SPIDER=ccew`), and whether to use
+# a sampling profiler ("sample") or cProfile ("cprofile")
+PROFILE_SPIDER = None
+PROFILE_MODE = 'sample'
+
+# Show tqdm progress bars while reading files (None only shows them when
+# running in a terminal)
+PROGRESS_BARS = None
+
+# Export live metrics in the Prometheus text format to files in this directory
+# and/or at http://localhost:METRICS_PORT/metrics
+METRICS_DIR = None
+METRICS_PORT = None
+
 # CRITICAL, ERROR, WARNING, INFO, DEBUG
 LOG_LEVEL = 'INFO'
 
@@ -53,29 +97,40 @@ ROBOTSTXT_OBEY = False
 
 # Enable or disable spider middlewares
 # See https://doc.scrapy.org/en/latest/topics/spider-middleware.html
-#SPIDER_MIDDLEWARES = {
+SPIDER_MIDDLEWARES = {
 #    'findthatcharity_import.middlewares.FindthatcharityImportSpiderMiddleware': 543,
-#}
+    'findthatcharity_import.middlewares.StageTimingMiddleware': 990,
+    'findthatcharity_import.profiler.ProfilerMiddleware': 995,
+}
 
 # Enable or disable downloader middlewares
 # See https://doc.scrapy.org/en/latest/topics/downloader-middleware.html
-#DOWNLOADER_MIDDLEWARES = {
+DOWNLOADER_MIDDLEWARES = {
 #    'findthatcharity_import.middlewares.FindthatcharityImportDownloaderMiddleware': 543,
-#}
+    'findthatcharity_import.middlewares.ConditionalGetMiddleware': 800,
+    'findthatcharity_import.middlewares.FileDownloadMiddleware': 850,
+}
 
 # Enable or disable extensions
 # See https://doc.scrapy.org/en/latest/topics/extensions.html
-#EXTENSIONS = {
+EXTENSIONS = {
 #    'scrapy.extensions.telnet.TelnetConsole': None,
-#}
+    'findthatcharity_import.extensions.ReactorStallMonitor': 500,
+    'findthatcharity_import.extensions.StageTimings': 510,
+    'findthatcharity_import.extensions.MemoryProfiler': 520,
+    'findthatcharity_import.metrics.MetricsExporter': 530,
+    'findthatcharity_import.extensions.StatsFileWriter': 900,
+}
 
 # Configure item pipelines
 # See https://doc.scrapy.org/en/latest/topics/item-pipeline.html
 ITEM_PIPELINES = {
     # 'findthatcharity_import.pipelines.postcode_lookup_pipeline.PostcodeLookupPipeline': 100,
+    'findthatcharity_import.pipelines.spool_pipeline.SpoolPipeline': 200,
     'findthatcharity_import.pipelines.sqlsave_pipeline.SQLSavePipeline': 300,
     'findthatcharity_import.pipelines.elasticsearch_pipeline.ElasticSearchPipeline': 300,
     'findthatcharity_import.pipelines.mongodb_pipeline.MongoDBPipeline': 300,
+    'findthatcharity_import.pipelines.parquet_pipeline.ParquetPipeline': 300,
 }
 
 # Enable and configure the AutoThrottle extension (disabled by default)
@@ -96,5 +151,9 @@ ITEM_PIPELINES = {
 HTTPCACHE_ENABLED = True
 HTTPCACHE_EXPIRATION_SECS = 60 * 60 * 3 # three hours
 HTTPCACHE_DIR = 'httpcache'
-HTTPCACHE_IGNORE_HTTP_CODES = []
-HTTPCACHE_STORAGE = 'scrapy.extensions.httpcache.FilesystemCacheStorage'
+HTTPCACHE_IGNORE_HTTP_CODES = [304]
+# scrapy's standard FilesystemCacheStorage is used unless this is set to
+# 'findthatcharity_import.httpcache.ContentAddressedCacheStorage'
+#HTTPCACHE_STORAGE = 'findthatcharity_import.httpcache.ContentAddressedCacheStorage'
+HTTPCACHE_MAX_MB = 2048
+HTTPCACHE_COMPRESS = True
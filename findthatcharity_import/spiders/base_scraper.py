@@ -1,13 +1,31 @@
 import io
+import codecs
+import contextlib
 import csv
 import datetime
 import re
+import sys
+import threading
+import time
+import uuid
+import weakref
 
 import scrapy
 import validators
 import titlecase
-
-from ..items import Source
+from scrapy import signals
+from scrapy.http import TextResponse
+from scrapy.utils.defer import maybe_deferred_to_future
+from tqdm import tqdm
+from twisted.internet import defer
+from twisted.python import threadable
+from w3lib.encoding import read_bom
+
+from ..items import Source, Organisation, CompactOrganisation
+from ..checkpoint import get_checkpoint_path, load_checkpoint
+from ..extensions import memory_checkpoint
+from ..middlewares import response_sha256
+from ..timing import add_timings, collect_timings, time_methods
 
 DEFAULT_DATE_FORMAT = "%Y-%m-%d"
 
@@ -17,26 +35,396 @@ class BaseScraper(scrapy.Spider):
     date_fields = []
     bool_fields = []
     encoding = "utf8"
+    csv_fields = None
+    # used by `crawlall` to decide how many spiders can run at once - heavy
+    # spiders are run in their own process
+    heavy = False
+    memory_mb = 250
+    offload_queue_size = 20
+    offload_batch_size = 100
+    # set when resuming a crawl from a checkpoint
+    checkpoint = None
+    resume_positions = {}
+    resume_sources = {}
+    # set by `ProfilerMiddleware` when the spider is being profiled
+    profiler = None
+    _organisation_cls = None
+    _track_positions = None
+    # the cleaning methods called for every row, which are only timed when
+    # `TIMING_ENABLED` is set (see `findthatcharity_import.timing`)
+    timed_methods = ("clean_fields", "parse_name", "parse_postcode", "parse_url")
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # used by the pipelines to identify this crawl - can be set
+        # with `-a crawl_id=...`
+        if not getattr(self, "crawl_id", None):
+            self.crawl_id = uuid.uuid4().hex
+        self._item_positions = {}
+        # the version of each source file read, saved with the checkpoint
+        self.source_versions = {}
+        # queues of records waiting to be picked up, reported by `queue_depth()`
+        self._queues = set()
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        if crawler.settings.getbool("CHECKPOINT_RESUME"):
+            checkpoint = load_checkpoint(get_checkpoint_path(crawler.settings, spider.name))
+            if checkpoint:
+                spider.logger.info("Resuming crawl {} from checkpoint saved {}".format(
+                    checkpoint["crawl_id"], checkpoint["saved"]))
+                spider.checkpoint = checkpoint
+                spider.crawl_id = checkpoint["crawl_id"]
+                spider.resume_positions = checkpoint["positions"]
+                spider.resume_sources = checkpoint.get("sources", {})
+            else:
+                spider.logger.info("No checkpoint found, starting from the beginning")
+        if crawler.settings.getbool("TIMING_ENABLED"):
+            time_methods(spider, spider.timed_methods)
+        crawler.signals.connect(spider.item_position, signal=signals.item_dropped)
+        crawler.signals.connect(spider.clear_positions, signal=signals.spider_closed)
+        return spider
+
+    async def start(self):
+        # Scrapy 2.13+ gets the first requests from `start()` rather than
+        # `start_requests()`, which is what the spiders here define
+        for request in self.start_requests():
+            yield request
+
+    def start_requests(self):
+        for url in self.start_urls:
+            yield scrapy.Request(url, dont_filter=True)
 
     def parse_csv(self, response):
 
-        try:
-            csv_text = response.text
-        except AttributeError:
-            csv_text = response.body.decode(self.encoding)
-
-        with io.StringIO(csv_text) as a:
-            csvreader = csv.DictReader(a)
-            for k, row in enumerate(csvreader):
-                if self.settings.getbool("DEBUG_ENABLED") and k > self.settings.getint("DEBUG_ROWS", 100):
-                    break
-                yield self.parse_row(row)
+        with self.open_download(response) as f:
+            encoding, errors = self.detect_encoding(response, f)
+            yield from self.parse_csv_file(f, encoding, errors=errors)
 
         if hasattr(self, "source"):
             if not self.source["modified"]:
                 self.source["modified"] = datetime.datetime.now().isoformat()
             yield Source(**self.source)
 
+    def parse_csv_file(self, fileobj, encoding=None, fields=None, errors="strict"):
+        """
+        Send each row of a CSV file to `parse_row`
+
+        `fileobj` is a binary file, which is decoded as it is read rather
+        than all at once. If `fields` (or the spider's `csv_fields`) is set
+        then the rows only include those columns.
+        """
+        fields = fields or self.csv_fields
+        text = io.TextIOWrapper(fileobj, encoding=encoding or self.encoding, errors=errors, newline="")
+
+        if fields:
+            csvreader = csv.reader(text)
+            header = next(csvreader, [])
+            columns = [(f, header.index(f)) for f in fields if f in header]
+            rows = (
+                {f: (row[i] if i < len(row) else None) for f, i in columns}
+                for row in csvreader if row
+            )
+        else:
+            rows = csv.DictReader(text)
+
+        try:
+            for k, row in enumerate(self.progress(rows)):
+                if self.settings.getbool("DEBUG_ENABLED") and k > self.settings.getint("DEBUG_ROWS", 100):
+                    break
+                yield self.parse_row(row)
+        finally:
+            # don't close the underlying file when the wrapper is discarded
+            text.detach()
+
+    def detect_encoding(self, response, fileobj):
+        """
+        Find the encoding of a response without decoding the whole body at once
+
+        Follows the same steps as scrapy's `TextResponse.text`: any byte order
+        mark, then the declared encoding, then the first of utf-8 or cp1252
+        that can decode the whole body. The file is left positioned after
+        any byte order mark, so it isn't included in the first column name.
+        Returns the encoding and the error handler to use.
+        """
+        if not isinstance(response, TextResponse):
+            return self.encoding, "strict"
+
+        # checked first, as scrapy 2.x counts a byte order mark in the body
+        # as a declared encoding but the mark still needs skipping
+        bom_encoding, bom = read_bom(fileobj.read(4))
+        fileobj.seek(len(bom) if bom else 0)
+        if bom_encoding:
+            return bom_encoding, "replace"
+
+        encoding = response._declared_encoding()
+        if encoding:
+            return encoding, "replace"
+
+        for encoding in ("utf-8", "cp1252"):
+            decoder = codecs.getincrementaldecoder(encoding)()
+            try:
+                for chunk in iter(lambda: fileobj.read(1024 * 1024), b""):
+                    decoder.decode(chunk)
+                decoder.decode(b"", final=True)
+            except UnicodeDecodeError:
+                continue
+            finally:
+                fileobj.seek(0)
+            return encoding, "replace"
+        return "utf-8", "replace"
+
+    def open_download(self, response):
+        """
+        Open the body of a response as a binary file
+
+        Responses to requests with `download_to_file` set in their meta
+        are read from the file on disk, otherwise the response body is used.
+        """
+        path = response.meta.get("download_path")
+        if path:
+            return open(path, "rb")
+        return io.BytesIO(response.body)
+
+    async def offload(self, func, *args, **kwargs):
+        """
+        Run a generator in a worker thread, yielding its output as it is produced
+
+        Long running callbacks can use this (eg `return self.offload(self.parse_zip, response)`)
+        so that the reactor, and any other spiders running in the same process,
+        aren't blocked while the data is parsed. The output is sent back in
+        batches of `offload_batch_size` by `batches_from_thread()`. The
+        `timing/*` stats recorded by the generator are added to the crawl
+        stats on the reactor thread once it finishes.
+        """
+        from twisted.internet import reactor
+
+        def produce(put):
+            start = time.perf_counter()
+            batch = []
+            profile = self.profiler.profile() if self.profiler is not None else contextlib.nullcontext()
+            with collect_timings() as timings:
+                try:
+                    with profile:
+                        for output in func(*args, **kwargs):
+                            batch.append(output)
+                            if len(batch) >= self.offload_batch_size:
+                                if not put(batch):
+                                    # the spider has stopped reading the output
+                                    return
+                                batch = []
+                    if batch:
+                        put(batch)
+                finally:
+                    timings.inc_value("offload/worker_seconds", time.perf_counter() - start)
+                    reactor.callFromThread(add_timings, self.crawler.stats, timings.values)
+
+        name = "{}-{}".format(self.name, getattr(func, "__name__", "offload"))
+        async for batch in self.batches_from_thread(produce, name):
+            self.crawler.stats.inc_value("offload/items", len(batch))
+            for output in batch:
+                yield output
+
+    async def batches_from_thread(self, produce, name=None):
+        """
+        Run `produce(put)` in a worker thread, yielding each batch it passes to `put`
+
+        The worker hands the batches to the reactor thread with
+        `reactor.callFromThread`, and this waits on a `DeferredQueue` for each
+        one, so the reactor is never blocked or polling. At most
+        `offload_queue_size` batches wait at once - `put` blocks the worker
+        until there is room, and returns `False` if the spider has stopped
+        reading the batches. Any exception raised in the worker is raised
+        again here.
+        """
+        from twisted.internet import reactor
+
+        records = defer.DeferredQueue()
+        self._queues.add(records)
+        # a slot for each batch that can be waiting in `records`
+        slots = threading.BoundedSemaphore(self.offload_queue_size)
+        stop = threading.Event()
+
+        def put(value):
+            while not stop.is_set():
+                if slots.acquire(timeout=0.1):
+                    reactor.callFromThread(records.put, value)
+                    return True
+            return False
+
+        def worker():
+            try:
+                produce(put)
+            except Exception as e:
+                put(e)
+            else:
+                put(None)
+
+        thread = threading.Thread(target=worker, name=name or "{}-worker".format(self.name), daemon=True)
+        thread.start()
+        try:
+            while True:
+                batch = await maybe_deferred_to_future(records.get())
+                slots.release()
+                if batch is None:
+                    break
+                if isinstance(batch, Exception):
+                    raise batch
+                yield batch
+        finally:
+            stop.set()
+            self._queues.discard(records)
+
+    def queue_depth(self):
+        """
+        Number of batches of records waiting in the spider's queues (from
+        `batches_from_thread()`) for scrapy to pick them up
+        """
+        return sum(len(q.pending) for q in list(self._queues))
+
+    def progress(self, rows, desc=None, every=1000):
+        """
+        Count the rows read from a source file in the `rows_read` stat
+
+        A `tqdm` progress bar is shown if `PROGRESS_BARS` is set, or (by default)
+        if the crawl is being run in a terminal, so that cron jobs don't log
+        thousands of progress updates. The stat is updated every `every` rows.
+        """
+        show = self.settings.get("PROGRESS_BARS") if hasattr(self, "settings") else False
+        if show is None:
+            show = sys.stderr.isatty()
+        elif not isinstance(show, bool):
+            show = self.settings.getbool("PROGRESS_BARS")
+        if show:
+            rows = tqdm(rows, desc=desc)
+
+        crawler = getattr(self, "crawler", None)
+        if crawler is None:
+            yield from rows
+            return
+
+        # the stats are only updated from the reactor thread, so rows read
+        # in a worker thread (eg by `offload()`) are counted from there
+        if threadable.isInIOThread():
+            inc_value = crawler.stats.inc_value
+        else:
+            from twisted.internet import reactor
+
+            def inc_value(key, count):
+                reactor.callFromThread(crawler.stats.inc_value, key, count)
+
+        count = 0
+        for count, row in enumerate(rows, 1):
+            if not count % every:
+                inc_value("rows_read", every)
+            yield row
+        inc_value("rows_read", count % every)
+
+    def source_version(self, response):
+        """
+        Identify the version of a downloaded file, using its SHA-256 hash
+        (or the `ETag` or `Last-Modified` header if it wasn't saved to disk)
+
+        Files saved to disk are always hashed, as a stored file that is
+        reused by `FileDownloadMiddleware` has no headers.
+        """
+        if not response.meta.get("download_path"):
+            validator = response.headers.get("ETag") or response.headers.get("Last-Modified")
+            if validator:
+                return validator.decode()
+        return response_sha256(response)
+
+    def checkpointed(self, key, rows, version=None):
+        """
+        Number the rows of a source file, so that the position reached can be
+        saved in a checkpoint (see `track_position`)
+
+        If the crawl is being resumed then any rows that were committed
+        before it stopped are skipped. Yields `(position, row)` tuples.
+        If `version` (see `source_version`) is given it is saved with the
+        checkpoint, and the rows are only skipped if it hasn't changed.
+        """
+        skip = self.resume_positions.get(key, 0)
+        if version is not None:
+            self.source_versions[key] = version
+            if skip and self.resume_sources.get(key) != version:
+                self.logger.warning("{} has changed since the checkpoint was saved, reading it from the start".format(key))
+                skip = 0
+        if skip:
+            self.logger.info("Skipping {:,} rows of {} committed before resuming".format(skip, key))
+        for position, row in enumerate(rows):
+            if position < skip:
+                continue
+            yield position, row
+
+    def track_position(self, item, key, position):
+        """
+        Record which row of a source file an item came from, so the
+        SQL pipeline can save the position once the item is committed
+
+        Positions are only recorded when `CHECKPOINT_ENABLED` is set.
+        """
+        if self._track_positions is None:
+            self._track_positions = self.settings.getbool("CHECKPOINT_ENABLED")
+        if self._track_positions:
+            # items aren't hashable, so they are looked up by `id()`. The weak
+            # reference removes the entry when the item is freed, so an id
+            # that is reused can't pick up an old position
+            item_id = id(item)
+            ref = weakref.ref(item, lambda ref: self._forget_position(item_id, ref))
+            self._item_positions[item_id] = (ref, (key, position))
+        return item
+
+    def item_position(self, item):
+        """
+        Get (and forget) the position recorded for an item by `track_position`
+        """
+        entry = self._item_positions.get(id(item))
+        if entry is None or entry[0]() is not item:
+            return None
+        del self._item_positions[id(item)]
+        return entry[1]
+
+    def _forget_position(self, item_id, ref):
+        entry = self._item_positions.get(item_id)
+        if entry is not None and entry[0] is ref:
+            del self._item_positions[item_id]
+
+    def clear_positions(self):
+        self._item_positions.clear()
+
+    def memory_checkpoint(self, name):
+        """
+        Record the memory in use at a point in the crawl (see the
+        `MemoryProfiler` extension)
+
+        When called from a worker thread (eg in `offload()`) the signal is
+        sent from the reactor thread, as the handlers update the stats.
+        """
+        crawler = getattr(self, "crawler", None)
+        if crawler is None:
+            return
+        if threadable.isInIOThread():
+            crawler.signals.send_catch_log(memory_checkpoint, spider=self, name=name)
+        else:
+            from twisted.internet import reactor
+            reactor.callFromThread(crawler.signals.send_catch_log, memory_checkpoint, spider=self, name=name)
+
+    def organisation(self, **kwargs):
+        """
+        Create an organisation item
+
+        Uses the slotted `CompactOrganisation` if the `COMPACT_ITEMS`
+        setting is enabled, otherwise a standard `Organisation` item.
+        """
+        if self._organisation_cls is None:
+            if self.settings.getbool("COMPACT_ITEMS"):
+                self._organisation_cls = CompactOrganisation
+            else:
+                self._organisation_cls = Organisation
+        return self._organisation_cls(**kwargs)
+
     def get_org_id(self, record):
         return "-".join([self.org_id_prefix, str(record.get(self.id_field))])
 
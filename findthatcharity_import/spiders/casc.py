@@ -81,7 +81,7 @@ class CascSpider(BaseScraper):
             "email": None,
             "description": None,
             "organisationType": ["Community Amateur Sports Club", "Sports Club"],
-            "organisationTypePrimary": ["Community Amateur Sports Club"],
+            "organisationTypePrimary": "Community Amateur Sports Club",
             "url": None,
             "location": [],
             "latestIncome": None,
@@ -10,7 +10,6 @@ import os
 import pickle
 
 import scrapy
-import tqdm
 import redis
 
 from .base_scraper import BaseScraper
@@ -18,6 +17,8 @@ from ..items import Organisation, Source, AREA_TYPES
 
 class CCEWSpider(BaseScraper):
     name = 'ccew'
+    heavy = True
+    memory_mb = 3000
     custom_settings = {
         'DOWNLOAD_TIMEOUT': 180 * 3,
         'REDIS_URL': os.environ.get('REDIS_URL'),
@@ -138,21 +139,24 @@ class CCEWSpider(BaseScraper):
         self.source["distribution"][0]["downloadURL"] = link
         self.source["distribution"][0]["accessURL"] = self.start_urls[0]
         self.source["modified"] = datetime.datetime.now().isoformat()
-        return scrapy.Request(response.urljoin(link), callback=self.process_zip)
+        return scrapy.Request(
+            response.urljoin(link),
+            callback=self.process_zip,
+            meta={"conditional_get": True, "download_to_file": True},
+        )
 
     def process_zip(self, response):
-        self.logger.info("File size: {}".format(len(response.body)))
+        # loading the files takes several minutes, so is done in a thread
+        return self.offload(self.parse_zip, response)
+
+    def parse_zip(self, response):
         self.initialise_charities()
         
         with tempfile.TemporaryDirectory() as tmpdirname:
-            cczip_name = os.path.join(tmpdirname, 'ccew.zip')
             files = {}
 
-            with open(cczip_name, 'wb') as cczip:
-                self.logger.info("Saving ZIP to disk")
-                cczip.write(response.body)
-
-            with zipfile.ZipFile(cczip_name, 'r') as z:
+            with self.open_download(response) as cczip, zipfile.ZipFile(cczip, 'r') as z:
+                self.logger.info("File size: {}".format(cczip.seek(0, io.SEEK_END)))
                 for f in z.infolist():
                     filename = f.filename.replace(".bcp", "")
                     filepath = os.path.join(tmpdirname, f.filename)
@@ -168,7 +172,9 @@ class CCEWSpider(BaseScraper):
                     self.logger.info("Processing: {}".format(filename))
                     self.process_bcp(bcpfile, filename)
 
-        return self.process_charities()
+        # all the charities are held in memory at this point
+        self.memory_checkpoint("parse")
+        yield from self.process_charities(self.source_version(response))
 
     def process_bcp(self, bcpfile, filename):
 
@@ -176,7 +182,7 @@ class CCEWSpider(BaseScraper):
         self.date_fields = [f for f in fields if f.endswith("date")]
 
         bcpreader = bcp.DictReader(bcpfile, fieldnames=fields)
-        for k, row in tqdm.tqdm(enumerate(bcpreader)):
+        for k, row in enumerate(self.progress(bcpreader, desc=filename)):
             if self.settings.getbool("DEBUG_ENABLED") and k > 100: #self.settings.getint("DEBUG_ROWS", 100):
                 break
             row = self.clean_fields(row)
@@ -206,18 +212,23 @@ class CCEWSpider(BaseScraper):
             return self.redis.hset('charities', regno, pickle.dumps(charity))
         self.charities[regno] = charity
 
-    def get_all_charities(self):
+    def get_all_charities(self, batch_size=1000):
+        # the charities are always read in order of registered number, so a
+        # resumed crawl skips the same charities (redis doesn't keep the order)
         if self.redis:
-            for regno, charity in self.redis.hscan_iter('charities'):
-                yield (regno.decode(), pickle.loads(charity))
+            regnos = sorted(r.decode() for r in self.redis.hkeys('charities'))
+            for i in range(0, len(regnos), batch_size):
+                batch = regnos[i:i + batch_size]
+                for regno, charity in zip(batch, self.redis.hmget('charities', batch)):
+                    yield (regno, pickle.loads(charity))
         else:
-            for regno, record in self.charities.items():
-                yield (regno, record)
+            for regno in sorted(self.charities):
+                yield (regno, self.charities[regno])
 
-    def process_charities(self):
+    def process_charities(self, version=None):
         yield Source(**self.source)
         
-        for regno, record in self.get_all_charities():
+        for position, (regno, record) in self.checkpointed("charities", self.get_all_charities(), version):
 
             # helps with debugging - shouldn't normally be empty
             record["regno"] = regno
@@ -245,7 +256,7 @@ class CCEWSpider(BaseScraper):
                 elif record["gd"].lower().startswith("cio - foundation"):
                     org_types.append("Charitable Incorporated Organisation - Foundation")
 
-            yield Organisation(**{
+            item = self.organisation(**{
                 "id": self.get_org_id(record),
                 "name": self.parse_name(record.get("name")),
                 "charityNumber": record.get("regno"),
@@ -275,6 +286,7 @@ class CCEWSpider(BaseScraper):
                 "orgIDs": org_ids,
                 "source": self.source["identifier"],
             })
+            yield self.track_position(item, "charities", position)
 
     def get_locations(self, record):
         # work out locations
@@ -2,17 +2,67 @@
 import datetime
 import io
 import csv
+import multiprocessing
+import os
+import queue
 import re
+import time
 import zipfile
+from concurrent.futures import ProcessPoolExecutor
 
 import scrapy
-from tqdm import tqdm
+from scrapy.settings import Settings
 
 from .base_scraper import BaseScraper
 from ..items import Organisation, Source
+from ..timing import TimingStats, add_timings, time_methods
+
+# settings needed by the worker processes
+WORKER_SETTINGS = ("DEBUG_ENABLED", "DEBUG_ROWS", "COMPACT_ITEMS", "PROGRESS_BARS", "CHECKPOINT_ENABLED",
+                   "TIMING_ENABLED")
+ORGANISATION_FIELDS = tuple(Organisation.fields.keys())
+
+
+def process_part(path, settings, records, resume_positions=None, resume_sources=None, version=None,
+                 batch_size=1000):
+    """
+    Parse a Companies House zip file in a worker process
+
+    The field values of each organisation (and the position in the file it
+    came from) are put on the `records` queue in batches, followed by `None`
+    once the file is finished. Returns the number of rows scanned and kept,
+    the time taken and the `timing/*` stats recorded by the spider.
+    """
+    spider = CompaniesSpider()
+    spider.settings = Settings(settings)
+    spider.resume_positions = resume_positions or {}
+    spider.resume_sources = resume_sources or {}
+    # the worker has no crawler, so the timings are sent back with the result
+    spider.stats = TimingStats()
+    if spider.settings.getbool("TIMING_ENABLED"):
+        time_methods(spider, spider.timed_methods)
+    counts = {"scanned": 0, "kept": 0}
+    start = time.perf_counter()
+    batch = []
+    with open(path, "rb") as zipdata:
+        for item in spider.parse_zip(zipdata, counts, version):
+            batch.append((
+                tuple(item.get(f) for f in ORGANISATION_FIELDS),
+                spider.item_position(item),
+            ))
+            if len(batch) >= batch_size:
+                records.put(batch)
+                batch = []
+    if batch:
+        records.put(batch)
+    records.put(None)
+    return counts["scanned"], counts["kept"], time.perf_counter() - start, spider.stats.values
+
 
 class CompaniesSpider(BaseScraper):
     name = 'companies'
+    heavy = True
+    memory_mb = 2000
     allowed_domains = ['companieshouse.gov.uk']
     start_urls = ["http://download.companieshouse.gov.uk/en_output.html"]
     zip_regex = re.compile(r"BasicCompanyData-.*\.zip")
@@ -55,6 +105,8 @@ class CompaniesSpider(BaseScraper):
         "Returns_NextDueDate", "Returns_LastMadeUpDate", "ConfStmtNextDueDate", "ConfStmtLastMadeUpDate"
     ]
     date_format = "%d/%m/%Y"
+    pool = None
+    queue_size = 20
     source = {
         "title": "Free Company Data Product",
         "description": "The Free Company Data Product is a downloadable data snapshot containing \
@@ -88,31 +140,152 @@ class CompaniesSpider(BaseScraper):
                 "title": "Free Company Data Product",
             })
 
-            links.append(scrapy.Request(response.urljoin(link), callback=self.process_zip))
+            links.append(scrapy.Request(
+                response.urljoin(link),
+                callback=self.process_zip,
+                meta={"download_to_file": True},
+            ))
         return links
 
-    def process_zip(self, response):
+    async def process_zip(self, response):
         yield Source(**self.source)
-        with zipfile.ZipFile(io.BytesIO(response.body)) as z:
+
+        path = response.meta.get("download_path")
+        processes = self.get_processes()
+        if path and processes > 1:
+            async for output in self.process_zip_in_pool(path, processes, self.source_version(response)):
+                yield output
+            return
+
+        async for output in self.offload(self.parse_download, response):
+            yield output
+
+    def parse_download(self, response):
+        counts = {"scanned": 0, "kept": 0}
+        start = time.perf_counter()
+        with self.open_download(response) as zipdata:
+            yield from self.parse_zip(zipdata, counts, self.source_version(response))
+        self.memory_checkpoint("parse")
+        self.record_stats(counts["scanned"], counts["kept"], time.perf_counter() - start)
+
+    def parse_zip(self, zipdata, counts, version=None):
+        """
+        Parse the companies found in a zip file, updating `counts` with the
+        number of rows scanned and kept. `version` identifies the zip file
+        in checkpoints (see `checkpointed`)
+        """
+        included_types = frozenset(self.included_types)
+        # each member of the zip is decompressed as it is read, so the
+        # whole file is never held in memory
+        with zipfile.ZipFile(zipdata) as z:
             for f in z.infolist():
                 self.logger.info("Opening: {}".format(f.filename))
                 with z.open(f) as csvfile:
-                    reader = csv.DictReader(io.TextIOWrapper(csvfile, encoding='latin1'))
+                    reader = csv.reader(io.TextIOWrapper(csvfile, encoding='latin1'))
+
+                    # the header is only cleaned once, and rows are only turned
+                    # into dicts if they are one of the included types
+                    header = [k.strip().replace(".", "_") for k in next(reader)]
+                    category = header.index("CompanyCategory")
+
                     rowcount = 0
-                    for row in tqdm(reader):
+                    for position, row in self.checkpointed(
+                            f.filename, self.progress(reader, desc=f.filename), version):
                         if self.settings.getbool("DEBUG_ENABLED") and rowcount >= self.settings.getint("DEBUG_ROWS", 100):
                             break
 
+                        counts["scanned"] += 1
+
                         # We only want data from a subset of companies
-                        if row.get("CompanyCategory") not in self.included_types:
+                        if len(row) <= category or row[category] not in included_types:
                             continue
 
                         rowcount += 1
+                        counts["kept"] += 1
+
+                        yield self.track_position(
+                            self.parse_row(dict(zip(header, row))), f.filename, position)
+
+    def get_processes(self):
+        processes = self.settings.get("COMPANIES_PROCESSES")
+        if processes is None:
+            return os.cpu_count() or 1
+        return int(processes)
+
+    async def process_zip_in_pool(self, path, processes, version=None):
+        """
+        Parse a zip file in a worker process, yielding the items as they
+        are sent back
+
+        The batches of records from the worker are read in a thread and
+        handed to the reactor by `batches_from_thread()`, so the reactor
+        isn't blocked while waiting for them.
+        """
+        if self.pool is None:
+            context = multiprocessing.get_context("spawn")
+            self.pool = ProcessPoolExecutor(max_workers=processes, mp_context=context)
+            self.manager = context.Manager()
+
+        records = self.manager.Queue(maxsize=self.queue_size)
+        future = self.pool.submit(
+            process_part,
+            path,
+            {k: self.settings.get(k) for k in WORKER_SETTINGS},
+            records,
+            self.resume_positions,
+            self.resume_sources,
+            version,
+        )
+
+        result = []
+
+        def produce(put):
+            while True:
+                try:
+                    batch = records.get(timeout=1)
+                except queue.Empty:
+                    if future.done():
+                        # the worker has failed without finishing
+                        future.result()
+                    continue
+                if batch is None:
+                    result.append(future.result())
+                    return
+                if not put(batch):
+                    return
+
+        async for batch in self.batches_from_thread(produce, "{}-pool".format(self.name)):
+            for values, position in batch:
+                item = self.organisation(**dict(zip(ORGANISATION_FIELDS, values)))
+                if position:
+                    # the worker records the version of its own copy of the spider
+                    self.source_versions[position[0]] = version
+                    self.track_position(item, *position)
+                yield item
+
+        scanned, kept, seconds, timings = result[0]
+        # the worker can't update the stats, so the rows it read and the
+        # time spent in each stage are added here
+        self.crawler.stats.inc_value("rows_read", scanned)
+        add_timings(self.crawler.stats, timings)
+        self.record_stats(scanned, kept, seconds)
+
+    def closed(self, reason):
+        if self.pool is not None:
+            self.pool.shutdown(wait=(reason == "finished"))
+            self.manager.shutdown()
+            self.pool = None
 
-                        yield self.parse_row(row)
+    def record_stats(self, scanned, kept, seconds):
+        stats = self.crawler.stats
+        stats.inc_value("companies/rows_scanned", scanned)
+        stats.inc_value("companies/rows_kept", kept)
+        stats.inc_value("companies/seconds", seconds)
+        seconds = stats.get_value("companies/seconds") or 1
+        stats.set_value("companies/rows_scanned_per_sec", int(stats.get_value("companies/rows_scanned") / seconds))
+        stats.set_value("companies/rows_kept_per_sec", int(stats.get_value("companies/rows_kept") / seconds))
 
     def parse_row(self, row):
-        row = {k.strip().replace(".", "_"): row[k] for k in row}
         row = self.clean_fields(row)
 
         if row.get("CompanyCategory") in self.clg_types:
@@ -158,7 +331,7 @@ class CompaniesSpider(BaseScraper):
             record.get("CompanyCategory")
         ]
 
-        return Organisation(**{
+        return self.organisation(**{
             "id": self.get_org_id(record),
             "name": self.parse_name(record.get("CompanyName")),
             "charityNumber": None,
@@ -1,18 +1,20 @@
 # -*- coding: utf-8 -*-
 import datetime
 import zipfile
-import json
 import io
 
 import scrapy
 
 from .base_scraper import BaseScraper
 from ..items import Organisation, Source
+from ..readers.json_stream import iter_json_array
 
 
 # Scrape from Global Research Identifiers Database
 class GridSpider(BaseScraper):
     name = 'grid'
+    heavy = True
+    memory_mb = 1000
     allowed_domains = ['grid.ac', 'doi.org', 'figshare.com']
     start_urls = [
         "https://www.grid.ac/downloads"
@@ -65,20 +67,31 @@ It includes cross-linkages to a range of other identifier sources.''',
     def fetch_zip(self, response):
         link = response.xpath('//a[text()="Download"]/@href').extract_first()
         
-        return [scrapy.Request(response.urljoin(link), callback=self.process_zip)]
+        return [scrapy.Request(
+            response.urljoin(link),
+            callback=self.process_zip,
+            meta={"download_to_file": True, "conditional_get": True},
+        )]
         
     def process_zip(self, response):
+        # decoding the JSON is slow, so is done in a thread
+        return self.offload(self.parse_zip, response)
+
+    def parse_zip(self, response):
         yield Source(**self.source)
-        with zipfile.ZipFile(io.BytesIO(response.body)) as z:
+        with self.open_download(response) as zipdata, zipfile.ZipFile(zipdata) as z:
             with z.open("grid.json") as gridjson:
-                data = json.load(gridjson)
+                # institutes are decoded one at a time rather than loading
+                # the whole file
+                institutes = iter_json_array(io.TextIOWrapper(gridjson, encoding="utf8"), "institutes")
                 rowcount = 0
-                for k, i in enumerate(data.get("institutes", [])):
+                for k, i in enumerate(self.progress(institutes, desc="grid.json")):
                     if self.settings.getbool("DEBUG_ENABLED") and rowcount >= self.settings.getint("DEBUG_ROWS", 100):
                         break
 
                     # We only want data from certain countries
-                    if i.get("addresses", [{}])[0].get("country_code") not in self.included_countries:
+                    addresses = i.get("addresses")
+                    if not addresses or addresses[0].get("country_code") not in self.included_countries:
                         continue
 
                     # And we only want certain types of organisation (eg exclude private companies)
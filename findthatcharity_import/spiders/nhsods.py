@@ -2,6 +2,8 @@
 import datetime
 import io
 import csv
+import threading
+import time
 import zipfile
 
 import scrapy
@@ -11,12 +13,15 @@ from ..items import Organisation, Source
 
 class NHSODSSpider(BaseScraper):
     name = 'nhsods'
+    heavy = True
+    memory_mb = 500
     allowed_domains = ['nhs.uk']
     start_urls = ['https://digital.nhs.uk/services/organisation-data-service/data-downloads']
     org_id_prefix = "GB-NHS"
     id_field = "Code"
     date_fields = ["Open Date", "Close Date", "Join Parent Date", "Left Parent Date"]
     date_format = "%Y%m%d"
+    parse_slots = None
     source = {
         "title": "NHS Organisation Data Service downloads",
         "description": "",
@@ -102,8 +107,28 @@ class NHSODSSpider(BaseScraper):
         ]
 
     def process_zip(self, response):
+        """
+        Parse a zip file in a thread with `offload()`, so that the other files
+        can carry on downloading and being parsed at the same time
+
+        At most `NHSODS_PARALLELISM` files are parsed at once.
+        """
+        if self.parse_slots is None:
+            self.parse_slots = threading.BoundedSemaphore(
+                max(self.settings.getint("NHSODS_PARALLELISM", 4), 1)
+            )
+        return self.offload(self.parse_zip, response)
+
+    def parse_zip(self, response):
+        # the worker thread waits here for its turn, rather than the reactor
+        with self.parse_slots:
+            yield from self.parse_files(response)
+
+    def parse_files(self, response):
+        start = time.perf_counter()
+        rows = 0
         yield Source(**self.source)
-        with zipfile.ZipFile(io.BytesIO(response.body)) as z:
+        with self.open_download(response) as zipdata, zipfile.ZipFile(zipdata) as z:
             for f in z.infolist():
                 if not f.filename.endswith(".csv"):
                     continue
@@ -111,14 +136,19 @@ class NHSODSSpider(BaseScraper):
                 with z.open(f) as csvfile:
                     reader = csv.DictReader(io.TextIOWrapper(csvfile), fieldnames=self.fields)
                     rowcount = 0
-                    for row in reader:
+                    for row in self.progress(reader, desc=f.filename):
                         if self.settings.getbool("DEBUG_ENABLED") and rowcount > self.settings.getint("DEBUG_ROWS", 100):
                             break
 
                         rowcount += 1
+                        rows += 1
 
                         yield self.parse_row(row, response.meta["org_type"])
 
+        seconds = time.perf_counter() - start
+        self.logger.info("Parsed {:,} rows for {} in {:.2f} seconds".format(
+            rows, response.meta["org_type"], seconds))
+
     def parse_row(self, record, org_type=None):
 
         record = self.clean_fields(record)
@@ -1,7 +1,6 @@
 # -*- coding: utf-8 -*-
 import datetime
-import io
-import csv
+import re
 import zipfile
 
 import scrapy
@@ -18,6 +17,7 @@ class OSCRSpider(BaseScraper):
     ]
     org_id_prefix = "GB-SC"
     id_field = "Charity Number"
+    csv_regex = re.compile(r"CharityExport.*\.csv$", re.IGNORECASE)
     date_fields = ["Registered Date", "Year End", "Ceased Date"]
     date_format = {
         "Registered Date": "%d/%m/%Y %H:%M",
@@ -53,15 +53,29 @@ class OSCRSpider(BaseScraper):
 
 
     def process_zip(self, response):
-        csvs = []
         self.logger.info("File size: {}".format(len(response.body)))
-        with zipfile.ZipFile(io.BytesIO(response.body)) as z:
-            for f in z.infolist():
-                self.logger.info("Opening: {}".format(f.filename))
-                with z.open(f) as csvfile:
-                    csvs.append(response.replace(
-                        body=csvfile.read()))
-        return self.parse_csv(csvs[0])
+        with self.open_download(response) as zipdata, zipfile.ZipFile(zipdata) as z:
+            member = self.find_member(z)
+            self.logger.info("Opening: {}".format(member.filename))
+            with z.open(member) as csvfile:
+                yield from self.parse_csv_file(csvfile)
+
+        if not self.source["modified"]:
+            self.source["modified"] = datetime.datetime.now().isoformat()
+        yield Source(**self.source)
+
+    def find_member(self, z):
+        """
+        Find the charity register CSV within the zip file
+        """
+        csvs = [f for f in z.infolist() if f.filename.lower().endswith(".csv")]
+        for f in csvs:
+            if self.csv_regex.search(f.filename):
+                return f
+        if not csvs:
+            raise ValueError("No CSV file found in zip: {}".format(z.namelist()))
+        self.logger.warning("Register CSV not found in zip, using {}".format(csvs[0].filename))
+        return csvs[0]
 
     def parse_row(self, record):
 
@@ -1,13 +1,11 @@
 # -*- coding: utf-8 -*-
 import datetime
-import io
-import csv
 
 import scrapy
-from openpyxl import load_workbook
 
 from .base_scraper import BaseScraper
 from ..items import Organisation, Source, AREA_TYPES
+from ..readers.xlsx import XLSXReader
 
 class RSLSpider(BaseScraper):
     """
@@ -57,23 +55,22 @@ class RSLSpider(BaseScraper):
         return [scrapy.Request(response.urljoin(link), callback=self.parse)]
 
     def parse(self, response):
-        wb = load_workbook(io.BytesIO(response.body), read_only=True)
-        ws = wb['Organisation Advanced Find View']
-        
-        self.source["issued"] = wb.properties.modified.isoformat()[0:10]
-        yield Source(**self.source)
-        
-        headers = None
-        for k, row in enumerate(ws.rows):
-            if not headers:
-                headers = [c.value for c in row]
-            else:
+        with self.open_download(response) as f, XLSXReader(f) as wb:
+            self.source["issued"] = wb.modified.isoformat()[0:10]
+            yield Source(**self.source)
+
+            headers = None
+            rows = wb.iter_rows('Organisation Advanced Find View')
+            for k, row in enumerate(self.progress(rows, desc="Organisation Advanced Find View")):
+                if not headers:
+                    headers = row
+                else:
 
-                if self.settings.getbool("DEBUG_ENABLED") and k >= self.settings.getint("DEBUG_ROWS", 100):
-                    break
+                    if self.settings.getbool("DEBUG_ENABLED") and k >= self.settings.getint("DEBUG_ROWS", 100):
+                        break
 
-                record = dict(zip(headers, [c.value for c in row]))
-                yield self.parse_row(record)
+                    record = dict(zip(headers, row))
+                    yield self.parse_row(record)
 
     def parse_row(self, record):
 
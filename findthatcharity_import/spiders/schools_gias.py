@@ -55,6 +55,14 @@ class GIASSpider(BaseScraper):
     date_fields = ["OpenDate", "CloseDate"]
     location_fields = ["GOR", "DistrictAdministrative", "AdministrativeWard",
                        "ParliamentaryConstituency", "UrbanRural", "MSOA", "LSOA"]
+    # the download has over 100 columns, only these are used
+    csv_fields = [
+        "URN", "EstablishmentName", "Street", "Locality", "Address3",
+        "Country (name)", "Postcode", "TelephoneNum", "EstablishmentTypeGroup (name)",
+        "TypeOfEstablishment (name)", "SchoolWebsite", "OpenDate", "CloseDate",
+        "EstablishmentStatus (name)", "PropsName", "UKPRN", "EstablishmentNumber",
+        "LA (code)",
+    ] + [f + s for f in location_fields for s in [" (code)", " (name)"]]
 
     def start_requests(self):
         return [scrapy.Request(self.start_urls[0], callback=self.find_csv)]
@@ -85,7 +93,7 @@ class GIASSpider(BaseScraper):
 
         record = self.clean_fields(record)
 
-        return Organisation(
+        return self.organisation(
             id=self.get_org_id(record),
             name=record.get("EstablishmentName"),
             charityNumber=None,
@@ -1,12 +1,11 @@
 # -*- coding: utf-8 -*-
 import datetime
-import io
 
 import scrapy
-from openpyxl import load_workbook
 
 from .base_scraper import BaseScraper
 from ..items import Organisation, Source, AREA_TYPES
+from ..readers.xlsx import XLSXReader
 
 SCOT_LAS = {
     "Aberdeen City": "S12000033",
@@ -84,22 +83,27 @@ class SchoolsScotlandSpider(BaseScraper):
         return [scrapy.Request(response.urljoin(link), callback=self.parse)]
 
     def parse(self, response):
-        wb = load_workbook(io.BytesIO(response.body), read_only=True)
-        latest_sheet = wb[sorted([s for s in wb.sheetnames if s.startswith("Open at")])[-1]]
+        with self.open_download(response) as f, XLSXReader(f) as wb:
+            latest_sheet = sorted(wb.find_sheets(r"^Open at"))[-1]
 
-        self.source["issued"] = wb.properties.modified.isoformat()[0:10]
-        yield Source(**self.source)
+            self.source["issued"] = wb.modified.isoformat()[0:10]
+            yield Source(**self.source)
 
-        self.logger.info("Latest sheet: {}".format(latest_sheet.title))
+            self.logger.info("Latest sheet: {}".format(latest_sheet))
+            yield from self.parse_sheet(wb.iter_rows(latest_sheet))
+
+    def parse_sheet(self, rows):
         headers = {}
+        previous_row = ()
         seen_blank_row = False
-        for k, row in enumerate(latest_sheet.rows):
+        for k, row in enumerate(self.progress(rows)):
             if k < self.skip_rows or seen_blank_row:
+                previous_row = row
                 continue
             elif k == self.skip_rows:
-                headers = self.get_headers(row, latest_sheet, k)
+                headers = self.get_headers(row, previous_row)
                 continue
-            elif row[0].value is None:
+            elif not row or row[0] is None:
                 seen_blank_row = True
                 continue
 
@@ -107,9 +111,8 @@ class SchoolsScotlandSpider(BaseScraper):
                 break
 
             record = {}
-            for i, c in enumerate(row):
+            for i, v in enumerate(row):
                 if i+1 in headers:
-                    v = c.value
                     if v in ["", ".", "N/A", "0", 0]:
                         v = None
                     record[headers[i+1]] = v
@@ -146,15 +149,15 @@ class SchoolsScotlandSpider(BaseScraper):
                 source=self.source["identifier"]
             )
 
-    def get_headers(self, row, sheet, row_number):
+    def get_headers(self, row, previous_row):
         previous_overtitle = None
-        header_names = []
-        for c in row:
-            if c.value:
-                title = str(c.value)
+        headers = {}
+        for i, value in enumerate(row):
+            if value:
+                title = str(value)
 
                 # get the row before to find the heading for this title
-                overtitle = sheet.cell(row_number, c.column).value
+                overtitle = previous_row[i] if i < len(previous_row) else None
                 if overtitle is None:
                     overtitle = previous_overtitle
                 else:
@@ -171,12 +174,10 @@ class SchoolsScotlandSpider(BaseScraper):
                     else:
                         overtitle = None
 
-                header_names.append(self.slugify("{} {}".format(overtitle if overtitle else "", title)))
+                # keyed by column number
+                headers[i + 1] = self.slugify("{} {}".format(overtitle if overtitle else "", title))
 
-        return dict(zip(
-            [c.column for c in row if c.value], # header column numbers
-            header_names
-        ))
+        return headers
 
     def get_org_types(self, record):
         org_types = [
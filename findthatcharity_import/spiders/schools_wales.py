@@ -1,12 +1,11 @@
 # -*- coding: utf-8 -*-
 import datetime
-import io
-from pyexcel_ods3 import get_data
 
 import scrapy
 
 from .base_scraper import BaseScraper
 from ..items import Organisation, Source, AREA_TYPES
+from ..readers.ods import iter_ods_rows
 
 WAL_LAS = {
     "Blaenau Gwent": "W06000019",
@@ -40,6 +39,7 @@ class SchoolsWalesSpider(BaseScraper):
     org_id_prefix = "GB-WALEDU"
     id_field = "School Number"
     date_fields = []
+    sheets = ['Maintained', 'Independent', 'PRU']
     source = {
         "title": "Address list of schools",
         "description": "",
@@ -74,19 +74,28 @@ class SchoolsWalesSpider(BaseScraper):
 
     def parse(self, response):
         yield Source(**self.source)
-        wb = get_data(io.BytesIO(response.body))
-        for sheet in ['Maintained', 'Independent', 'PRU']:
-            headers = wb[sheet][0]
-            data = wb[sheet][1:]
-            for k, row in enumerate(data):
+        headers = {}
+        rowcount = {}
+        with self.open_download(response) as f:
+            # only the sheets we need are read from the file
+            for sheet, row in self.progress(iter_ods_rows(f, self.sheets)):
+                if sheet not in headers:
+                    headers[sheet] = row
+                    rowcount[sheet] = 0
+                    continue
 
-                if self.settings.getbool("DEBUG_ENABLED") and k >= self.settings.getint("DEBUG_ROWS", 100):
-                    break
+                if self.settings.getbool("DEBUG_ENABLED") and rowcount[sheet] >= self.settings.getint("DEBUG_ROWS", 100):
+                    continue
+                rowcount[sheet] += 1
 
-                row = dict(zip(headers, row))
+                row = dict(zip(headers[sheet], row))
                 row["type"] = sheet
                 yield self.parse_row(row)
 
+        for sheet in self.sheets:
+            if sheet not in headers:
+                self.logger.warning("Sheet not found: {}".format(sheet))
+
     def parse_row(self, record):
 
         record = self.clean_fields(record)
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+Record how long is spent in each stage of a crawl
+
+The wall time and number of calls for each stage are added to the crawl
+stats as `timing/<stage>/seconds` and `timing/<stage>/calls`, so they are
+saved with the rest of the stats in the `scrape` table.
+"""
+import functools
+import threading
+import time
+import types
+from contextlib import contextmanager
+
+# timings recorded in a worker thread are collected here (see `collect_timings`)
+_local = threading.local()
+
+
+def get_stats(obj):
+    """
+    Find the stats collector for a spider, pipeline or middleware
+
+    Returns None if there isn't one (eg a spider created in a worker process)
+    """
+    stats = getattr(_local, "stats", None)
+    if stats is not None:
+        return stats
+    stats = getattr(obj, "stats", None)
+    if stats is not None:
+        return stats
+    crawler = getattr(obj, "crawler", None)
+    if crawler is not None:
+        return crawler.stats
+    return None
+
+
+class TimingStats(object):
+    """
+    Collect timings where there's no crawler to record them in (eg in a
+    worker process), so they can be added to the crawl stats afterwards
+    """
+
+    def __init__(self):
+        self.values = {}
+
+    def inc_value(self, key, count=1, start=0):
+        self.values[key] = self.values.get(key, start) + count
+
+
+@contextmanager
+def collect_timings():
+    """
+    Collect the timings recorded in this thread in a `TimingStats`
+
+    The crawl stats should only be updated from the reactor thread, so
+    worker threads use this and add the timings to the stats once they finish.
+    """
+    _local.stats = TimingStats()
+    try:
+        yield _local.stats
+    finally:
+        del _local.stats
+
+
+def add_timings(stats, timings):
+    """
+    Add the `values` of a `TimingStats` to the crawl stats
+    """
+    for key, value in timings.items():
+        stats.inc_value(key, value)
+
+
+def record_time(stats, stage, seconds, calls=1):
+    stats.inc_value("timing/{}/seconds".format(stage), seconds)
+    stats.inc_value("timing/{}/calls".format(stage), calls)
+
+
+def timed(stage):
+    """
+    Decorator for a method which records the time spent in it under `stage`
+
+    This is meant for coarse stages (eg flushing a batch of records), as it
+    is always on. Use `time_methods` for methods called for every row.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            stats = get_stats(self)
+            if stats is None:
+                return func(self, *args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(self, *args, **kwargs)
+            finally:
+                record_time(stats, stage, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def time_methods(obj, names):
+    """
+    Record the time spent in some of an object's methods, using the method
+    names as the stages
+
+    The methods are only wrapped on this instance, so methods that are
+    called for every row don't pay for the timing unless it is turned on.
+    """
+    for name in names:
+        method = getattr(type(obj), name)
+        setattr(obj, name, types.MethodType(timed(name)(method), obj))
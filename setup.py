@@ -10,7 +10,9 @@ setup(
     description="Scrapers for findthatcharity",
     install_requires=[
         "alembic==1.3.3",
-        "Scrapy==1.8.0",
+        "Scrapy==2.19.0",
+        "itemadapter==0.13.1",
+        "attrs==26.1.0",
         "validators==0.14.1",
         "titlecase==0.12.0",
         "tqdm==4.41.1",
@@ -25,6 +27,10 @@ setup(
         "redis==3.3.11",
         "bcp-reader==0.1.1",
     ],
+    extras_require={
+        # faster JSON serialisation for the database pipelines (see `serialisers.py`)
+        "orjson": ["orjson==3.13.0"],
+    },
     entry_points={
         'scrapy': [
             'settings = findthatcharity_import.settings'
@@ -0,0 +1,109 @@
+"""
+Create the spreadsheets used by `test_xlsx.py` and `test_ods.py`
+
+The ODS file is written by hand so that it has repeated cells and rows.
+"""
+import datetime
+import os
+import zipfile
+
+import openpyxl
+
+DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+wb = openpyxl.Workbook()
+notes = wb.active
+notes.title = "Notes"
+notes["A1"] = "School contact details"
+notes["A3"] = "Sheets are named after the date they were published"
+
+old = wb.create_sheet("Open at 2019")
+old["A1"] = "Out of date"
+
+sheet = wb.create_sheet("Open at 2020")
+sheet["A1"] = "School contact details"
+sheet["A3"] = "Published September 2020"
+sheet["F5"] = "School type"
+sheet.append(["SeedCode", "School name", "Centre type", "LA Name", "Post code", "Primary", "Secondary", "Opened", "Roll", "Ratio"])
+sheet.append([5244439, "Aberdeen Grammar School", "Local authority", "Aberdeen City", "AB10 1HT",
+              None, "Secondary", datetime.datetime(2001, 8, 20), 1021, 12.5])
+sheet.append([5200001, "Test Primary", "Independent", None, "ab1 2cd", "Primary", None, None, 0, None])
+sheet["A10"] = "Notes: rolls are at September 2020"
+sheet["H7"].number_format = "dd/mm/yyyy"
+wb.save(os.path.join(DIRECTORY, "schools.xlsx"))
+
+TABLE = 'xmlns:office="urn:oasis:names:tc:opendocument:xmlns:office:1.0" ' \
+    'xmlns:table="urn:oasis:names:tc:opendocument:xmlns:table:1.0" ' \
+    'xmlns:text="urn:oasis:names:tc:opendocument:xmlns:text:1.0"'
+
+
+def cell(value=None, repeat=1, value_type=None, attrs=""):
+    if repeat > 1:
+        attrs += ' table:number-columns-repeated="{}"'.format(repeat)
+    if value_type:
+        attrs += ' office:value-type="{}"'.format(value_type)
+    if value is None:
+        return "<table:table-cell{}/>".format(attrs)
+    return "<table:table-cell{}><text:p>{}</text:p></table:table-cell>".format(attrs, value)
+
+
+def row(*cells, repeat=1):
+    attrs = ' table:number-rows-repeated="{}"'.format(repeat) if repeat > 1 else ""
+    return "<table:table-row{}>{}</table:table-row>".format(attrs, "".join(cells))
+
+
+def table(name, *rows):
+    return '<table:table table:name="{}">{}</table:table>'.format(name, "".join(rows))
+
+
+HEADERS = row(*[cell(h, value_type="string") for h in
+                ["School Number", "School Name", "Address 1", "Address 2", "Address 3", "Address 4", "Postcode", "Phone Number", "Sector"]])
+
+content = """<?xml version="1.0" encoding="UTF-8"?>
+<office:document-content {} office:version="1.2"><office:body><office:spreadsheet>{}</office:spreadsheet></office:body></office:document-content>""".format(TABLE, "".join([
+    table("Notes", row(cell("Address list of schools", value_type="string"))),
+    table(
+        "Maintained",
+        HEADERS,
+        row(cell("6612001", value_type="float", attrs=' office:value="6612001"'),
+            cell("Ysgol<text:s/>Gymraeg  Aberystwyth", value_type="string"),
+            cell("Plascrug Avenue", value_type="string"),
+            cell("Aberystwyth", value_type="string"),
+            cell(repeat=2),
+            cell("SY23 1HL", value_type="string"),
+            cell(repeat=1),
+            cell("Primary", value_type="string"),
+            cell(repeat=1000)),
+        row(cell(repeat=1024), repeat=2),
+        row(cell("6614002", value_type="float", attrs=' office:value="6614002"'),
+            cell("Ysgol Gynradd", value_type="string"),
+            cell(repeat=4),
+            cell("ll11 1aa", value_type="string"),
+            cell("01234 567890", value_type="string"),
+            cell("Primary", value_type="string")),
+        row(cell(repeat=1024), repeat=1048000),
+    ),
+    table(
+        "Independent",
+        HEADERS,
+        row(cell("6616003", value_type="float", attrs=' office:value="6616003"'),
+            cell("St David's School", value_type="string"),
+            cell("Some Road", value_type="string"),
+            cell(repeat=3),
+            cell("CF1 1AA", value_type="string"),
+            cell(repeat=1),
+            cell("Independent", value_type="string"),
+            cell(value_type="date", attrs=' office:date-value="2001-08-20"')),
+    ),
+]))
+
+manifest = """<?xml version="1.0" encoding="UTF-8"?>
+<manifest:manifest xmlns:manifest="urn:oasis:names:tc:opendocument:xmlns:manifest:1.0" manifest:version="1.2">
+ <manifest:file-entry manifest:full-path="/" manifest:version="1.2" manifest:media-type="application/vnd.oasis.opendocument.spreadsheet"/>
+ <manifest:file-entry manifest:full-path="content.xml" manifest:media-type="text/xml"/>
+</manifest:manifest>"""
+
+with zipfile.ZipFile(os.path.join(DIRECTORY, "schools.ods"), "w") as z:
+    z.writestr("mimetype", "application/vnd.oasis.opendocument.spreadsheet", compress_type=zipfile.ZIP_STORED)
+    z.writestr("META-INF/manifest.xml", manifest, compress_type=zipfile.ZIP_DEFLATED)
+    z.writestr("content.xml", content, compress_type=zipfile.ZIP_DEFLATED)
@@ -0,0 +1,93 @@
+import codecs
+
+import pytest
+from scrapy.http import Request, TextResponse
+from scrapy.settings import Settings
+
+from findthatcharity_import.items import Organisation
+from findthatcharity_import.spiders.schools_gias import GIASSpider
+
+GIAS_CSV = (
+    "URN,EstablishmentName,Postcode,EstablishmentStatus (name)\r\n"
+    "100000,The Aldgate School,EC3A 5DE,Open\r\n"
+    "100001,City of London School for Girls,EC2Y 8BB,Open\r\n"
+)
+
+
+URL = "https://example.com/edubasealldata.csv"
+
+
+def get_spider():
+    spider = GIASSpider()
+    spider.settings = Settings()
+    return spider
+
+
+def get_response(body=b"", headers=None, meta=None):
+    return TextResponse(URL, body=body, headers=headers, request=Request(URL, meta=meta))
+
+
+@pytest.mark.parametrize("bom, encoding", [
+    (codecs.BOM_UTF8, "utf-8"),
+    (codecs.BOM_UTF16_LE, "utf-16-le"),
+])
+@pytest.mark.parametrize("headers", [
+    {},
+    {"Content-Type": "text/csv; charset=utf-8"},
+])
+def test_parse_csv_skips_bom(bom, encoding, headers):
+    body = bom + GIAS_CSV.encode(encoding)
+    response = get_response(body, headers)
+
+    items = [i for i in get_spider().parse_csv(response) if isinstance(i, Organisation)]
+
+    assert [i["id"] for i in items] == ["GB-EDU-100000", "GB-EDU-100001"]
+    assert items[0]["name"] == "The Aldgate School"
+
+
+def test_parse_csv_skips_bom_in_downloaded_file(tmp_path):
+    path = tmp_path / "edubasealldata.csv"
+    path.write_bytes(codecs.BOM_UTF8 + GIAS_CSV.encode("utf-8"))
+    response = get_response(
+        headers={"Content-Type": "text/csv; charset=utf-8"},
+        meta={"download_path": str(path)},
+    )
+
+    items = [i for i in get_spider().parse_csv(response) if isinstance(i, Organisation)]
+
+    assert [i["id"] for i in items] == ["GB-EDU-100000", "GB-EDU-100001"]
+
+
+def test_track_position_needs_checkpoints():
+    spider = get_spider()
+    item = spider.track_position(Organisation(id="GB-EDU-100000"), "edubase", 0)
+    assert spider.item_position(item) is None
+
+
+def test_track_position():
+    spider = get_spider()
+    spider.settings.set("CHECKPOINT_ENABLED", True)
+    item = spider.track_position(Organisation(id="GB-EDU-100000"), "edubase", 0)
+    assert spider.item_position(item) == ("edubase", 0)
+    # the position is forgotten once it has been used
+    assert spider.item_position(item) is None
+
+
+def test_track_position_forgets_freed_items():
+    spider = get_spider()
+    spider.settings.set("CHECKPOINT_ENABLED", True)
+    spider.track_position(Organisation(id="GB-EDU-100000"), "edubase", 0)
+    assert not spider._item_positions
+
+
+@pytest.mark.parametrize("version, expected", [
+    ("abc123", [2, 3]),
+    ("def456", [0, 1, 2, 3]),
+    (None, [2, 3]),
+])
+def test_checkpointed_version(version, expected):
+    spider = get_spider()
+    spider.resume_positions = {"edubase": 2}
+    spider.resume_sources = {"edubase": "abc123"}
+    rows = spider.checkpointed("edubase", ["a", "b", "c", "d"], version)
+    assert [position for position, row in rows] == expected
@@ -0,0 +1,143 @@
+import hashlib
+import json
+import os
+
+import pytest
+from scrapy import Request
+from scrapy.exceptions import DontCloseSpider, IgnoreRequest
+from scrapy.http import Response
+from scrapy.utils.test import get_crawler
+
+from findthatcharity_import.middlewares import ConditionalGetMiddleware
+from findthatcharity_import.spiders.schools_gias import GIASSpider
+
+URLS = ["https://example.com/a.csv", "https://example.com/b.csv"]
+
+
+class Engine(object):
+    """
+    Records the requests and closes asked of the crawl engine
+    """
+
+    def __init__(self):
+        self.crawled = []
+        self.closed = []
+
+    def crawl(self, request):
+        self.crawled.append(request)
+
+    def close_spider(self, spider, reason):
+        self.closed.append(reason)
+
+
+@pytest.fixture
+def reactor(monkeypatch):
+    from twisted.internet import reactor
+
+    monkeypatch.setattr(reactor, "callLater", lambda delay, f, *args: f(*args))
+    return reactor
+
+
+def get_middleware(tmp_path, state=None):
+    directory = tmp_path / "conditional_get"
+    if state is not None:
+        directory.mkdir(exist_ok=True)
+        (directory / "schools_gias.json").write_text(json.dumps(state))
+    crawler = get_crawler(GIASSpider, {"CONDITIONAL_GET_ENABLED": True, "CONDITIONAL_GET_DIR": str(directory)})
+    crawler.engine = Engine()
+    spider = GIASSpider.from_crawler(crawler)
+    spider.source = dict(spider.source, distribution=[{"downloadURL": url} for url in URLS])
+    middleware = ConditionalGetMiddleware.from_crawler(crawler)
+    middleware.spider_opened(spider)
+    return middleware, spider
+
+
+def sha256(body):
+    return hashlib.sha256(body).hexdigest()
+
+
+def fetch(middleware, spider, url, status=200, body=b"", headers=None):
+    request = Request(url)
+    middleware.process_request(request, spider)
+    response = Response(url, status=status, body=body, headers=headers, request=request)
+    return request, middleware.process_response(request, response, spider)
+
+
+STATE = {
+    URLS[0]: {"etag": '"a1"', "last_modified": None, "sha256": sha256(b"a")},
+    URLS[1]: {"etag": None, "last_modified": "Mon, 01 Jun 2020 00:00:00 GMT", "sha256": sha256(b"b")},
+}
+
+
+def test_conditional_headers(tmp_path):
+    middleware, spider = get_middleware(tmp_path, STATE)
+
+    first = Request(URLS[0])
+    middleware.process_request(first, spider)
+    second = Request(URLS[1])
+    middleware.process_request(second, spider)
+    other = Request("https://example.com/")
+    middleware.process_request(other, spider)
+
+    assert first.headers["If-None-Match"] == b'"a1"'
+    assert second.headers["If-Modified-Since"] == b"Mon, 01 Jun 2020 00:00:00 GMT"
+    assert "If-None-Match" not in other.headers
+
+
+def test_not_modified_closes_spider(tmp_path, reactor):
+    middleware, spider = get_middleware(tmp_path, STATE)
+
+    with pytest.raises(IgnoreRequest):
+        fetch(middleware, spider, URLS[0], status=304)
+    # a file that comes back in full with the same hash is also unchanged
+    with pytest.raises(IgnoreRequest):
+        fetch(middleware, spider, URLS[1], body=b"b")
+    with pytest.raises(DontCloseSpider):
+        middleware.spider_idle(spider)
+
+    assert middleware.crawler.engine.closed == ["not_modified"]
+    assert middleware.stats.get_value("conditional_get/not_modified") == 2
+
+    # the saved state isn't changed
+    middleware.spider_closed(spider, "not_modified")
+    with open(middleware.state_path(spider)) as f:
+        assert json.load(f) == STATE
+
+
+def test_changed_file_fetches_skipped_files(tmp_path, reactor):
+    middleware, spider = get_middleware(tmp_path, STATE)
+
+    with pytest.raises(IgnoreRequest):
+        fetch(middleware, spider, URLS[0], status=304)
+    request, response = fetch(middleware, spider, URLS[1], body=b"new", headers={"ETag": '"b2"'})
+    assert response.body == b"new"
+
+    # the skipped file is requested again without the conditional headers
+    retry, = middleware.crawler.engine.crawled
+    assert retry.url == URLS[0]
+    assert "If-None-Match" not in retry.headers
+    assert retry.dont_filter
+    request, response = fetch(middleware, spider, URLS[0], body=b"a")
+    assert response.body == b"a"
+
+    middleware.spider_idle(spider)
+    assert middleware.crawler.engine.closed == []
+
+    middleware.spider_closed(spider, "finished")
+    with open(middleware.state_path(spider)) as f:
+        assert json.load(f) == {
+            URLS[0]: {"etag": None, "last_modified": None, "sha256": sha256(b"a")},
+            URLS[1]: {"etag": '"b2"', "last_modified": None, "sha256": sha256(b"new")},
+        }
+
+
+def test_state_only_saved_when_finished(tmp_path):
+    middleware, spider = get_middleware(tmp_path)
+
+    fetch(middleware, spider, URLS[0], body=b"a", headers={"ETag": '"a1"'})
+    middleware.spider_closed(spider, "shutdown")
+    assert not os.path.exists(middleware.state_path(spider))
+
+    middleware.spider_closed(spider, "finished")
+    with open(middleware.state_path(spider)) as f:
+        assert json.load(f)[URLS[0]]["etag"] == '"a1"'
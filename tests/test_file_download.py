@@ -0,0 +1,180 @@
+import http.client
+import http.server
+import os
+import re
+import threading
+
+import pytest
+from scrapy import Request, Spider
+from scrapy.exceptions import IgnoreRequest
+from scrapy.utils.test import get_crawler
+
+from findthatcharity_import import middlewares
+from findthatcharity_import.middlewares import FileDownloadMiddleware
+from findthatcharity_import.spiders.schools_gias import GIASSpider
+
+BODY = bytes(range(256)) * 400
+
+
+class FlakyHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Serves `BODY`, supporting `Range` requests, but drops the connection
+    after `drop_after` bytes of the first `drops` responses
+    """
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append(dict(self.headers))
+        start = 0
+        match = re.match(r"bytes=(\d+)-", self.headers.get("Range", ""))
+        if match and self.headers.get("If-Range") == '"v1"':
+            start = int(match.group(1))
+            self.send_response(206)
+            self.send_header("Content-Range", "bytes {}-{}/{}".format(start, len(BODY) - 1, len(BODY)))
+        else:
+            self.send_response(200)
+        self.send_header("ETag", '"v1"')
+        self.send_header("Content-Length", str(len(BODY) - start))
+        self.end_headers()
+        if len(server.requests) <= server.drops:
+            self.wfile.write(BODY[start:start + server.drop_after])
+            self.close_connection = True
+            return
+        self.wfile.write(BODY[start:])
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), FlakyHandler)
+    httpd.requests = []
+    httpd.drops = 0
+    httpd.drop_after = 0
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def get_middleware(**settings):
+    crawler = get_crawler(Spider, dict({"FILE_DOWNLOAD_RETRIES": 2}, **settings))
+    return FileDownloadMiddleware.from_crawler(crawler)
+
+
+@pytest.fixture
+def middleware(monkeypatch):
+    # don't wait between attempts
+    monkeypatch.setattr(middlewares.time, "sleep", lambda seconds: None)
+    return get_middleware()
+
+
+def download(server, middleware, tmp_path):
+    url = "http://127.0.0.1:{}/data.zip".format(server.server_address[1])
+    request = Request(url, headers={"Accept-Encoding": "gzip, deflate"}, meta={"download_to_file": True})
+    path = str(tmp_path / "data.zip")
+    return middleware.download(request, path, Spider(name="test")), path
+
+
+def test_download_resumes_while_making_progress(server, middleware, tmp_path):
+    # more drops than FILE_DOWNLOAD_RETRIES, but each one gets part of the file
+    server.drops = 6
+    server.drop_after = 10000
+
+    response, path = download(server, middleware, tmp_path)
+
+    with open(path, "rb") as f:
+        assert f.read() == BODY
+    assert response.meta["download_path"] == path
+    assert middleware.stats.get_value("file_download/retries") == 6
+    assert middleware.stats.get_value("file_download/resumed") == 6
+    assert [r.get("Range") for r in server.requests] == [None] + [
+        "bytes={}-".format(10000 * i) for i in range(1, 7)]
+
+
+def test_download_gives_up_without_progress(server, middleware, tmp_path):
+    server.drops = 10
+    server.drop_after = 0
+
+    with pytest.raises(http.client.IncompleteRead):
+        download(server, middleware, tmp_path)
+
+    # the first attempt and FILE_DOWNLOAD_RETRIES more
+    assert len(server.requests) == 3
+    assert not os.path.exists(str(tmp_path / "data.zip.part"))
+
+
+def test_download_asks_for_uncompressed_file(server, middleware, tmp_path):
+    download(server, middleware, tmp_path)
+
+    assert server.requests[0]["Accept-Encoding"] == "identity"
+
+
+def test_download_uses_crawl_settings(server, tmp_path, monkeypatch):
+    timeouts = []
+    urlopen = middlewares.urllib.request.urlopen
+
+    def record_timeout(request, timeout):
+        timeouts.append(timeout)
+        return urlopen(request, timeout=timeout)
+
+    monkeypatch.setattr(middlewares.urllib.request, "urlopen", record_timeout)
+    middleware = get_middleware(USER_AGENT="test-agent", DOWNLOAD_TIMEOUT=5)
+    download(server, middleware, tmp_path)
+
+    assert server.requests[0]["User-Agent"] == "test-agent"
+    assert timeouts == [5]
+
+
+def test_download_maxsize(server, tmp_path):
+    middleware = get_middleware(DOWNLOAD_MAXSIZE=len(BODY) - 1)
+
+    with pytest.raises(IgnoreRequest):
+        download(server, middleware, tmp_path)
+
+    assert len(server.requests) == 1
+    assert not os.path.exists(str(tmp_path / "data.zip.part"))
+    assert not os.path.exists(str(tmp_path / "data.zip"))
+
+
+def test_download_stats_added_from_reactor(server, middleware, tmp_path, monkeypatch):
+    from twisted.internet import reactor
+
+    calls = []
+    monkeypatch.setattr(reactor, "callFromThread", lambda f, *args: calls.append((f, args)))
+    url = "http://127.0.0.1:{}/data.zip".format(server.server_address[1])
+    request = Request(url, meta={"download_to_file": True})
+    middleware.download_in_thread(request, str(tmp_path / "data.zip"), Spider(name="test"))
+
+    # nothing is recorded in the crawl stats until it's back on the reactor
+    assert middleware.stats.get_value("file_download/bytes") is None
+    for f, args in calls:
+        f(*args)
+    assert middleware.stats.get_value("file_download/bytes") == len(BODY)
+    assert middleware.stats.get_value("file_download/files") == 1
+    assert middleware.stats.get_value("timing/download/calls") == 1
+
+
+def test_resume_from_stored_download(server, tmp_path):
+    crawler = get_crawler(GIASSpider, {"FILE_DOWNLOAD_DIR": str(tmp_path)})
+    middleware = FileDownloadMiddleware.from_crawler(crawler)
+    spider = GIASSpider()
+    spider.crawler = crawler
+    url = "http://127.0.0.1:{}/data.zip".format(server.server_address[1])
+
+    request = Request(url, meta={"download_to_file": True})
+    downloaded = middleware.download(request, middleware.get_path(request, spider), spider)
+    version = spider.source_version(downloaded)
+
+    # the resumed crawl reuses the stored file, which has no headers or hash
+    reused = middleware.process_request(Request(url, meta={"download_to_file": True}), spider)
+    assert reused.meta["download_path"] == downloaded.meta["download_path"]
+    assert "download_sha256" not in reused.meta
+    assert spider.source_version(reused) == version
+
+    spider.resume_positions = {"data": 2}
+    spider.resume_sources = {"data": version}
+    rows = spider.checkpointed("data", ["a", "b", "c", "d"], spider.source_version(reused))
+    assert [position for position, row in rows] == [2, 3]
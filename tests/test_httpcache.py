@@ -0,0 +1,118 @@
+import gzip
+import os
+
+from scrapy import Request, Spider
+from scrapy.http import Response
+from scrapy.utils.test import get_crawler
+
+from findthatcharity_import import httpcache
+from findthatcharity_import.httpcache import ContentAddressedCacheStorage
+
+HTML = b"<html><body>" + b"<p>Charity</p>" * 100 + b"</body></html>"
+
+
+def get_storage(tmp_path, **settings):
+    crawler = get_crawler(Spider, dict({"HTTPCACHE_DIR": str(tmp_path)}, **settings))
+    spider = Spider.from_crawler(crawler, name="test")
+    storage = ContentAddressedCacheStorage(crawler.settings)
+    storage.open_spider(spider)
+    return storage, spider
+
+
+def store(storage, spider, url, body, content_type=b"application/zip"):
+    request = Request(url)
+    response = Response(url, body=body, headers={"Content-Type": content_type})
+    storage.store_response(spider, request, response)
+    return request
+
+
+def blobs(storage):
+    return sorted(path for path, size, mtime in storage._blobs())
+
+
+def stat(spider, key):
+    return spider.crawler.stats.get_value("httpcache_storage/{}".format(key))
+
+
+def test_identical_bodies_saved_once(tmp_path):
+    storage, spider = get_storage(tmp_path)
+    first = store(storage, spider, "https://example.com/data.zip", b"data")
+    second = store(storage, spider, "https://example.com/data.zip?download=1", b"data")
+
+    assert len(blobs(storage)) == 1
+    assert stat(spider, "duplicates") == 1
+    for request in (first, second):
+        response = storage.retrieve_response(spider, request)
+        assert response.body == b"data"
+        assert response.status == 200
+    assert stat(spider, "hits") == 2
+
+
+def test_text_bodies_compressed(tmp_path):
+    storage, spider = get_storage(tmp_path)
+    request = store(storage, spider, "https://example.com/", HTML, b"text/html; charset=utf-8")
+    store(storage, spider, "https://example.com/data.zip", b"\x00\x01" * 100)
+
+    compressed, uncompressed = sorted(blobs(storage), key=os.path.getsize)
+    with gzip.open(compressed, "rb") as f:
+        assert f.read() == HTML
+    with open(uncompressed, "rb") as f:
+        assert f.read() == b"\x00\x01" * 100
+
+    response = storage.retrieve_response(spider, request)
+    assert response.body == HTML
+    assert response.text.startswith("<html>")
+
+
+def test_compression_turned_off(tmp_path):
+    storage, spider = get_storage(tmp_path, HTTPCACHE_COMPRESS=False)
+    store(storage, spider, "https://example.com/", HTML, b"text/html")
+
+    with open(blobs(storage)[0], "rb") as f:
+        assert f.read() == HTML
+
+
+def test_least_recently_used_evicted(tmp_path):
+    storage, spider = get_storage(tmp_path, HTTPCACHE_MAX_MB=1000 / 1024 / 1024)
+    first = store(storage, spider, "https://example.com/1.zip", b"1" * 400)
+    second = store(storage, spider, "https://example.com/2.zip", b"2" * 400)
+    first_blob, second_blob = [storage._blob_path(e["sha256"]) for e in (
+        storage._read_entry(spider, first), storage._read_entry(spider, second))]
+    os.utime(first_blob, (1000, 1000))
+    os.utime(second_blob, (2000, 2000))
+
+    # reading the first makes it the most recently used
+    assert storage.retrieve_response(spider, first).body == b"1" * 400
+    third = store(storage, spider, "https://example.com/3.zip", b"3" * 400)
+
+    assert stat(spider, "evicted") == 1
+    assert stat(spider, "evicted_bytes") == 400
+    assert not os.path.exists(second_blob)
+    assert storage.retrieve_response(spider, second) is None
+    assert storage.retrieve_response(spider, first).body == b"1" * 400
+    assert storage.retrieve_response(spider, third).body == b"3" * 400
+
+
+def test_size_counted_from_existing_blobs(tmp_path):
+    storage, spider = get_storage(tmp_path)
+    store(storage, spider, "https://example.com/1.zip", b"1" * 400)
+    store(storage, spider, "https://example.com/2.zip", b"2" * 400)
+
+    storage, spider = get_storage(tmp_path)
+    assert storage.size == 800
+
+
+def test_expired_entry_removed(tmp_path, monkeypatch):
+    storage, spider = get_storage(tmp_path, HTTPCACHE_EXPIRATION_SECS=60)
+    request = store(storage, spider, "https://example.com/data.zip", b"data")
+    other = store(storage, spider, "https://example.com/copy.zip", b"data")
+    now = httpcache.time()
+    monkeypatch.setattr(httpcache, "time", lambda: now + 120)
+
+    assert storage.retrieve_response(spider, request) is None
+    assert stat(spider, "expired") == 1
+    assert not os.path.exists(storage._entry_path(spider, request))
+    # the body is kept for the other entries that use it
+    assert len(blobs(storage)) == 1
+    monkeypatch.setattr(httpcache, "time", lambda: now)
+    assert storage.retrieve_response(spider, other).body == b"data"
@@ -0,0 +1,28 @@
+import pytest
+
+from findthatcharity_import.items import CompactOrganisation, Organisation
+
+
+@pytest.mark.parametrize("cls", [Organisation, CompactOrganisation])
+def test_to_tables_sparse_item(cls):
+    item = cls(id="GB-CHC-1234567", name="Test Charity")
+    tables = item.to_tables()
+    assert tables["organisation"][0]["id"] == "GB-CHC-1234567"
+    assert tables["organisation"][0]["postalCode"] is None
+    assert tables["organisation_links"] == []
+
+
+def test_to_tables_links():
+    item = CompactOrganisation(id="GB-CHC-1234567", orgIDs=["GB-CHC-1234567", "GB-COH-01234567"])
+    assert item.to_tables()["organisation_links"] == [{
+        "organisation_id_a": "GB-CHC-1234567",
+        "organisation_id_b": "GB-COH-01234567",
+        "source": None,
+    }]
+
+
+def test_compact_get_default():
+    item = CompactOrganisation(id="GB-CHC-1234567")
+    assert item.get("orgIDs", []) == []
+    assert item.get("unknown", "default") == "default"
+    assert item.get("id", "default") == "GB-CHC-1234567"
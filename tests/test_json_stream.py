@@ -0,0 +1,33 @@
+import io
+import json
+
+import pytest
+
+from findthatcharity_import.readers.json_stream import iter_json_array
+
+ARRAYS = [
+    '[1500.0, 2]',
+    '[1.5e+10,-2E-3, 0.25 ,3e5, 10]',
+    '[12.5, true, null, "1.5", {"a": 1e2}, [0.5]]',
+    '[-0.5]',
+    '[]',
+]
+
+
+@pytest.mark.parametrize("chunk_size", range(1, 12))
+@pytest.mark.parametrize("data", ARRAYS)
+def test_iter_json_array(data, chunk_size):
+    values = list(iter_json_array(io.StringIO(data), chunk_size=chunk_size))
+    assert values == json.loads(data)
+
+
+@pytest.mark.parametrize("chunk_size", range(1, 12))
+def test_iter_json_array_key(chunk_size):
+    data = '{"total": 2.75e1, "rows": [1500.0, 2, {"x": -1.5}], "after": 1}'
+    values = list(iter_json_array(io.StringIO(data), key="rows", chunk_size=chunk_size))
+    assert values == [1500.0, 2, {"x": -1.5}]
+
+
+def test_iter_json_array_missing_key():
+    with pytest.raises(KeyError):
+        list(iter_json_array(io.StringIO('{"total": 1.5}'), key="rows", chunk_size=2))
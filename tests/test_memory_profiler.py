@@ -0,0 +1,68 @@
+import tracemalloc
+
+from scrapy.utils.test import get_crawler
+
+from findthatcharity_import import extensions
+from findthatcharity_import.extensions import MemoryProfiler
+
+
+def get_profiler(use_tracemalloc):
+    return MemoryProfiler(get_crawler().stats, interval=60, checkpoints=[],
+                          use_tracemalloc=use_tracemalloc)
+
+
+def test_tracemalloc_stopped_by_last_user():
+    assert not tracemalloc.is_tracing()
+    first, second, untraced = get_profiler(True), get_profiler(True), get_profiler(False)
+    for profiler in (first, second, untraced):
+        profiler.spider_opened(None)
+    assert extensions._tracemalloc_users == 2
+
+    # closing twice, or closing a profiler that isn't tracing, doesn't
+    # stop tracemalloc while another spider is using it
+    untraced.spider_closed(None)
+    first.spider_closed(None)
+    first.spider_closed(None)
+    assert extensions._tracemalloc_users == 1
+    assert tracemalloc.is_tracing()
+
+    second.spider_closed(None)
+    assert extensions._tracemalloc_users == 0
+    assert not tracemalloc.is_tracing()
+
+
+def test_tracemalloc_started_elsewhere():
+    tracemalloc.start()
+    try:
+        profiler = get_profiler(True)
+        profiler.spider_opened(None)
+        profiler.spider_closed(None)
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
+
+
+def test_thread_samples_recorded_from_reactor(monkeypatch):
+    from twisted.internet import reactor
+
+    calls = []
+    monkeypatch.setattr(reactor, "callFromThread", lambda f, *args: calls.append((f, args)))
+    profiler = MemoryProfiler(get_crawler().stats, interval=0.01, checkpoints=[])
+    profiler.spider_opened(None)
+    while len(calls) < 2:
+        profiler.stop.wait(0.01)
+    profiler.stop.set()
+    profiler.thread.join()
+
+    # the thread doesn't update the stats itself
+    assert profiler.stats.get_value('memory/rss_mb') is None
+    profiler.stop.clear()
+    for f, args in calls:
+        f(*args)
+    assert profiler.stats.get_value('memory/peak_rss_mb') == max(args[0] for f, args in calls)
+
+    # samples arriving after the spider closed are ignored
+    profiler.spider_closed(None)
+    peak = profiler.stats.get_value('memory/peak_rss_mb')
+    profiler.thread_sample(peak + 100)
+    assert profiler.stats.get_value('memory/peak_rss_mb') == peak
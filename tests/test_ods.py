@@ -0,0 +1,69 @@
+import datetime
+import os
+
+import pytest
+from scrapy.http import Request, Response
+from scrapy.settings import Settings
+
+from findthatcharity_import.items import Organisation
+from findthatcharity_import.readers.ods import iter_ods_rows
+from findthatcharity_import.spiders.schools_wales import SchoolsWalesSpider
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "schools.ods")
+
+HEADERS = ["School Number", "School Name", "Address 1", "Address 2", "Address 3", "Address 4",
+           "Postcode", "Phone Number", "Sector"]
+
+
+def test_iter_ods_rows():
+    rows = list(iter_ods_rows(FIXTURE, ["Maintained", "Independent"]))
+
+    assert rows == [
+        ("Maintained", HEADERS),
+        # empty cells are "", and repeated empty cells at the end are left out
+        ("Maintained", [6612001, "Ysgol Gymraeg  Aberystwyth", "Plascrug Avenue", "Aberystwyth",
+                        "", "", "SY23 1HL", "", "Primary"]),
+        # repeated empty rows are kept if there's a row after them
+        ("Maintained", []),
+        ("Maintained", []),
+        ("Maintained", [6614002, "Ysgol Gynradd", "", "", "", "", "ll11 1aa", "01234 567890", "Primary"]),
+        ("Independent", HEADERS),
+        ("Independent", [6616003, "St David's School", "Some Road", "", "", "", "CF1 1AA", "",
+                         "Independent", datetime.date(2001, 8, 20)]),
+    ]
+
+
+def test_iter_ods_rows_only_named_sheets():
+    with open(FIXTURE, "rb") as f:
+        rows = list(iter_ods_rows(f, ["Independent", "Missing"]))
+    assert {sheet for sheet, row in rows} == {"Independent"}
+    assert len(rows) == 2
+
+
+def test_same_values_as_pyexcel():
+    pyexcel_ods3 = pytest.importorskip("pyexcel_ods3")
+    expected = pyexcel_ods3.get_data(FIXTURE)
+    for sheet in ("Notes", "Maintained", "Independent"):
+        rows = [row for s, row in iter_ods_rows(FIXTURE, [sheet])]
+        # pyexcel keeps the empty rows at the end of a sheet
+        assert rows == expected[sheet][:len(rows)]
+        assert not any(expected[sheet][len(rows):])
+
+
+def test_schools_wales_headers():
+    spider = SchoolsWalesSpider()
+    spider.settings = Settings()
+    url = "https://example.com/schools.ods"
+    response = Response(url, request=Request(url, meta={"download_path": FIXTURE}))
+
+    # (the spider doesn't skip blank rows, which give items with no name)
+    items = [i for i in spider.parse(response) if isinstance(i, Organisation) and i["name"]]
+
+    # the first row of each sheet is used as its headers
+    assert [i["id"] for i in items] == ["GB-WALEDU-6612001", "GB-WALEDU-6614002", "GB-WALEDU-6616003"]
+    assert items[0]["name"] == "Ysgol Gymraeg  Aberystwyth"
+    assert items[0]["streetAddress"] == "Plascrug Avenue"
+    assert items[0]["addressRegion"] == ""
+    assert items[1]["postalCode"] == "LL11 1AA"
+    assert items[1]["telephone"] == "01234 567890"
+    assert "Independent School" in items[2]["organisationType"]
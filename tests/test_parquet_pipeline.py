@@ -0,0 +1,101 @@
+import datetime
+import os
+
+import pytest
+from scrapy.utils.test import get_crawler
+
+from findthatcharity_import.items import Link, Organisation
+from findthatcharity_import.spiders.schools_gias import GIASSpider
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+
+from findthatcharity_import.pipelines.parquet_pipeline import ParquetPipeline, convert_value  # noqa: E402
+
+
+@pytest.mark.parametrize("value,expected", [
+    (True, True),
+    (False, False),
+    (0, False),
+    (1, True),
+    ("True", True),
+    ("False", False),
+    ("Y", True),
+    ("N", False),
+    ("1", True),
+    ("0", False),
+    (" no ", False),
+    ("", None),
+    (None, None),
+])
+def test_convert_boolean(value, expected):
+    assert convert_value(value, pa.bool_()) is expected
+
+
+def test_convert_unknown_boolean():
+    with pytest.raises(ValueError):
+        convert_value("maybe", pa.bool_())
+
+
+def test_convert_values():
+    assert convert_value(12, pa.string()) == "12"
+    assert convert_value("12", pa.int64()) == 12
+    assert convert_value("1.5", pa.float64()) == 1.5
+    assert convert_value("2020-01-02", pa.date32()) == datetime.date(2020, 1, 2)
+    assert convert_value(datetime.datetime(2020, 1, 2, 3, 4), pa.date32()) == datetime.date(2020, 1, 2)
+    assert convert_value(datetime.date(2020, 1, 2), pa.timestamp("us")) == datetime.datetime(2020, 1, 2)
+    assert convert_value("a", pa.list_(pa.string())) == ["a"]
+    assert convert_value(
+        {"name": "Leeds", "latitude": "53.8", "other": "ignored"},
+        pa.struct([("name", pa.string()), ("latitude", pa.float64())]),
+    ) == {"name": "Leeds", "latitude": 53.8}
+
+
+def get_pipeline(tmp_path):
+    crawler = get_crawler(GIASSpider, {"PARQUET_DIR": str(tmp_path)})
+    pipeline = ParquetPipeline.from_crawler(crawler)
+    spider = GIASSpider()
+    pipeline.open_spider(spider)
+    return pipeline, spider
+
+
+def crawl(tmp_path, items, reason="finished"):
+    pipeline, spider = get_pipeline(tmp_path)
+    for item in items:
+        pipeline.process_item(item, spider)
+    pipeline.spider_closed(spider, reason)
+    return os.path.join(str(tmp_path), "organisation", "spider=schools_gias")
+
+
+def test_saves_items(tmp_path):
+    directory = crawl(tmp_path, [
+        Organisation(id="GB-EDU-100000", name="Test School", active="False",
+                     dateRegistered="2000-01-01", orgIDs=["GB-EDU-100000"], latestIncome="100"),
+        Link(organisation_id_a="GB-EDU-100000", organisation_id_b="GB-EDU-100001"),
+    ])
+
+    # the temporary file is replaced by the finished one
+    assert os.listdir(directory) == ["data.parquet"]
+    rows = pq.read_table(os.path.join(directory, "data.parquet")).to_pylist()
+    assert len(rows) == 1
+    assert rows[0]["active"] is False
+    assert rows[0]["dateRegistered"] == datetime.date(2000, 1, 1)
+    assert rows[0]["latestIncome"] == 100
+    assert rows[0]["orgIDs"] == ["GB-EDU-100000"]
+    assert pq.read_table(os.path.join(str(tmp_path), "link", "spider=schools_gias", "data.parquet")).num_rows == 1
+
+
+def test_replaces_previous_file(tmp_path):
+    crawl(tmp_path, [Organisation(id="GB-EDU-100000"), Organisation(id="GB-EDU-100001")])
+    directory = crawl(tmp_path, [Organisation(id="GB-EDU-100002")])
+
+    assert os.listdir(directory) == ["data.parquet"]
+    assert pq.read_table(os.path.join(directory, "data.parquet")).column("id").to_pylist() == ["GB-EDU-100002"]
+
+
+def test_unfinished_crawl_keeps_previous_file(tmp_path):
+    crawl(tmp_path, [Organisation(id="GB-EDU-100000")])
+    directory = crawl(tmp_path, [Organisation(id="GB-EDU-100001")], reason="shutdown")
+
+    assert os.listdir(directory) == ["data.parquet"]
+    assert pq.read_table(os.path.join(directory, "data.parquet")).column("id").to_pylist() == ["GB-EDU-100000"]
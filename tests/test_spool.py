@@ -0,0 +1,77 @@
+import asyncio
+import datetime
+import json
+import os
+import subprocess
+import sys
+
+from itemadapter import ItemAdapter
+from scrapy.utils.test import get_crawler
+
+from findthatcharity_import.commands.replay import read_segments, replay_spider
+from findthatcharity_import.items import CompactOrganisation, Link, Organisation, Source
+from findthatcharity_import.pipelines.spool_pipeline import SpoolPipeline
+from findthatcharity_import.spiders.schools_gias import GIASSpider
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ITEMS = [
+    Organisation(id="GB-EDU-100000", name="Test School", dateRegistered=datetime.date(2000, 1, 1),
+                 orgIDs=["GB-EDU-100000"], dateModified=datetime.datetime(2020, 5, 1, 12, 30)),
+    CompactOrganisation(id="GB-EDU-100001", name="Other School", active=False),
+    Link(organisation_id_a="GB-EDU-100000", organisation_id_b="GB-EDU-100001", source="gias"),
+    Source(identifier="gias", title="Get Information about Schools", distribution=[{"accessURL": "https://example.com/"}]),
+]
+
+
+def spool(tmp_path, items, segment_size=2):
+    crawler = get_crawler(GIASSpider, {"SPOOL_DIR": str(tmp_path), "SPOOL_SEGMENT_SIZE": segment_size})
+    pipeline = SpoolPipeline.from_crawler(crawler)
+    spider = GIASSpider(crawl_id="test")
+    pipeline.open_spider(spider)
+    for item in items:
+        pipeline.process_item(item, spider)
+    pipeline.spider_closed(spider, "finished")
+    return os.path.join(str(tmp_path), spider.name, "test")
+
+
+async def collect(spider):
+    return [item async for item in spider.start()]
+
+
+def test_spool_round_trip(tmp_path):
+    crawl_dir = spool(tmp_path, ITEMS)
+
+    with open(os.path.join(crawl_dir, "manifest.json")) as f:
+        manifest = json.load(f)
+    assert manifest["items"] == 4
+    assert manifest["segments"] == 2
+
+    segments = sorted(os.path.join(crawl_dir, s) for s in os.listdir(crawl_dir) if s.endswith(".gz"))
+    spidercls = replay_spider(GIASSpider, read_segments(segments, workers=2))
+    assert spidercls.__name__ == "GIASSpider"
+    assert spidercls.name == "schools_gias"
+
+    replayed = asyncio.run(collect(spidercls()))
+    assert [type(i) for i in replayed] == [type(i) for i in ITEMS]
+    assert [ItemAdapter(i).asdict() for i in replayed] == [ItemAdapter(i).asdict() for i in ITEMS]
+
+
+def test_replay_command(tmp_path):
+    spool(tmp_path / "spool", ITEMS)
+    output = tmp_path / "items.jsonl"
+
+    subprocess.run(
+        [sys.executable, "-m", "scrapy", "replay", "schools_gias", "test",
+         "-s", "SPOOL_DIR={}".format(tmp_path / "spool"),
+         "-s", "ITEM_PIPELINES={}",
+         "-s", "FEEDS={}".format(json.dumps({str(output): {"format": "jsonlines"}})),
+         "-s", "LOG_LEVEL=WARNING"],
+        cwd=ROOT, check=True,
+    )
+
+    with open(str(output)) as f:
+        replayed = [json.loads(line) for line in f]
+    assert [i.get("id") or i.get("organisation_id_a") or i.get("identifier") for i in replayed] == [
+        "GB-EDU-100000", "GB-EDU-100001", "GB-EDU-100000", "gias"]
+    assert replayed[0]["dateRegistered"] == "2000-01-01"
@@ -0,0 +1,64 @@
+import datetime
+
+import pytest
+from scrapy.utils.test import get_crawler
+from sqlalchemy import create_engine
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.compiler import compiles
+
+from findthatcharity_import.db import tables
+from findthatcharity_import.items import Organisation
+from findthatcharity_import.pipelines.sqlsave_pipeline import SQLSavePipeline
+from findthatcharity_import.spiders.schools_gias import GIASSpider
+
+
+@compiles(JSONB, "sqlite")
+def compile_jsonb(type_, compiler, **kw):
+    # the tables use postgres' JSONB columns, which SQLite can store as JSON
+    return "JSON"
+
+
+@pytest.fixture
+def db_uri(tmp_path):
+    return "sqlite:///{}".format(tmp_path / "test.db")
+
+
+def crawl(db_uri, items, reason="finished"):
+    crawler = get_crawler(GIASSpider, {"DB_URI": db_uri})
+    spider = GIASSpider.from_crawler(crawler)
+    pipeline = SQLSavePipeline.from_crawler(crawler)
+    crawler.stats.set_value("start_time", datetime.datetime(2020, 1, 1))
+    pipeline.open_spider(spider)
+    for item in items:
+        pipeline.process_item(item, spider)
+        crawler.stats.inc_value("item_scraped_count")
+    crawler.stats.set_value("finish_reason", reason)
+    crawler.stats.set_value("finish_time", datetime.datetime(2020, 1, 1, 1))
+    pipeline.spider_closed(spider, reason)
+    return spider.crawl_id
+
+
+def select(db_uri, table, *columns):
+    engine = create_engine(db_uri)
+    try:
+        return sorted(tuple(row) for row in engine.execute(
+            tables[table].select().with_only_columns([tables[table].c[c] for c in columns])))
+    finally:
+        engine.dispose()
+
+
+def test_new_crawl_replaces_records(db_uri):
+    first = crawl(db_uri, [Organisation(id="GB-EDU-100000", name="Old School", orgIDs=["GB-EDU-100000"])])
+    second = crawl(db_uri, [Organisation(id="GB-EDU-100001", name="New School", orgIDs=["GB-EDU-100001"])])
+
+    assert select(db_uri, "organisation", "id", "scrape_id") == [("GB-EDU-100001", second)]
+    assert select(db_uri, "scrape", "id", "finish_reason") == sorted([(first, "finished"), (second, "finished")])
+
+
+def test_not_modified_keeps_previous_records(db_uri):
+    first = crawl(db_uri, [Organisation(id="GB-EDU-100000", name="Old School", orgIDs=["GB-EDU-100000"])])
+    second = crawl(db_uri, [], reason="not_modified")
+
+    # the delete of the previous crawl's records is rolled back
+    assert select(db_uri, "organisation", "id", "scrape_id") == [("GB-EDU-100000", first)]
+    assert select(db_uri, "scrape", "id", "finish_reason") == sorted([(first, "finished"), (second, "not_modified")])
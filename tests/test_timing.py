@@ -0,0 +1,34 @@
+from findthatcharity_import.spiders.schools_gias import GIASSpider
+from findthatcharity_import.timing import TimingStats, collect_timings, time_methods
+
+
+def get_spider():
+    spider = GIASSpider()
+    spider.stats = TimingStats()
+    return spider
+
+
+def test_cleaning_methods_not_timed():
+    spider = get_spider()
+    spider.parse_name("THE ALDGATE SCHOOL")
+    assert spider.stats.values == {}
+
+
+def test_time_methods():
+    spider = get_spider()
+    time_methods(spider, spider.timed_methods)
+    assert spider.parse_name("THE ALDGATE SCHOOL") == "The Aldgate School"
+    assert spider.stats.values["timing/parse_name/calls"] == 1
+    # only this spider is timed
+    other = get_spider()
+    other.parse_name("THE ALDGATE SCHOOL")
+    assert other.stats.values == {}
+
+
+def test_collect_timings():
+    spider = get_spider()
+    time_methods(spider, ["parse_name"])
+    with collect_timings() as timings:
+        spider.parse_name("THE ALDGATE SCHOOL")
+    assert timings.values["timing/parse_name/calls"] == 1
+    assert spider.stats.values == {}
@@ -0,0 +1,88 @@
+import datetime
+import os
+
+import pytest
+from scrapy.settings import Settings
+
+from findthatcharity_import.items import Organisation
+from findthatcharity_import.readers.xlsx import XLSXReader, column_index, is_date_format
+from findthatcharity_import.spiders.schools_scotland import SchoolsScotlandSpider
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "schools.xlsx")
+
+
+def test_sheets():
+    with XLSXReader(FIXTURE) as wb:
+        assert wb.sheetnames == ["Notes", "Open at 2019", "Open at 2020"]
+        assert wb.find_sheets(r"^Open at") == ["Open at 2019", "Open at 2020"]
+        assert isinstance(wb.modified, datetime.datetime)
+
+
+def test_iter_rows():
+    with open(FIXTURE, "rb") as f, XLSXReader(f) as wb:
+        rows = list(wb.iter_rows("Open at 2020"))
+
+    # missing and empty rows are returned, padded to the sheet's width
+    assert len(rows) == 10
+    assert rows[1] == (None,) * 10
+    assert rows[4][5] == "School type"
+    assert rows[5] == ("SeedCode", "School name", "Centre type", "LA Name", "Post code",
+                       "Primary", "Secondary", "Opened", "Roll", "Ratio")
+    assert rows[6] == (5244439, "Aberdeen Grammar School", "Local authority", "Aberdeen City", "AB10 1HT",
+                       None, "Secondary", datetime.datetime(2001, 8, 20), 1021, 12.5)
+    # empty cells in the middle and at the end of a row are None
+    assert rows[7] == (5200001, "Test Primary", "Independent", None, "ab1 2cd",
+                       "Primary", None, None, 0, None)
+    assert rows[9][0] == "Notes: rolls are at September 2020"
+
+
+def test_iter_rows_sheets_are_separate():
+    with XLSXReader(FIXTURE) as wb:
+        assert list(wb.iter_rows("Open at 2019")) == [("Out of date",)]
+        assert list(wb.iter_rows("Notes")) == [
+            ("School contact details",),
+            (None,),
+            ("Sheets are named after the date they were published",),
+        ]
+
+
+def test_same_values_as_openpyxl():
+    openpyxl = pytest.importorskip("openpyxl")
+    expected = openpyxl.load_workbook(FIXTURE, read_only=True)
+    with XLSXReader(FIXTURE) as wb:
+        for sheet in wb.sheetnames:
+            assert list(wb.iter_rows(sheet)) == list(expected[sheet].iter_rows(values_only=True))
+
+
+@pytest.mark.parametrize("ref,index", [("A1", 0), ("Z10", 25), ("AA3", 26), ("AB12", 27), ("XFD1", 16383)])
+def test_column_index(ref, index):
+    assert column_index(ref) == index
+
+
+@pytest.mark.parametrize("format_code,is_date", [
+    ("dd/mm/yyyy", True),
+    ("[$-F800]dddd, mmmm dd, yyyy", True),
+    ("0.00", False),
+    ('#,##0 "days"', False),
+    ("[Red]0.00;[Blue]-0.00", False),
+])
+def test_is_date_format(format_code, is_date):
+    assert is_date_format(format_code) is is_date
+
+
+def test_schools_scotland_headers():
+    spider = SchoolsScotlandSpider()
+    spider.settings = Settings()
+    with XLSXReader(FIXTURE) as wb:
+        latest_sheet = sorted(wb.find_sheets(r"^Open at"))[-1]
+        items = list(spider.parse_sheet(wb.iter_rows(latest_sheet)))
+
+    # the rows after the first blank row are notes
+    assert all(isinstance(i, Organisation) for i in items)
+    assert [i["id"] for i in items] == ["GB-SCOTEDU-5244439", "GB-SCOTEDU-5200001"]
+    assert items[0]["name"] == "Aberdeen Grammar School"
+    assert items[0]["postalCode"] == "AB10 1HT"
+    # headers under "School type" are prefixed with it
+    assert items[0]["organisationType"] == ["Education", "Local authority School", "Secondary School"]
+    assert items[1]["organisationType"] == ["Education", "Independent School", "Primary School"]
+    assert items[1]["postalCode"] == "AB1 2CD"